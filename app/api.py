@@ -0,0 +1,234 @@
+"""Versioned JSON API for notes (/api/v1).
+
+Clients authenticate with the same signed session token as the HTML pages,
+either as the session cookie or as 'Authorization: Bearer <token>' (see
+POST /api/v1/token). Superadmins can read notes but not change them, as on
+the HTML pages.
+"""
+import os
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import auth, crud, crud_async, models, schemas, sessions, sync, tags, usercache
+from app.database import AsyncSessionLocal
+from app.deps import get_db, get_current_user
+from app.usercache import CurrentUser
+
+# Most items one bulk request may carry; clients send bigger migrations in batches
+API_BULK_LIMIT = int(os.getenv("API_BULK_LIMIT", "10000"))
+EXPORT_BATCH_SIZE = 1000
+SYNC_MAX_BATCH = 1000
+
+router = APIRouter(prefix="/api/v1", tags=["api"])
+
+
+def require_user(user: Optional[CurrentUser] = Depends(get_current_user)) -> CurrentUser:
+    if not user:
+        raise HTTPException(401, "Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    return user
+
+
+def require_writer(user: CurrentUser = Depends(require_user)) -> CurrentUser:
+    if user.role == "superadmin":
+        raise HTTPException(403, "Superadmin cannot modify notes")
+    return user
+
+
+def check_bulk_size(items: list):
+    if len(items) > API_BULK_LIMIT:
+        raise HTTPException(413, f"At most {API_BULK_LIMIT} items per request")
+
+
+def version_conflict(conflict: crud.VersionConflict) -> HTTPException:
+    return HTTPException(409, f"Note {conflict.note.id} was modified; current version is {conflict.note.version}")
+
+
+@router.post("/token", response_model=schemas.Token)
+async def issue_token(credentials: schemas.UserLogin, db: AsyncSession = Depends(get_db)):
+    user = await crud_async.get_user_by_email(db, credentials.email)
+    valid = False
+    if user:
+        try:
+            valid, new_hash = await auth.verify_and_update_async(credentials.password, user.password)
+        except auth.HashingBusy:
+            raise HTTPException(429, "Too many requests", headers={"Retry-After": "1"})
+    if not valid:
+        raise HTTPException(401, "Invalid credentials")
+    if new_hash:
+        await crud_async.update_password_hash(db, user, new_hash)
+    usercache.put(user)
+    return schemas.Token(access_token=sessions.create_session_token(user))
+
+
+@router.get("/notes", response_model=schemas.NotePage)
+async def list_notes(search: Optional[str] = None, cursor: Optional[str] = None,
+                     offset: int = Query(0, ge=0), limit: int = Query(20, ge=1, le=100),
+                     tag_filter: Optional[str] = Query(None, alias="tags"),
+                     match: str = Query("all", pattern="^(all|any)$"),
+                     user: CurrentUser = Depends(require_user), db: AsyncSession = Depends(get_db)):
+    """The caller's notes, newest first. Follow next_cursor to page; searches and tag filters page with offset.
+
+    tags=a,b keeps the notes with both tags; add match=any for either of them.
+    """
+    try:
+        tagged = tags.parse(tag_filter)
+    except ValueError as error:
+        raise HTTPException(400, str(error))
+    total, page = await crud_async.get_notes_by_user(
+        db, user.id, search=search, offset=offset, limit=limit, cursor=cursor, summary=False,
+        tagged=tagged, match_all=match == "all",
+    )
+    items = [schemas.NoteOut.model_validate(n) for n in page.items]
+    return schemas.NotePage(items=items, total=total, next_cursor=page.next_cursor)
+
+
+@router.get("/notes/export")
+async def export_notes(user: CurrentUser = Depends(require_user)):
+    """Every note of the caller as NDJSON, streamed in batches so memory stays flat"""
+    async def lines():
+        # Own session: the request's one is closed before the body is streamed
+        async with AsyncSessionLocal() as db:
+            after_id = 0
+            while True:
+                notes = await crud_async.get_notes_after(db, user.id, after_id, EXPORT_BATCH_SIZE)
+                if not notes:
+                    return
+                yield "".join(schemas.NoteOut.model_validate(n).model_dump_json() + "\n" for n in notes)
+                after_id = notes[-1].id
+                db.expunge_all()
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson",
+                             headers={"Content-Disposition": 'attachment; filename="notes.ndjson"'})
+
+
+@router.post("/notes/bulk", response_model=List[schemas.NoteOut], status_code=201)
+async def bulk_create_notes(body: schemas.NoteBulkCreate, user: CurrentUser = Depends(require_writer),
+                            db: AsyncSession = Depends(get_db)):
+    check_bulk_size(body.notes)
+    return await crud_async.create_notes(db, body.notes, user.id)
+
+
+@router.put("/notes/bulk", response_model=List[schemas.NoteOut])
+async def bulk_update_notes(body: schemas.NoteBulkUpdate, user: CurrentUser = Depends(require_writer),
+                            db: AsyncSession = Depends(get_db)):
+    check_bulk_size(body.notes)
+    try:
+        notes = await crud_async.update_notes(db, body.notes, user.id)
+    except crud.VersionConflict as conflict:
+        raise version_conflict(conflict)
+    if notes is None:
+        raise HTTPException(404, "One or more notes not found")
+    return notes
+
+
+@router.post("/notes/bulk-delete")
+async def bulk_delete_notes(body: schemas.NoteBulkDelete, user: CurrentUser = Depends(require_writer),
+                            db: AsyncSession = Depends(get_db)):
+    check_bulk_size(body.ids)
+    deleted = await crud_async.delete_notes(db, body.ids, user.id)
+    if deleted is None:
+        raise HTTPException(404, "One or more notes not found")
+    return {"deleted": deleted}
+
+
+async def get_readable_note(note_id: int, user: CurrentUser = Depends(require_user),
+                            db: AsyncSession = Depends(get_db)):
+    note = await crud_async.get_note(db, note_id)
+    # Someone else's note is reported as missing rather than forbidden
+    if not note or (user.role == "user" and note.owner_id != user.id):
+        raise HTTPException(404, "Note not found")
+    return note
+
+
+@router.post("/notes", response_model=schemas.NoteOut, status_code=201)
+async def create_note(note_in: schemas.NoteCreate, user: CurrentUser = Depends(require_writer),
+                      db: AsyncSession = Depends(get_db)):
+    return await crud_async.create_note(db, note_in, user.id)
+
+
+@router.get("/notes/{note_id}", response_model=schemas.NoteOut)
+async def get_note(note=Depends(get_readable_note)):
+    return note
+
+
+@router.put("/notes/{note_id}", response_model=schemas.NoteOut)
+async def update_note(note_id: int, data: schemas.NoteUpdate, user: CurrentUser = Depends(require_writer),
+                      db: AsyncSession = Depends(get_db)):
+    """Send the version you read to have the save refused (409) if the note changed since"""
+    try:
+        note = await crud_async.update_note(db, note_id, data, owner_id=user.id)
+    except crud.VersionConflict as conflict:
+        raise version_conflict(conflict)
+    if not note:
+        raise HTTPException(404, "Note not found")
+    return note
+
+
+@router.delete("/notes/{note_id}", status_code=204)
+async def delete_note(note_id: int, version: Optional[int] = None, user: CurrentUser = Depends(require_writer),
+                      db: AsyncSession = Depends(get_db)):
+    try:
+        deleted = await crud_async.delete_note(db, note_id, user.id, version)
+    except crud.VersionConflict as conflict:
+        raise version_conflict(conflict)
+    if not deleted:
+        raise HTTPException(404, "Note not found")
+    return Response(status_code=204)
+
+
+@router.get("/notes/{note_id}/revisions", response_model=List[schemas.RevisionOut])
+async def list_revisions(note_id: int, before: Optional[int] = None, limit: int = Query(50, ge=1, le=200),
+                         note=Depends(get_readable_note), db: AsyncSession = Depends(get_db)):
+    """Newest first, without bodies; page with before=<number of the last one seen>"""
+    return await crud_async.get_revisions(db, note_id, before=before, limit=limit)
+
+
+@router.get("/notes/{note_id}/revisions/{number}", response_model=schemas.RevisionDetail)
+async def get_revision(note_id: int, number: int, note=Depends(get_readable_note), db: AsyncSession = Depends(get_db)):
+    found = await crud_async.get_revision(db, note_id, number)
+    if not found:
+        raise HTTPException(404, "Revision not found")
+    revision, content = found
+    return schemas.RevisionDetail(**schemas.RevisionOut.model_validate(revision).model_dump(), content=content)
+
+
+@router.post("/notes/{note_id}/revisions/{number}/restore", response_model=schemas.NoteOut)
+async def restore_revision(note_id: int, number: int, user: CurrentUser = Depends(require_writer),
+                           note=Depends(get_readable_note), db: AsyncSession = Depends(get_db)):
+    """Make an old revision current again; it is saved as a new revision"""
+    restored = await crud_async.restore_revision(db, note_id, number)
+    if not restored:
+        raise HTTPException(404, "Revision not found")
+    return restored
+
+
+def _sync_change(item) -> schemas.SyncChange:
+    if isinstance(item, models.NoteTombstone):
+        return schemas.SyncChange(id=item.note_id, seq=item.change_seq, deleted=True)
+    return schemas.SyncChange(id=item.id, seq=item.change_seq, version=item.version, title=item.title,
+                              content=item.content, tags=item.tags, created_at=item.created_at, updated_at=item.updated_at)
+
+
+@router.get("/sync", response_model=schemas.SyncPage, response_model_exclude_none=True)
+async def sync_notes(cursor: Optional[str] = None, limit: int = Query(100, ge=1, le=SYNC_MAX_BATCH),
+                     user: CurrentUser = Depends(require_user), db: AsyncSession = Depends(get_db)):
+    """The caller's notes changed or deleted since cursor, oldest change first.
+
+    Start without a cursor (every note), then send the returned cursor each
+    time; call again at once while has_more is true. 410 means the cursor is
+    too old: drop the local copy and start again without one.
+    """
+    decoded = None
+    if cursor:
+        decoded = sync.decode_cursor(cursor)
+        if decoded is None:
+            raise HTTPException(400, "Invalid cursor")
+    try:
+        changes = await crud_async.get_changes(db, user.id, decoded, limit)
+    except sync.CursorExpired:
+        raise HTTPException(410, "Cursor expired; sync again without a cursor")
+    return schemas.SyncPage(changes=[_sync_change(item) for item in changes.items],
+                            cursor=sync.encode_cursor(changes.cursor), has_more=changes.has_more)
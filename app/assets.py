@@ -0,0 +1,106 @@
+"""Fingerprinted, precompressed static assets.
+
+load() (at startup) reads every file under app/static once and names it after
+a hash of its content: style.css is served as /static/style.<hash>.css.
+Templates link through static_url('style.css'), so an edited file gets a new
+URL and hashed URLs can be cached forever (Cache-Control: immutable, one
+year). CSS, JS, SVG and other text files are also compressed once, at the
+strongest setting, into gzip and (with the 'brotli' package) brotli
+variants; each request gets the best one its Accept-Encoding allows.
+
+The unhashed path (/static/style.css) still works, revalidated by ETag. The
+files are held in memory, which suits a small static directory.
+"""
+import hashlib
+import mimetypes
+import os
+
+from fastapi.responses import Response
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers, MutableHeaders
+
+from app import compression, pagecache
+
+STATIC_DIR = os.path.join(os.path.dirname(__file__), "static")
+STATIC_URL = "/static"
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "public, no-cache"
+HASH_LENGTH = 12
+COMPRESSIBLE = ("text/", "application/javascript", "application/json", "image/svg+xml")
+
+
+class Asset:
+    def __init__(self, name: str, data: bytes):
+        digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+        stem, ext = os.path.splitext(name)
+        self.name = name
+        self.hashed_name = f"{stem}.{digest}{ext}"
+        self.etag = f'W/"{digest}"'  # weak: one validator for every encoding of the same content
+        content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        if content_type.startswith("text/"):
+            content_type += "; charset=utf-8"
+        self.content_type = content_type
+        self.bodies = {None: data}  # encoding (None: identity) -> bytes
+        if content_type.startswith(COMPRESSIBLE):
+            for encoding in compression.ENCODINGS:
+                packed = compression.compress(data, encoding)
+                if len(packed) < len(data):
+                    self.bodies[encoding] = packed
+
+    def response(self, headers: Headers, cache_control: str) -> Response:
+        response_headers = MutableHeaders({"Cache-Control": cache_control, "ETag": self.etag})
+        if len(self.bodies) > 1:
+            compression.add_vary(response_headers)
+        if pagecache.is_not_modified(headers, self.etag):
+            return Response(status_code=304, headers=dict(response_headers))
+        encoding = compression.choose_encoding(headers.get("accept-encoding"), [e for e in self.bodies if e])
+        if encoding:
+            response_headers["Content-Encoding"] = encoding
+        return Response(self.bodies[encoding], media_type=self.content_type, headers=dict(response_headers))
+
+
+_assets = None  # name and hashed name -> (Asset, Cache-Control)
+
+
+def load() -> int:
+    """Hash and compress everything under STATIC_DIR; returns the number of files"""
+    global _assets
+    assets = {}
+    count = 0
+    for root, _, files in os.walk(STATIC_DIR):
+        for filename in files:
+            path = os.path.join(root, filename)
+            name = os.path.relpath(path, STATIC_DIR).replace(os.sep, "/")
+            with open(path, "rb") as f:
+                asset = Asset(name, f.read())
+            assets[name] = (asset, REVALIDATE)
+            assets[asset.hashed_name] = (asset, IMMUTABLE)
+            count += 1
+    _assets = assets
+    return count
+
+
+def _lookup(name: str):
+    if _assets is None:
+        load()
+    return _assets.get(name)
+
+
+def static_url(name: str) -> str:
+    """The fingerprinted URL of a file under app/static (a Jinja global)"""
+    found = _lookup(name)
+    return f"{STATIC_URL}/{found[0].hashed_name if found else name}"
+
+
+class StaticAssets(StaticFiles):
+    """Serves the loaded assets; files added since load() fall back to plain StaticFiles"""
+
+    def __init__(self):
+        super().__init__(directory=STATIC_DIR)
+
+    async def get_response(self, path: str, scope) -> Response:
+        found = _lookup(path.replace(os.sep, "/"))
+        if found is None or scope["method"] not in ("GET", "HEAD"):
+            return await super().get_response(path, scope)
+        asset, cache_control = found
+        return asset.response(Headers(scope=scope), cache_control)
@@ -1,9 +1,134 @@
-from passlib.context import CryptContext
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from app import instrumentation
+
+# bcrypt cost factor; hashes made with another cost are upgraded on the next login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+# "process" scales across cores past the GIL, "thread" avoids the extra processes
+HASH_EXECUTOR = os.getenv("HASH_EXECUTOR", "process")
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(os.cpu_count() or 1)))
+# Jobs allowed to wait for a worker before callers get HashingBusy (HTTP 429)
+HASH_QUEUE_SIZE = int(os.getenv("HASH_QUEUE_SIZE", str(HASH_WORKERS * 8)))
+
+_pwd_context = None
+
+def pwd_context():
+    """The passlib context, built on first use: importing passlib slows every worker's start"""
+    global _pwd_context
+    if _pwd_context is None:
+        from passlib.context import CryptContext
+        _pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+    return _pwd_context
 
 def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+    return pwd_context().hash(password)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return pwd_context().verify(plain_password, hashed_password)
+
+def verify_and_update(plain_password: str, hashed_password: str):
+    """Return (valid, new_hash); new_hash is set when the stored hash uses an outdated cost"""
+    return pwd_context().verify_and_update(plain_password, hashed_password)
+
+
+class HashingBusy(Exception):
+    """Raised when every hashing worker is busy and the queue is full"""
+
+
+_executor = None
+_executor_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(HASH_WORKERS + HASH_QUEUE_SIZE)
+_stats_lock = threading.Lock()
+_stats = {"submitted": 0, "completed": 0, "failed": 0, "rejected": 0, "in_flight": 0, "seconds_total": 0.0}
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            if HASH_EXECUTOR == "thread":
+                _executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="bcrypt")
+            else:
+                # spawn: never fork a process that holds DB connections and threads
+                _executor = ProcessPoolExecutor(
+                    max_workers=HASH_WORKERS, mp_context=multiprocessing.get_context("spawn")
+                )
+        return _executor
+
+
+def _timed(fn, *args):
+    started = time.perf_counter()
+    return fn(*args), time.perf_counter() - started
+
+
+def _record(future):
+    _slots.release()
+    with _stats_lock:
+        _stats["in_flight"] -= 1
+        if future.cancelled() or future.exception() is not None:
+            _stats["failed"] += 1
+        else:
+            _stats["completed"] += 1
+            _stats["seconds_total"] += future.result()[1]
+
+
+def _submit(fn, *args):
+    if not _slots.acquire(blocking=False):
+        with _stats_lock:
+            _stats["rejected"] += 1
+        raise HashingBusy()
+    with _stats_lock:
+        _stats["submitted"] += 1
+        _stats["in_flight"] += 1
+    try:
+        future = _get_executor().submit(_timed, fn, *args)
+    except Exception:
+        _slots.release()
+        with _stats_lock:
+            _stats["in_flight"] -= 1
+            _stats["failed"] += 1
+        raise
+    future.add_done_callback(_record)
+    return future
+
+
+async def _run(fn, *args):
+    started = time.perf_counter()
+    try:
+        result, _ = await asyncio.wrap_future(_submit(fn, *args))
+    finally:
+        # Queueing included: that is what the request waited for
+        instrumentation.record_bcrypt(time.perf_counter() - started)
+    return result
+
+
+async def hash_password_async(password: str) -> str:
+    """hash_password on the hashing pool; raises HashingBusy when saturated"""
+    return await _run(hash_password, password)
+
+
+async def verify_and_update_async(plain_password: str, hashed_password: str):
+    """verify_and_update on the hashing pool; raises HashingBusy when saturated"""
+    return await _run(verify_and_update, plain_password, hashed_password)
+
+
+def hashing_stats() -> dict:
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["workers"] = HASH_WORKERS
+    stats["queue_size"] = HASH_QUEUE_SIZE
+    return stats
+
+
+def shutdown_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True, cancel_futures=True)
+            _executor = None
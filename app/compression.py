@@ -0,0 +1,169 @@
+"""Negotiated response compression: brotli when the 'brotli' package is installed, else gzip.
+
+CompressionMiddleware compresses HTML, JSON and NDJSON responses of
+COMPRESS_MIN_BYTES or more for clients that accept it. Streamed responses
+(large note pages, exports) are compressed chunk by chunk as they stream, so
+memory stays flat. Responses that already carry a Content-Encoding (the
+precompressed static assets, see app.assets) and other content types, such as
+text/event-stream, pass through untouched. A compressed response's ETag is
+made weak, as the bytes differ from the uncompressed page's;
+pagecache.is_not_modified compares ETags weakly, so revalidation still gets 304.
+"""
+import gzip
+import os
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # optional: pip install brotli
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+COMPRESS_GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", "6"))
+COMPRESS_BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY", "4"))  # 11 is far too slow per request
+COMPRESS_TYPES = ("text/html", "application/json", "application/x-ndjson")
+
+# Server preference order, best first
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def choose_encoding(accept_encoding: str, available=ENCODINGS):
+    """The client's most preferred encoding among `available` (ties go to the earlier one), or None"""
+    weights = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        weight = 1.0
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[name] = weight
+    best, best_weight = None, 0.0
+    for encoding in available:
+        weight = weights.get(encoding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+class _GzipStream:
+    def __init__(self, level: int):
+        self._z = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # gzip framing
+
+    def process(self, data: bytes) -> bytes:
+        return self._z.compress(data)
+
+    def finish(self) -> bytes:
+        return self._z.flush()
+
+
+def compressor(encoding: str):
+    """A streaming compressor with process(bytes) and finish()"""
+    if encoding == "br":
+        return brotli.Compressor(quality=COMPRESS_BROTLI_QUALITY)
+    return _GzipStream(COMPRESS_GZIP_LEVEL)
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    """One-shot compression at the strongest setting, for content compressed once and served many times"""
+    if encoding == "br":
+        return brotli.compress(data, quality=11)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def add_vary(headers: MutableHeaders):
+    vary = headers.get("vary")
+    if not vary:
+        headers["Vary"] = "Accept-Encoding"
+    elif "accept-encoding" not in vary.lower():
+        headers["Vary"] = f"{vary}, Accept-Encoding"
+
+
+class CompressionMiddleware:
+    """Pure ASGI middleware, like InstrumentationMiddleware, so streaming responses stay streamed"""
+
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding"))
+        await self.app(scope, receive, _Responder(send, encoding, self.minimum_size).send)
+
+
+class _Responder:
+    """Holds back the response start until the first body chunk shows whether compression pays"""
+
+    def __init__(self, send, encoding, minimum_size: int):
+        self._send = send
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.start = None
+        self.stream = None
+        self.passthrough = False
+
+    async def send(self, message):
+        if self.passthrough:
+            await self._send(message)
+        elif message["type"] == "http.response.start":
+            await self._start(message)
+        elif message["type"] == "http.response.body":
+            await self._body(message)
+        else:
+            await self._send(message)
+
+    async def _start(self, message):
+        headers = MutableHeaders(raw=list(message.get("headers", [])))
+        content_type = headers.get("content-type", "").split(";")[0].strip().lower()
+        if content_type not in COMPRESS_TYPES or "content-encoding" in headers or "content-range" in headers:
+            self.passthrough = True
+            await self._send(message)
+            return
+        add_vary(headers)
+        message = {**message, "headers": headers.raw}
+        if self.encoding is None or message["status"] in (204, 304):
+            self.passthrough = True
+            await self._send(message)
+            return
+        self.start = message
+
+    async def _body(self, message):
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.stream is None:
+            if not more_body and len(body) < self.minimum_size:
+                self.passthrough = True
+                await self._send(self.start)
+                await self._send(message)
+                return
+            self.stream = compressor(self.encoding)
+            headers = MutableHeaders(raw=self.start["headers"])
+            headers["Content-Encoding"] = self.encoding
+            del headers["Content-Length"]
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                headers["ETag"] = "W/" + etag
+            if not more_body:
+                body = self.stream.process(body) + self.stream.finish()
+                headers["Content-Length"] = str(len(body))
+                await self._send(self.start)
+                await self._send({"type": "http.response.body", "body": body})
+                return
+            await self._send(self.start)
+
+        data = self.stream.process(body)
+        if not more_body:
+            data += self.stream.finish()
+        if data or not more_body:
+            await self._send({"type": "http.response.body", "body": data, "more_body": more_body})
@@ -0,0 +1,83 @@
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.orm import Session
+
+import app.models as models
+from app.database import use_primary
+
+ALL_NOTES = "notes:all"
+
+
+def user_notes(user_id: int) -> str:
+    return f"notes:user:{user_id}"
+
+
+def get(db: Session, name: str) -> int:
+    """Current value of a counter; 0 if it has no row yet"""
+    return db.scalar(select(models.Counter.value).where(models.Counter.name == name)) or 0
+
+
+def incr(db: Session, name: str, delta: int = 1):
+    """Adjust a counter inside the caller's transaction, creating it if missing"""
+    add(db, {name: delta})
+
+
+def add(db: Session, deltas: dict):
+    """Add deltas (name -> amount) inside the caller's transaction, creating missing counters.
+
+    Rows are written in name order, so concurrent writers lock them in the
+    same order.
+    """
+    rows = [{"name": name, "value": delta} for name, delta in sorted(deltas.items()) if delta]
+    if not rows:
+        return
+    table = models.Counter.__table__
+    dialect = db.get_bind().dialect.name
+    if dialect in ("mysql", "mariadb"):
+        stmt = mysql.insert(table)
+        db.execute(stmt.on_duplicate_key_update(value=table.c.value + stmt.inserted.value), rows)
+    elif dialect in ("sqlite", "postgresql"):
+        stmt = (sqlite.insert if dialect == "sqlite" else postgresql.insert)(table)
+        db.execute(stmt.on_conflict_do_update(index_elements=["name"],
+                                              set_={"value": table.c.value + stmt.excluded.value}), rows)
+    else:
+        for row in rows:
+            if db.execute(update(table).where(table.c.name == row["name"])
+                          .values(value=table.c.value + row["value"])).rowcount == 0:
+                db.execute(table.insert().values(**row))
+
+
+def note_added(db: Session, owner_id: int, n: int = 1):
+    add(db, {ALL_NOTES: n, user_notes(owner_id): n})
+
+
+def note_removed(db: Session, owner_id: int, n: int = 1):
+    add(db, {ALL_NOTES: -n, user_notes(owner_id): -n})
+
+
+def recount(db: Session):
+    """Count every note counter again from the notes table (repairs drift); commits.
+
+    Migration 0002 seeds them. Databases that ran it before it did, run this
+    once (python -m app.counters). Writes during the recount can be lost, so
+    run it while nothing writes.
+    """
+    use_primary(db)
+    db.query(models.Counter).filter(models.Counter.name.like("notes:%")).delete(synchronize_session=False)
+    Note = models.Note
+    counts = {ALL_NOTES: db.scalar(select(func.count()).select_from(Note)) or 0}
+    for owner_id, count in db.execute(
+        select(Note.owner_id, func.count()).where(Note.owner_id.isnot(None)).group_by(Note.owner_id)
+    ):
+        counts[user_notes(owner_id)] = count
+    add(db, counts)
+    db.commit()
+
+
+if __name__ == "__main__":
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    recount(db)
+    print(f"✅ Note counters reset ({get(db, ALL_NOTES)} notes)")
+    db.close()
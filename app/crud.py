@@ -1,72 +1,448 @@
-from sqlalchemy.orm import Session
+from datetime import datetime
+from sqlalchemy import bindparam, delete, insert, select, update
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.orm.attributes import set_committed_value
 import app.models as models
 import app.schemas as schemas
 import app.auth as auth
+import app.search_index as search_index
+import app.counters as counters
+import app.usercache as usercache
+import app.pagecache as pagecache
+import app.storage as storage
+import app.revisions as revisions
+import app.events as events
+import app.sync as sync
+import app.tags as tags
+import app.stats as stats
+from app.database import use_primary
+from app.pagination import Page, keyset_page, offset_page
 
 # User functions
 def get_user_by_email(db: Session, email: str):
     return db.query(models.User).filter(models.User.email == email).first()
 
-def create_user(db: Session, user_in: schemas.UserCreate, role: str = "user"):
-    hashed_pw = auth.hash_password(user_in.password)
+def create_user(db: Session, user_in: schemas.UserCreate, role: str = "user", hashed_password: str = None):
+    # Async routes hash on the worker pool and pass the result in
+    hashed_pw = hashed_password or auth.hash_password(user_in.password)
     db_user = models.User(username=user_in.username, email=user_in.email, password=hashed_pw, role=role)
     db.add(db_user)
+    stats.user_added(db)
     db.commit()
     db.refresh(db_user)
     return db_user
 
+def set_user_role(db: Session, user_id: int, role: str):
+    user = db.get(models.User, user_id)
+    if not user:
+        return None
+    user.role = role
+    db.commit()
+    usercache.invalidate(user_id)
+    return user
+
+def update_password_hash(db: Session, user: models.User, new_hash: str):
+    """Store a re-hashed (same) password, e.g. after the bcrypt cost changed"""
+    user.password = new_hash
+    db.commit()
+    usercache.invalidate(user.id)
+
 def authenticate_user(db: Session, email: str, password: str):
     user = get_user_by_email(db, email)
-    if user and auth.verify_password(password, user.password):
-        return user
-    return None
+    if not user:
+        return None
+    valid, new_hash = auth.verify_and_update(password, user.password)
+    if not valid:
+        return None
+    if new_hash:
+        update_password_hash(db, user, new_hash)
+    return user
 
 # Note functions
+PREVIEW_LENGTH = 200
+
+def make_preview(content: str) -> str:
+    """The start of the content on one line, cut at a word boundary, for list pages"""
+    text = " ".join(content[:PREVIEW_LENGTH * 2].split())
+    if len(text) <= PREVIEW_LENGTH and len(content) <= PREVIEW_LENGTH * 2:
+        return text
+    cut = text[:PREVIEW_LENGTH]
+    if " " in cut[PREVIEW_LENGTH // 2:]:
+        cut = cut.rsplit(" ", 1)[0]
+    return cut + "…"
+
 def create_note(db: Session, note_in: schemas.NoteCreate, user_id: int):
-    db_note = models.Note(**note_in.dict(), owner_id=user_id)
+    db_note = models.Note(**note_in.model_dump(exclude={"tags"}), tag_text=tags.join(note_in.tags),
+                          preview=make_preview(note_in.content), owner_id=user_id,
+                          change_seq=sync.allocate(db, user_id))
     db.add(db_note)
+    db.flush()
+    search_index.index_notes(db, [db_note])
+    counters.note_added(db, user_id)
+    stats.notes_created(db, user_id, [storage.size(db_note)])
+    tagged = [(db_note.id, [], note_in.tags)]
+    tags.assign(db, user_id, tagged)
+    revisions.record(db, [(db_note.id, note_in.title, note_in.content, None)])
     db.commit()
+    pagecache.note_changed(db_note.id, user_id)
+    tags.notes_tagged(user_id, tagged, db_note.change_seq)
     db.refresh(db_note)
+    events.notes_saved(events.CREATED, [db_note])
     return db_note
 
-def get_note(db: Session, note_id: int):
-    return db.query(models.Note).filter(models.Note.id == note_id).first()
+def get_note(db: Session, note_id: int, options=()):
+    return db.query(models.Note).options(*options).filter(models.Note.id == note_id).first()
+
+class VersionConflict(Exception):
+    """The note was saved by someone else after the version being edited was read"""
 
-def update_note(db: Session, note_id: int, data: schemas.NoteUpdate):
+    def __init__(self, note):
+        super().__init__(f"note {note.id} is at version {note.version}")
+        self.note = note  # as it is now
+
+def _note_filters(note_id: int, owner_id: int = None, version: int = None):
+    filters = [models.Note.id == note_id]
+    if owner_id is not None:
+        filters.append(models.Note.owner_id == owner_id)
+    if version is not None:
+        filters.append(models.Note.version == version)
+    return filters
+
+def _write_missed(db: Session, note_id: int, owner_id: int = None):
+    """A conditional write matched no row: None if the note is gone or not owner_id's, else a conflict"""
+    db.rollback()
     note = get_note(db, note_id)
-    if note:
-        note.title = data.title
-        note.content = data.content
-        db.commit()
-        db.refresh(note)
+    if note is None or (owner_id is not None and note.owner_id != owner_id):
+        return None
+    raise VersionConflict(note)
+
+def update_note(db: Session, note_id: int, data: schemas.NoteUpdate, owner_id: int = None):
+    """Save a new title and body; None if the note is missing or not owner_id's.
+
+    The UPDATE itself checks the id, owner and version, so a concurrent save
+    between reading and writing is caught. Raises VersionConflict when
+    data.version is given and is no longer the note's version.
+    """
+    use_primary(db)
+    filters = _note_filters(note_id, owner_id, data.version)
+    # The version being replaced, which the revision delta is taken against
+    note = db.query(models.Note).filter(*filters).first()
+    if note is None:
+        return _write_missed(db, note_id, owner_id)
+    previous = (note.title, note.content)
+    previous_size = storage.size(note)
+    values = {"title": data.title, **storage.columns(data.content), "preview": make_preview(data.content),
+              "version": note.version + 1, "updated_at": datetime.utcnow(),
+              "change_seq": sync.allocate(db, note.owner_id)}
+    tagged = []
+    if data.tags is not None:
+        values["tag_text"] = tags.join(data.tags)
+        tagged.append((note.id, note.tags, data.tags))
+    result = db.execute(
+        update(models.Note).where(*filters, models.Note.version == note.version).values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        return _write_missed(db, note_id, owner_id)
+    # Mirror the write on the loaded note, so returning it needs no refresh
+    for key, value in values.items():
+        set_committed_value(note, key, value)
+    search_index.index_notes(db, [note])
+    stats.notes_updated(db, note.owner_id, [(previous_size, values["content_size"])])
+    tags.assign(db, note.owner_id, tagged)
+    revisions.record(db, [(note.id, data.title, data.content, previous)])
+    db.commit()
+    pagecache.note_changed(note.id, note.owner_id)
+    tags.notes_tagged(note.owner_id, tagged, values["change_seq"])
+    events.notes_saved(events.UPDATED, [note])
     return note
 
-def delete_note(db: Session, note_id: int):
-    note = get_note(db, note_id)
-    if note:
-        db.delete(note)
-        db.commit()
-        return True
-    return False
+def delete_note(db: Session, note_id: int, owner_id: int, version: int = None):
+    """Delete with one conditional DELETE; False if the note is missing or not owner_id's.
+
+    Raises VersionConflict when version is given and the note has moved on.
+    """
+    use_primary(db)
+    # First, like every note write: the owner's sequence row is the first lock taken (see app.sync)
+    seq = sync.add_tombstones(db, owner_id, [note_id])
+    # Before the DELETE, which cascades to note_tags where foreign keys are enforced
+    untagged = tags.remove_notes(db, owner_id, [note_id])
+    sizes = stats.note_sizes(db, [note_id])
+    result = db.execute(
+        delete(models.Note).where(*_note_filters(note_id, owner_id, version))
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        _write_missed(db, note_id, owner_id)  # raises on a version conflict
+        return False
+    search_index.remove_notes(db, [note_id])
+    revisions.remove_notes(db, [note_id])
+    counters.note_removed(db, owner_id)
+    stats.notes_deleted(db, owner_id, sizes.values())
+    db.commit()
+    pagecache.note_changed(note_id, owner_id)
+    tags.notes_tagged(owner_id, untagged, seq)
+    events.notes_deleted([note_id], owner_id)
+    return True
+
+# Revision functions
+def get_revisions(db: Session, note_id: int, before: int = None, limit: int = 50):
+    return revisions.get_revisions(db, note_id, before=before, limit=limit)
+
+def get_revision(db: Session, note_id: int, number: int):
+    """(revision, content) or None"""
+    return revisions.get_revision(db, note_id, number)
+
+def restore_revision(db: Session, note_id: int, number: int):
+    """Save an old revision as the note's current version (recorded as a new revision)"""
+    found = revisions.get_revision(db, note_id, number)
+    if not found:
+        return None
+    revision, content = found
+    return update_note(db, note_id, schemas.NoteUpdate(title=revision.title, content=content))
 
-def get_notes_by_user(db: Session, user_id: int, search: str = None, offset: int = 0, limit: int = 10):
-    q = db.query(models.Note).filter(models.Note.owner_id == user_id)
+# Statistics
+def get_stats(db: Session):
+    """The superadmin dashboard's numbers (stats.Stats), read from maintained counters"""
+    return stats.get_stats(db)
+
+# Sync
+def get_changes(db: Session, user_id: int, cursor: sync.Cursor = None, limit: int = 100):
+    """sync.Changes after cursor; raises sync.CursorExpired if the client must start over"""
+    return sync.get_changes(db, user_id, cursor, limit)
+
+def purge_tombstones(db: Session, batch_size: int = 1000) -> int:
+    use_primary(db)
+    return sync.purge_tombstones(db, batch_size)
+
+# Bulk note functions: one transaction each, whole batch or nothing
+def _owned_note_ids(db: Session, note_ids, user_id: int) -> set:
+    return set(db.scalars(
+        select(models.Note.id).where(models.Note.id.in_(set(note_ids)), models.Note.owner_id == user_id)
+    ))
+
+def create_notes(db: Session, notes_in, user_id: int):
+    """Insert many notes in one transaction, as batched multi-row INSERTs where the driver allows"""
+    now = datetime.utcnow()
+    rows = [{"title": n.title, **storage.columns(n.content), "preview": make_preview(n.content),
+             "tag_text": tags.join(n.tags), "owner_id": user_id, "created_at": now, "updated_at": now}
+            for n in notes_in]
+    if not rows:
+        return []
+    use_primary(db)
+    first_seq = sync.allocate(db, user_id, len(rows))
+    for i, row in enumerate(rows):
+        row["change_seq"] = first_seq + i
+    if db.get_bind().dialect.insert_executemany_returning:
+        # Unordered RETURNING lets SQLAlchemy batch rows into multi-row INSERTs
+        db_notes = sorted(db.scalars(insert(models.Note).returning(models.Note), rows), key=lambda n: n.id)
+    else:
+        # No RETURNING (MySQL): the ORM inserts row by row to learn each id
+        db_notes = [models.Note(**row) for row in rows]
+        db.add_all(db_notes)
+        db.flush()
+    search_index.index_notes(db, db_notes)
+    counters.note_added(db, user_id, len(db_notes))
+    stats.notes_created(db, user_id, [row["content_size"] for row in rows])
+    tagged = [(note.id, [], note.tags) for note in db_notes if note.tag_text]
+    tags.assign(db, user_id, tagged)
+    revisions.record(db, [(note.id, note.title, note.content, None) for note in db_notes])
+    db.commit()
+    for note in db_notes:
+        pagecache.note_changed(note.id, user_id)
+    tags.notes_tagged(user_id, tagged, first_seq, len(rows))
+    events.notes_saved(events.CREATED, db_notes)
+    return db_notes
+
+def _column_values(values: dict) -> dict:
+    """Attribute-keyed values (as storage.columns gives them) keyed by table column instead"""
+    mapper = models.Note.__mapper__
+    return {mapper.get_property(key).columns[0].key: value for key, value in values.items()}
+
+def update_notes(db: Session, updates, user_id: int):
+    """Update many notes with one executemany UPDATE, each row conditional on its version.
+
+    Returns the updated notes, or None (and changes nothing) if any id is
+    missing or owned by someone else. Raises VersionConflict (and changes
+    nothing) if an item's version is stale or a note is saved concurrently.
+    """
+    updates = list(updates)
+    ids = [u.id for u in updates]
+    if not ids:
+        return []
+    use_primary(db)
+    # Current versions: the ownership check, and what the revisions diff against
+    notes = {n.id: n for n in get_notes_by_ids(db, list(set(ids))) if n.owner_id == user_id}
+    if len(notes) != len(set(ids)):
+        return None
+    for u in updates:
+        if u.version is not None and u.version != notes[u.id].version:
+            raise VersionConflict(notes[u.id])
+    current = {note_id: (n.title, n.content) for note_id, n in notes.items()}
+    current_tags = {note_id: n.tags for note_id, n in notes.items()}
+    current_sizes = {note_id: storage.size(n) for note_id, n in notes.items()}
+    tagged, resized = [], []
+    read = {note_id: n.version for note_id, n in notes.items()}
+    expected = dict(read)
+    changes = []
+    now = datetime.utcnow()
+    rows = []
+    first_seq = sync.allocate(db, user_id, len(updates))
+    for i, u in enumerate(updates):
+        changes.append((u.id, u.title, u.content, current[u.id]))
+        current[u.id] = (u.title, u.content)
+        # Every row sets the same columns: an item without tags keeps what the note has
+        if u.tags is not None:
+            tagged.append((u.id, current_tags[u.id], u.tags))
+            current_tags[u.id] = u.tags
+        stored = storage.columns(u.content)
+        resized.append((current_sizes[u.id], stored["content_size"]))
+        current_sizes[u.id] = stored["content_size"]
+        # A repeated id updates the row the previous item left behind
+        rows.append({"b_id": u.id, "b_version": expected[u.id], "version": expected[u.id] + 1,
+                     "change_seq": first_seq + i,
+                     **_column_values({"title": u.title, **stored,
+                                       "preview": make_preview(u.content), "tag_text": tags.join(current_tags[u.id]),
+                                       "updated_at": now})})
+        expected[u.id] += 1
+    table = models.Note.__table__
+    stmt = table.update().where(table.c.id == bindparam("b_id"), table.c.version == bindparam("b_version"))
+    if db.get_bind().dialect.supports_sane_multi_rowcount:
+        matched = db.execute(stmt, rows).rowcount
+    else:
+        matched = sum(db.execute(stmt, row).rowcount for row in rows)
+    if matched != len(rows):
+        db.rollback()
+        now_notes = get_notes_by_ids(db, list(set(ids)))
+        raise VersionConflict(next((n for n in now_notes if n.version != read[n.id]), now_notes[0]))
+    # Transient copies of each note's final state: the index only needs id, owner and text
+    final = {u.id: u for u in updates}
+    search_index.index_notes(db, [models.Note(id=u.id, title=u.title, content=u.content, owner_id=user_id)
+                                  for u in final.values()])
+    stats.notes_updated(db, user_id, resized)
+    tags.assign(db, user_id, tagged)
+    revisions.record(db, changes)
+    db.commit()
+    for note_id in set(ids):
+        pagecache.note_changed(note_id, user_id)
+    tags.notes_tagged(user_id, tagged, first_seq, len(updates))
+    db.expire_all()
+    updated = get_notes_by_ids(db, list(dict.fromkeys(ids)))
+    events.notes_saved(events.UPDATED, updated)
+    return updated
+
+def delete_notes(db: Session, note_ids, user_id: int):
+    """Delete many notes with a single DELETE ... WHERE id IN (...).
+
+    Returns the number deleted, or None (and deletes nothing) if any id is
+    missing or owned by someone else.
+    """
+    ids = set(note_ids)
+    if not ids:
+        return 0
+    use_primary(db)  # the ownership check must see notes created a moment ago
+    if _owned_note_ids(db, ids, user_id) != ids:
+        return None
+    first_seq = sync.add_tombstones(db, user_id, sorted(ids))
+    untagged = tags.remove_notes(db, user_id, ids)
+    sizes = stats.note_sizes(db, ids)
+    search_index.remove_notes(db, ids)
+    revisions.remove_notes(db, ids)
+    counters.note_removed(db, user_id, len(ids))
+    stats.notes_deleted(db, user_id, sizes.values())
+    db.execute(delete(models.Note).where(models.Note.id.in_(ids)).execution_options(synchronize_session=False))
+    db.commit()
+    for note_id in ids:
+        pagecache.note_changed(note_id, user_id)
+    tags.notes_tagged(user_id, untagged, first_seq, len(ids))
+    events.notes_deleted(ids, user_id)
+    return len(ids)
+
+def get_notes_after(db: Session, user_id: int, after_id: int = 0, limit: int = 1000):
+    """Next batch of a user's notes in id order; for exports that walk every note"""
+    return db.query(models.Note).filter(
+        models.Note.owner_id == user_id, models.Note.id > after_id
+    ).order_by(models.Note.id).limit(limit).all()
+
+# Loader options for pages that render the owner's name (avoids one SELECT per row)
+WITH_OWNER = (joinedload(models.Note.owner),)
+
+# What the list pages render: named-tuple rows without content, so a page of
+# large notes stays small on the wire
+SUMMARY_COLUMNS = (
+    models.Note.id, models.Note.title, models.Note.preview, models.Note.tag_text, models.Note.created_at,
+    models.Note.updated_at, models.Note.owner_id, models.Note.version, models.User.username.label("owner_username"),
+)
+
+def _summaries(db: Session):
+    return db.query(*SUMMARY_COLUMNS).outerjoin(models.User, models.Note.owner_id == models.User.id)
+
+def get_notes_by_ids(db: Session, note_ids, options=()):
+    """Load notes keeping the order of note_ids (e.g. search ranking)"""
+    if not note_ids:
+        return []
+    notes = {n.id: n for n in db.query(models.Note).options(*options).filter(models.Note.id.in_(note_ids))}
+    return [notes[i] for i in note_ids if i in notes]
+
+def get_note_summaries_by_ids(db: Session, note_ids):
+    """Like get_notes_by_ids, but summary rows (see SUMMARY_COLUMNS)"""
+    if not note_ids:
+        return []
+    rows = {r.id: r for r in _summaries(db).filter(models.Note.id.in_(note_ids))}
+    return [rows[i] for i in note_ids if i in rows]
+
+def search_notes(db: Session, search: str, user_id: int = None, offset: int = 0, limit: int = 10, summary: bool = True):
+    """Ranked search; returns (total, Page) without keyset cursors"""
+    total, note_ids = search_index.search_notes(db, search, owner_id=user_id, offset=offset, limit=limit)
+    items = get_note_summaries_by_ids(db, note_ids) if summary else get_notes_by_ids(db, note_ids)
+    return total, Page(items, None, None)
+
+# Search hits a tag filter is applied to: a tagged search ranks within the best ones
+TAG_SEARCH_LIMIT = 1000
+
+def _tagged_notes(db: Session, user_id: int, tagged, match_all: bool, search: str, offset: int, limit: int,
+                  summary: bool):
+    """Notes with all (match_all) or any of the tags, by search rank or newest first; (total, Page) without cursors"""
     if search:
-        q = q.filter(models.Note.title.like(f"%{search}%"))
-    total = q.count()
-    items = q.offset(offset).limit(limit).all()
-    return total, items
+        matching = tags.note_ids(db, user_id, tagged, match_all)
+        ranked = search_index.search_notes(db, search, owner_id=user_id, limit=TAG_SEARCH_LIMIT)[1]
+        ranked = [note_id for note_id in ranked if note_id in matching]
+        total, note_ids = len(ranked), ranked[offset:offset + limit]
+    else:
+        # Ids grow with creation, so the largest are the newest; no query is needed to order them
+        total, note_ids = tags.newest(db, user_id, tagged, match_all, offset, limit)
+    items = get_note_summaries_by_ids(db, note_ids) if summary else get_notes_by_ids(db, note_ids)
+    return total, Page(items, None, None)
 
+def get_tags(db: Session, user_id: int):
+    """The user's tags in use, with their note counts"""
+    return tags.get_tags(db, user_id)
 
+def _list_notes(q, total: int, offset: int, limit: int, cursor: str):
+    if cursor or not offset:
+        return total, keyset_page(q, cursor, limit)
+    # Plain ?page=N links without a cursor still work, then continue with cursors
+    return total, offset_page(q, offset, limit)
 
-def get_all_notes(db: Session, search: str = None, offset: int = 0, limit: int = 10):
-    q = db.query(models.Note)
+# Listings return summary rows; pass summary=False for full Note objects (with content)
+def get_notes_by_user(db: Session, user_id: int, search: str = None, offset: int = 0, limit: int = 10,
+                      cursor: str = None, summary: bool = True, tagged=None, match_all: bool = True):
+    """tagged: tag names to filter by, all of them (match_all) or any"""
+    if tagged:
+        return _tagged_notes(db, user_id, tagged, match_all, search, offset, limit, summary)
     if search:
-        q = q.filter(models.Note.title.like(f"%{search}%"))
-    total = q.count()
-    items = q.offset(offset).limit(limit).all()
-    return total, items
+        return search_notes(db, search, user_id=user_id, offset=offset, limit=limit, summary=summary)
+    total = counters.get(db, counters.user_notes(user_id))
+    q = _summaries(db) if summary else db.query(models.Note)
+    return _list_notes(q.filter(models.Note.owner_id == user_id), total, offset, limit, cursor)
 
+def get_all_notes(db: Session, search: str = None, offset: int = 0, limit: int = 10,
+                  cursor: str = None, summary: bool = True):
+    if search:
+        return search_notes(db, search, offset=offset, limit=limit, summary=summary)
+    total = counters.get(db, counters.ALL_NOTES)
+    q = _summaries(db) if summary else db.query(models.Note).options(*WITH_OWNER)
+    return _list_notes(q, total, offset, limit, cursor)
 
 
 import secrets
@@ -76,23 +452,22 @@ def generate_reset_token():
     """Generate a secure random token for password reset"""
     return secrets.token_urlsafe(32)
 
+RESET_TOKEN_TTL = timedelta(hours=1)
+
 def create_password_reset_token(db: Session, email: str):
-    """Create a password reset token for the user"""
+    """Replace the user's reset tokens with a new one, in a single transaction"""
+    use_primary(db)
     user = get_user_by_email(db, email)
     if not user:
         return None
     
-    # Delete any existing tokens for this user
     db.query(models.PasswordResetToken).filter(
         models.PasswordResetToken.user_id == user.id
-    ).delete()
-    db.commit()
-    
-    # Create new token
+    ).delete(synchronize_session=False)
     token = models.PasswordResetToken(
         user_id=user.id,
         token=generate_reset_token(),
-        expires_at=datetime.utcnow() + timedelta(hours=1)
+        expires_at=datetime.utcnow() + RESET_TOKEN_TTL
     )
     db.add(token)
     db.commit()
@@ -101,23 +476,46 @@ def create_password_reset_token(db: Session, email: str):
 
 def validate_reset_token(db: Session, token: str):
     """Validate password reset token and return user if valid"""
+    use_primary(db)
+    now = datetime.utcnow()
     token_record = db.query(models.PasswordResetToken).filter(
         models.PasswordResetToken.token == token,
-        models.PasswordResetToken.expires_at > datetime.utcnow(),
+        models.PasswordResetToken.expires_at > now,
         models.PasswordResetToken.used == 0
     ).first()
     
     if not token_record:
         return None
     
-    # Mark token as used
+    # Mark token as used; expiring it too lets the sweeper find it by expires_at alone
     token_record.used = 1
+    token_record.expires_at = now
     db.commit()
     
     return token_record.user
 
-def reset_user_password(db: Session, user_id: int, new_password: str):
+def purge_reset_tokens(db: Session, batch_size: int = 1000) -> int:
+    """Delete expired (and used) tokens in chunks of batch_size, committing each; returns the count"""
+    use_primary(db)
+    now = datetime.utcnow()
+    deleted = 0
+    while True:
+        ids = list(db.scalars(
+            select(models.PasswordResetToken.id)
+            .where(models.PasswordResetToken.expires_at <= now)
+            .limit(batch_size)
+        ))
+        if not ids:
+            return deleted
+        db.execute(delete(models.PasswordResetToken).where(models.PasswordResetToken.id.in_(ids)))
+        db.commit()
+        deleted += len(ids)
+        if len(ids) < batch_size:
+            return deleted
+
+def reset_user_password(db: Session, user_id: int, new_password: str, hashed_password: str = None):
     """Reset user's password"""
+    use_primary(db)
     user = db.query(models.User).filter(models.User.id == user_id).first()
     if not user:
         return False
@@ -128,7 +526,8 @@ def reset_user_password(db: Session, user_id: int, new_password: str):
     ).delete()
     
     # Hash and update password
-    hashed_pw = auth.hash_password(new_password)
+    hashed_pw = hashed_password or auth.hash_password(new_password)
     user.password = hashed_pw
     db.commit()
+    usercache.invalidate(user_id)
     return True
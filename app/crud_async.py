@@ -0,0 +1,61 @@
+"""Async versions of the app.crud functions, for AsyncSession.
+
+Each one runs the sync implementation through AsyncSession.run_sync, which
+drives it on the async driver via SQLAlchemy's greenlet bridge: no thread is
+used and there is a single implementation of every query to maintain.
+"""
+import functools
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import app.crud as crud
+
+WITH_OWNER = crud.WITH_OWNER
+
+
+def _bridge(fn):
+    @functools.wraps(fn)
+    async def wrapper(db: AsyncSession, *args, **kwargs):
+        return await db.run_sync(fn, *args, **kwargs)
+    return wrapper
+
+
+# User functions
+get_user_by_email = _bridge(crud.get_user_by_email)
+create_user = _bridge(crud.create_user)
+set_user_role = _bridge(crud.set_user_role)
+update_password_hash = _bridge(crud.update_password_hash)
+authenticate_user = _bridge(crud.authenticate_user)
+
+# Note functions
+create_note = _bridge(crud.create_note)
+get_note = _bridge(crud.get_note)
+update_note = _bridge(crud.update_note)
+delete_note = _bridge(crud.delete_note)
+get_notes_by_ids = _bridge(crud.get_notes_by_ids)
+get_note_summaries_by_ids = _bridge(crud.get_note_summaries_by_ids)
+search_notes = _bridge(crud.search_notes)
+get_notes_by_user = _bridge(crud.get_notes_by_user)
+get_all_notes = _bridge(crud.get_all_notes)
+create_notes = _bridge(crud.create_notes)
+update_notes = _bridge(crud.update_notes)
+delete_notes = _bridge(crud.delete_notes)
+get_notes_after = _bridge(crud.get_notes_after)
+get_tags = _bridge(crud.get_tags)
+
+# Revision functions
+get_revisions = _bridge(crud.get_revisions)
+get_revision = _bridge(crud.get_revision)
+restore_revision = _bridge(crud.restore_revision)
+
+# Statistics
+get_stats = _bridge(crud.get_stats)
+
+# Sync
+get_changes = _bridge(crud.get_changes)
+
+# Password reset functions
+create_password_reset_token = _bridge(crud.create_password_reset_token)
+validate_reset_token = _bridge(crud.validate_reset_token)
+purge_reset_tokens = _bridge(crud.purge_reset_tokens)
+reset_user_password = _bridge(crud.reset_user_password)
@@ -0,0 +1,39 @@
+"""Request dependencies shared by the HTML routes and the JSON API"""
+from typing import Optional
+
+from fastapi import Depends, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import models, sessions, usercache
+from app.usercache import CurrentUser
+from app.database import AsyncSessionLocal
+
+
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def session_token(request: Request) -> Optional[str]:
+    """Session token from the cookie, or from an 'Authorization: Bearer' header (API clients)"""
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and token:
+        return token.strip()
+    return request.cookies.get(sessions.SESSION_COOKIE)
+
+
+async def get_current_user(request: Request, db: AsyncSession = Depends(get_db)) -> Optional[CurrentUser]:
+    """Resolve the signed session token; the database is only hit on a cache miss"""
+    claims = sessions.read_session_token(session_token(request))
+    if not claims:
+        return None
+    user = usercache.get(claims["uid"])
+    if user is None:
+        db_user = await db.get(models.User, claims["uid"])
+        if not db_user:
+            return None
+        user = usercache.put(db_user)
+    # A role change or password reset since login ends the session
+    if user.role != claims["role"] or user.password_fingerprint != claims["pwd"]:
+        return None
+    return user
@@ -0,0 +1,235 @@
+"""Note change events for live list pages, pushed as server-sent events.
+
+The crud write functions publish an event after each commit: a note was
+created, updated or deleted. The broker hands it to the open /notes/events
+streams showing that note: its owner's (?scope=my) and superadmins' All
+Notes pages (?scope=all). The list pages patch themselves instead of being
+reloaded. An idle stream is a queue plus a heartbeat comment every
+EVENTS_HEARTBEAT seconds; it never touches the database.
+
+Events reach the broker through a backend. The default, "memory", only
+reaches streams on the worker that made the change; a shared backend (same
+start/publish/stop interface, e.g. over Redis pub/sub) fans them out to every
+worker. "none" turns live updates off.
+
+Each worker keeps its last EVENTS_REPLAY events, so a browser that reconnects
+with Last-Event-ID gets what it missed. When that is not possible (another
+worker's id, or too old) the stream sends "resync" and the page reloads.
+"""
+import asyncio
+import itertools
+import json
+import os
+import threading
+import uuid
+from collections import deque
+
+from app import usercache
+
+EVENTS_BACKEND = os.getenv("EVENTS_BACKEND", "memory")  # "memory" or "none"
+EVENTS_HEARTBEAT = float(os.getenv("EVENTS_HEARTBEAT", "15"))
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", "100"))
+EVENTS_MAX_SUBSCRIBERS = int(os.getenv("EVENTS_MAX_SUBSCRIBERS", "10000"))
+EVENTS_REPLAY = int(os.getenv("EVENTS_REPLAY", "1000"))
+EVENTS_RETRY_MS = 5000  # how long browsers wait before reconnecting
+
+CREATED, UPDATED, DELETED = "created", "updated", "deleted"
+RESYNC = "resync"
+
+
+class EventBackend:
+    def start(self, deliver):
+        """Call deliver(event) for every event published by any worker, from any thread"""
+        raise NotImplementedError
+
+    def publish(self, event: dict):
+        raise NotImplementedError
+
+    def stop(self):
+        raise NotImplementedError
+
+
+class LocalBackend(EventBackend):
+    """This worker only"""
+
+    def __init__(self):
+        self._deliver = None
+
+    def start(self, deliver):
+        self._deliver = deliver
+
+    def publish(self, event: dict):
+        if self._deliver is not None:  # not started: a script or CLI, nobody listening
+            self._deliver(event)
+
+    def stop(self):
+        self._deliver = None
+
+
+class Subscription:
+    """One open stream; fed on its event loop, so the queue needs no lock"""
+
+    def __init__(self, owner_id, loop):
+        self.owner_id = owner_id  # None: every note
+        self.loop = loop
+        self.queue = asyncio.Queue(EVENTS_QUEUE_SIZE)
+
+    def put(self, item):
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            # Too far behind to catch up event by event: have the page reload instead
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait((None, {"type": RESYNC}))
+
+
+class Broker:
+    def __init__(self, backend: EventBackend):
+        self.backend = backend
+        self.boot = uuid.uuid4().hex[:8]  # event ids from another worker or run are not ours
+        self._seq = itertools.count(1)
+        self._lock = threading.Lock()
+        self._by_owner = {}  # owner id -> {Subscription}
+        self._everything = set()
+        self._recent = deque(maxlen=EVENTS_REPLAY)  # (seq, event)
+        self.subscribers = 0
+        self.stats = {"published": 0, "delivered": 0}
+
+    def publish(self, event: dict):
+        self.stats["published"] += 1
+        self.backend.publish(event)
+
+    def deliver(self, event: dict):
+        with self._lock:
+            seq = next(self._seq)
+            self._recent.append((seq, event))
+            targets = list(self._everything)
+            targets.extend(self._by_owner.get(event.get("owner_id"), ()))
+        for subscription in targets:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, (seq, event))
+            except RuntimeError:  # its loop is closed
+                continue
+            self.stats["delivered"] += 1
+
+    def _missed(self, last_event_id: str, owner_id):
+        """Events after last_event_id the subscriber may see, or None if they can't be known"""
+        boot, _, seq = last_event_id.partition("-")
+        if boot != self.boot or not seq.isdigit():
+            return None
+        seq = int(seq)
+        if self._recent and seq < self._recent[0][0] - 1:
+            return None
+        return [(s, e) for s, e in self._recent
+                if s > seq and (owner_id is None or e.get("owner_id") == owner_id)]
+
+    def subscribe(self, owner_id=None, last_event_id: str = None) -> Subscription:
+        subscription = Subscription(owner_id, asyncio.get_running_loop())
+        with self._lock:
+            missed = self._missed(last_event_id, owner_id) if last_event_id else []
+            if owner_id is None:
+                self._everything.add(subscription)
+            else:
+                self._by_owner.setdefault(owner_id, set()).add(subscription)
+            self.subscribers += 1
+        for item in missed if missed is not None else [(None, {"type": RESYNC})]:
+            subscription.put(item)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            if subscription.owner_id is None:
+                found = subscription in self._everything
+                self._everything.discard(subscription)
+            else:
+                owned = self._by_owner.get(subscription.owner_id, set())
+                found = subscription in owned
+                owned.discard(subscription)
+                if not owned:
+                    self._by_owner.pop(subscription.owner_id, None)
+            if found:
+                self.subscribers -= 1
+
+    def close_all(self):
+        """End every open stream (shutdown)"""
+        with self._lock:
+            targets = list(self._everything) + [s for owned in self._by_owner.values() for s in owned]
+        for subscription in targets:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, None)
+            except RuntimeError:
+                pass
+
+
+broker = Broker(LocalBackend()) if EVENTS_BACKEND != "none" else None
+
+
+def start():
+    if broker is not None:
+        broker.backend.start(broker.deliver)
+
+
+def stop():
+    if broker is not None:
+        broker.close_all()
+        broker.backend.stop()
+
+
+def accepting() -> bool:
+    return broker is not None and broker.subscribers < EVENTS_MAX_SUBSCRIBERS
+
+
+# Publishing, called by crud after commit
+
+def _note_event(kind: str, note) -> dict:
+    owner = usercache.get(note.owner_id)
+    return {
+        "type": kind, "id": note.id, "owner_id": note.owner_id, "version": note.version,
+        "title": note.title, "preview": note.preview, "tags": note.tags,
+        "owner_username": owner.username if owner else None,
+        "created_at": note.created_at.isoformat() if note.created_at else None,
+        "updated_at": note.updated_at.isoformat() if note.updated_at else None,
+    }
+
+
+def notes_saved(kind: str, notes):
+    if broker is not None:
+        for note in notes:
+            broker.publish(_note_event(kind, note))
+
+
+def notes_deleted(note_ids, owner_id: int):
+    if broker is not None:
+        for note_id in note_ids:
+            broker.publish({"type": DELETED, "id": note_id, "owner_id": owner_id})
+
+
+# The stream
+
+def _format(seq, event: dict) -> str:
+    lines = [] if seq is None else [f"id: {broker.boot}-{seq}"]
+    lines.append(f"event: {event['type']}")
+    lines.append("data: " + json.dumps(event, separators=(",", ":")))
+    return "\n".join(lines) + "\n\n"
+
+
+async def stream(owner_id=None, last_event_id: str = None):
+    """SSE body for a viewer of owner_id's notes (None: everyone's); ends on resync or shutdown"""
+    subscription = broker.subscribe(owner_id, last_event_id)
+    try:
+        yield f"retry: {EVENTS_RETRY_MS}\n\n"
+        while True:
+            try:
+                item = await asyncio.wait_for(subscription.queue.get(), EVENTS_HEARTBEAT)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"  # keeps proxies from closing an idle connection
+                continue
+            if item is None:
+                return
+            seq, event = item
+            yield _format(seq, event)
+            if event["type"] == RESYNC:
+                return
+    finally:
+        broker.unsubscribe(subscription)
@@ -0,0 +1,174 @@
+"""EXPLAIN the hot listing, search, sync, history and statistics queries and flag the ones that lost their index.
+
+Each check calls the real crud function, records the SQL it sends, and runs
+EXPLAIN QUERY PLAN (SQLite) or EXPLAIN (MySQL) on every SELECT. A check fails
+when a plan scans a whole table, or sorts in a temporary structure where the
+listing indexes should supply the order.
+
+    python -m app.explain          # prints the plans, exits 1 on a regression
+
+Run it against a database with realistic data: with only a handful of rows
+MySQL may rightly prefer a table scan.
+"""
+import re
+import sys
+from collections import namedtuple
+from itertools import islice
+from datetime import datetime
+
+from sqlalchemy import event, select
+
+import app.crud as crud
+import app.notes_cli as notes_cli
+import app.models as models
+import app.search_index as search_index
+import app.sync as sync
+import app.tags as tags
+from app.database import SessionLocal, all_sync_engines, engine
+
+Check = namedtuple("Check", ["name", "run", "allow_sort"])
+Problem = namedtuple("Problem", ["check", "problem", "statement"])
+
+_SQLITE_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)$")
+
+
+class _Recorder:
+    """Collect the SELECTs (with parameters) the engines run while active"""
+
+    def __init__(self):
+        self.statements = []
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith("SELECT"):
+            self.statements.append((statement, parameters))
+
+    def __enter__(self):
+        for bind in all_sync_engines():
+            event.listen(bind, "before_cursor_execute", self._before_cursor_execute)
+        return self
+
+    def __exit__(self, *exc):
+        for bind in all_sync_engines():
+            event.remove(bind, "before_cursor_execute", self._before_cursor_execute)
+        return False
+
+
+def plan(conn, statement: str, parameters=()):
+    """Plan lines for one statement, as strings"""
+    if conn.dialect.name == "sqlite":
+        rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+        return [row[3] for row in rows]
+    rows = conn.exec_driver_sql(f"EXPLAIN {statement}", parameters).mappings().all()
+    return [f"{row['table']}: type={row['type']} key={row['key']} rows={row['rows']} {row['Extra'] or ''}".strip()
+            for row in rows]
+
+
+def problems_in(conn, statement: str, parameters=(), allow_sort: bool = False):
+    """What is wrong with a statement's plan; an empty list when it uses indexes"""
+    found = []
+    if conn.dialect.name == "sqlite":
+        for detail in plan(conn, statement, parameters):
+            scan = _SQLITE_SCAN.match(detail)
+            if scan:
+                found.append(f"full scan of {scan.group(1)}")
+            elif "TEMP B-TREE FOR" in detail and "ORDER BY" in detail and not allow_sort:
+                found.append("sorts rows instead of reading them in index order")
+        return found
+    for row in conn.exec_driver_sql(f"EXPLAIN {statement}", parameters).mappings():
+        table, extra = row["table"] or "", row["Extra"] or ""
+        if row["type"] == "ALL" and not table.startswith("<"):
+            found.append(f"full scan of {table}")
+        if "Using filesort" in extra and not allow_sort:
+            found.append(f"filesort on {table}")
+    return found
+
+
+def _sample(db):
+    """A note, its owner and a search term taken from the data, so the plans see real values"""
+    note = db.scalars(select(models.Note).order_by(models.Note.id).limit(1)).first()
+    if note is None:
+        return 0, 0, "note"
+    terms = search_index.tokenize(note.title) or search_index.tokenize(note.content)
+    return note.id, note.owner_id, (terms[0] if terms else "note")
+
+
+def _tag_names(db, user_id: int):
+    """Up to three of the user's tags (made-up names without any, so the queries still run)"""
+    names = list(db.scalars(select(models.Tag.name).where(models.Tag.owner_id == user_id).limit(3)))
+    return names or ["tag"]
+
+
+def _checks(db):
+    note_id, user_id, term = _sample(db)
+    my_first = crud.get_notes_by_user(db, user_id)[1]
+    tag_names = _tag_names(db, user_id)
+    all_first = crud.get_all_notes(db)[1]
+    reset_tokens = select(models.PasswordResetToken.id).where(models.PasswordResetToken.user_id == user_id)
+    # The select half of crud.purge_reset_tokens; running the purge itself would delete rows
+    expired_tokens = (select(models.PasswordResetToken.id)
+                      .where(models.PasswordResetToken.expires_at <= datetime.utcnow()).limit(1000))
+    old_tombstones = (select(models.NoteTombstone.id)
+                      .where(models.NoteTombstone.deleted_at < datetime.utcnow()).limit(1000))
+    return [
+        Check("my notes, first page", lambda: crud.get_notes_by_user(db, user_id), False),
+        Check("my notes, next page", lambda: crud.get_notes_by_user(db, user_id, cursor=my_first.next_cursor), False),
+        Check("all notes, first page", lambda: crud.get_all_notes(db), False),
+        Check("all notes, next page", lambda: crud.get_all_notes(db, cursor=all_first.next_cursor), False),
+        Check("all notes, page by offset", lambda: crud.get_all_notes(db, offset=20), False),
+        Check("export batch", lambda: crud.get_notes_after(db, user_id), False),
+        Check("bulk export across users", lambda: list(islice(notes_cli.iter_notes(db, batch_size=50), 2)), False),
+        # Search results are ordered by relevance, which no index can supply
+        Check(f"search my notes for {term!r}", lambda: crud.get_notes_by_user(db, user_id, search=term), True),
+        Check(f"search all notes for {term!r}", lambda: crud.get_all_notes(db, search=term), True),
+        # tags.clear() first, so the note id sets are read from the database
+        Check(f"my notes tagged {', '.join(tag_names)}",
+              lambda: (tags.clear(), crud.get_notes_by_user(db, user_id, tagged=tag_names)), False),
+        Check("my tags", lambda: crud.get_tags(db, user_id), False),
+        Check("dashboard statistics", lambda: crud.get_stats(db), False),
+        Check("sync, first batch", lambda: crud.get_changes(db, user_id), False),
+        Check("sync, changes since a cursor", lambda: crud.get_changes(db, user_id, sync.Cursor(1, 0, 0)), False),
+        Check("revision history", lambda: crud.get_revisions(db, note_id), False),
+        Check("rebuild a revision", lambda: crud.get_revision(db, note_id, 1), False),
+        Check("reset tokens of a user", lambda: db.execute(reset_tokens).all(), False),
+        Check("expired reset tokens", lambda: db.execute(expired_tokens).all(), False),
+        Check("old sync tombstones", lambda: db.execute(old_tombstones).all(), False),
+    ]
+
+
+def check(verbose: bool = False):
+    """Run every check; returns a list of Problems (empty when all plans use indexes)"""
+    db = SessionLocal()
+    found = []
+    try:
+        checks = _checks(db)
+        with engine.connect() as conn:
+            for c in checks:
+                with _Recorder() as recorder:
+                    c.run()
+                if verbose:
+                    print(f"\n{c.name}")
+                for statement, parameters in recorder.statements:
+                    issues = problems_in(conn, statement, parameters, c.allow_sort)
+                    found += [Problem(c.name, issue, statement) for issue in issues]
+                    if verbose:
+                        for line in plan(conn, statement, parameters):
+                            print(f"  {'❌' if issues else '✅'} {line}")
+    finally:
+        db.close()
+    return found
+
+
+if __name__ == "__main__":
+    from app import migrate
+
+    missing = migrate.pending()
+    if missing:
+        sys.exit(f"Migrations {', '.join(missing)} are pending; run 'alembic upgrade head' first")
+    print(f"🔎 Query plans on {engine.dialect.name}")
+    problems = check(verbose=True)
+    if problems:
+        print()
+        for p in problems:
+            print(f"❌ {p.check}: {p.problem}\n   {' '.join(p.statement.split())}")
+        sys.exit(1)
+    print("\n✅ Every checked query uses an index")
@@ -0,0 +1,332 @@
+"""Per-request instrumentation: SQL, template and bcrypt timings.
+
+install(app) adds an ASGI middleware that tracks each request in a context
+variable. Engine events, the Templates subclass below and the hashing pool
+add their time to it. Every response gets a Server-Timing header, and
+/metrics exposes the aggregates in the Prometheus text format.
+
+Aggregates are per worker process; scrape each worker, or run one.
+
+Set PROFILE_SLOW_REQUESTS_MS to turn on the sampling profiler. A thread then
+samples the event loop's stack every PROFILE_INTERVAL_MS while requests are
+in flight. Requests slower than the threshold get their samples written to
+PROFILE_DIR as folded stacks, ready for flamegraph.pl or speedscope. The
+loop is shared, so a sample can include other requests running at the same
+moment.
+"""
+import contextvars
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+
+from fastapi.templating import Jinja2Templates
+
+METRICS_PATH = "/metrics"
+# When set, /metrics requires 'Authorization: Bearer <METRICS_TOKEN>'
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+PROFILE_SLOW_REQUESTS_MS = float(os.getenv("PROFILE_SLOW_REQUESTS_MS", "0"))  # 0 = profiler off
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+# Request duration histogram buckets, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class RequestMetrics:
+    __slots__ = ("started", "sql_count", "sql_seconds", "template_seconds", "bcrypt_seconds", "samples")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.template_seconds = 0.0
+        self.bcrypt_seconds = 0.0
+        self.samples = None
+
+
+_current = contextvars.ContextVar("request_metrics", default=None)
+
+
+def current():
+    """Metrics of the request being handled, or None outside a request"""
+    return _current.get()
+
+
+def record_bcrypt(seconds: float):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.bcrypt_seconds += seconds
+
+
+# SQL: engine events
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the statement's execution context, not the pooled connection: a statement
+    # that raises never reaches after_cursor_execute, and its start time goes with it
+    if context is not None:
+        context.instrumentation_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.sql_count += 1
+        started = getattr(context, "instrumentation_started", None)
+        if started is not None:
+            metrics.sql_seconds += time.perf_counter() - started
+
+
+def instrument_engine(engine):
+    from sqlalchemy import event
+
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+# Templates
+
+class Templates(Jinja2Templates):
+    """Jinja2Templates that adds render time to the current request"""
+
+    def TemplateResponse(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().TemplateResponse(*args, **kwargs)
+        finally:
+            metrics = _current.get()
+            if metrics is not None:
+                metrics.template_seconds += time.perf_counter() - started
+
+
+# Aggregates
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = Counter()  # (method, route, status) -> count
+        self.histograms = defaultdict(lambda: [0] * (len(BUCKETS) + 1))  # (method, route) -> bucket counts
+        self.sums = Counter()  # (metric, method, route) -> seconds or statements
+
+    def observe(self, method: str, route: str, status: int, seconds: float, metrics: RequestMetrics):
+        key = (method, route)
+        with self.lock:
+            self.requests[(method, route, status)] += 1
+            buckets = self.histograms[key]
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    buckets[i] += 1
+                    break
+            else:
+                buckets[-1] += 1
+            self.sums[("duration",) + key] += seconds
+            self.sums[("sql_statements",) + key] += metrics.sql_count
+            self.sums[("sql",) + key] += metrics.sql_seconds
+            self.sums[("template",) + key] += metrics.template_seconds
+            self.sums[("bcrypt",) + key] += metrics.bcrypt_seconds
+
+    def render(self) -> str:
+        def labels(method, route, **extra):
+            pairs = {"method": method, "route": route, **extra}
+            return ",".join(f'{k}="{v}"' for k, v in pairs.items())
+
+        lines = []
+        with self.lock:
+            lines += ["# HELP http_requests_total Requests handled", "# TYPE http_requests_total counter"]
+            for (method, route, status), n in sorted(self.requests.items()):
+                lines.append(f"http_requests_total{{{labels(method, route, status=status)}}} {n}")
+
+            lines += ["# HELP http_request_duration_seconds Time to the response headers",
+                      "# TYPE http_request_duration_seconds histogram"]
+            for (method, route), buckets in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, n in zip(BUCKETS + ("+Inf",), buckets):
+                    cumulative += n
+                    lines.append(f"http_request_duration_seconds_bucket{{{labels(method, route, le=bound)}}} {cumulative}")
+                lines.append(f"http_request_duration_seconds_sum{{{labels(method, route)}}} "
+                             f"{self.sums[('duration', method, route)]:.6f}")
+                lines.append(f"http_request_duration_seconds_count{{{labels(method, route)}}} {cumulative}")
+
+            for metric, help_text in (
+                ("sql_statements", "SQL statements executed by requests"),
+                ("sql", "Seconds spent in SQL statements"),
+                ("template", "Seconds spent rendering templates"),
+                ("bcrypt", "Seconds spent waiting for password hashing"),
+            ):
+                name = "http_request_sql_statements_total" if metric == "sql_statements" else f"http_request_{metric}_seconds_total"
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+                for (m, method, route), value in sorted(self.sums.items()):
+                    if m == metric:
+                        lines.append(f"{name}{{{labels(method, route)}}} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def _runtime_gauges() -> str:
+    from app import auth, events, mailer, sweeper, tags
+
+    lines = []
+    for key, value in auth.hashing_stats().items():
+        lines.append(f"# TYPE hashing_{key} gauge")
+        lines.append(f"hashing_{key} {value:g}")
+    if mailer._mail_queue is not None:
+        for key, value in mailer._mail_queue.stats.items():
+            lines.append(f"# TYPE mail_{key}_total counter")
+            lines.append(f"mail_{key}_total {value}")
+    if sweeper._sweeper is not None:
+        for key, value in sweeper._sweeper.stats.items():
+            lines.append(f"# TYPE token_sweep_{key}_total counter")
+            lines.append(f"token_sweep_{key}_total {value}")
+    if events.broker is not None:
+        lines.append("# TYPE events_subscribers gauge")
+        lines.append(f"events_subscribers {events.broker.subscribers}")
+        for key, value in events.broker.stats.items():
+            lines.append(f"# TYPE events_{key}_total counter")
+            lines.append(f"events_{key}_total {value}")
+    entries, ids = tags.cache_size()
+    lines.append("# TYPE tag_cache_entries gauge")
+    lines.append(f"tag_cache_entries {entries}")
+    lines.append("# TYPE tag_cache_note_ids gauge")
+    lines.append(f"tag_cache_note_ids {ids}")
+    for key, value in tags.stats.items():
+        lines.append(f"# TYPE tag_cache_{key}_total counter")
+        lines.append(f"tag_cache_{key}_total {value}")
+    return "\n".join(lines) + "\n"
+
+
+# Sampling profiler
+
+class Profiler:
+    """Samples one thread's stack while requests are active and keeps per-request folded stacks"""
+
+    def __init__(self, interval: float, threshold: float, directory: str):
+        self.interval = interval
+        self.threshold = threshold
+        self.directory = directory
+        self.thread_id = None
+        self.active = set()
+        self.lock = threading.Lock()
+        self._thread = None
+
+    def start(self, thread_id: int):
+        self.thread_id = thread_id
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+            self._thread.start()
+
+    def begin(self, metrics: RequestMetrics):
+        metrics.samples = Counter()
+        with self.lock:
+            self.active.add(metrics)
+
+    def end(self, metrics: RequestMetrics, method: str, route: str, seconds: float):
+        with self.lock:
+            self.active.discard(metrics)
+        if seconds * 1000 >= self.threshold and metrics.samples:
+            self._dump(metrics.samples, method, route, seconds)
+
+    @staticmethod
+    def _fold(frame) -> str:
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{frame.f_globals.get('__name__', '?')}:{code.co_name}")
+            frame = frame.f_back
+        return ";".join(reversed(stack))
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self.lock:
+                if not self.active:
+                    continue
+                frame = sys._current_frames().get(self.thread_id)
+                if frame is None:
+                    continue
+                stack = self._fold(frame)
+                for metrics in self.active:
+                    metrics.samples[stack] += 1
+
+    def _dump(self, samples: Counter, method: str, route: str, seconds: float):
+        os.makedirs(self.directory, exist_ok=True)
+        safe_route = route.strip("/").replace("/", "_").replace("{", "").replace("}", "") or "root"
+        name = f"{datetime.utcnow():%Y%m%d-%H%M%S-%f}-{method}-{safe_route}-{seconds * 1000:.0f}ms.folded"
+        with open(os.path.join(self.directory, name), "w") as f:
+            for stack, count in samples.most_common():
+                f.write(f"{stack} {count}\n")
+        print(f"🐢 Slow request {method} {route} ({seconds * 1000:.0f} ms), stacks in {name}")
+
+
+profiler = Profiler(PROFILE_INTERVAL_MS / 1000, PROFILE_SLOW_REQUESTS_MS, PROFILE_DIR) if PROFILE_SLOW_REQUESTS_MS else None
+
+
+# Middleware
+
+def _server_timing(metrics: RequestMetrics, total: float) -> str:
+    parts = [
+        f"app;dur={total * 1000:.1f}",
+        f'db;dur={metrics.sql_seconds * 1000:.1f};desc="{metrics.sql_count} queries"',
+    ]
+    if metrics.template_seconds:
+        parts.append(f"tpl;dur={metrics.template_seconds * 1000:.1f}")
+    if metrics.bcrypt_seconds:
+        parts.append(f"bcrypt;dur={metrics.bcrypt_seconds * 1000:.1f}")
+    return ", ".join(parts)
+
+
+class InstrumentationMiddleware:
+    """Pure ASGI middleware (no BaseHTTPMiddleware) so streaming responses pass straight through"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] == METRICS_PATH:
+            await self.app(scope, receive, send)
+            return
+
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        if profiler is not None:
+            profiler.start(threading.get_ident())
+            profiler.begin(metrics)
+        state = {"status": 500, "elapsed": None}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+                state["elapsed"] = time.perf_counter() - metrics.started
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", _server_timing(metrics, state["elapsed"]).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            elapsed = state["elapsed"] if state["elapsed"] is not None else time.perf_counter() - metrics.started
+            route = getattr(scope.get("route"), "path", None) or "other"
+            registry.observe(scope["method"], route, state["status"], elapsed, metrics)
+            if profiler is not None:
+                profiler.end(metrics, scope["method"], route, elapsed)
+
+
+def install(app, engines):
+    """Instrument the engines and add the middleware and /metrics endpoint to app"""
+    from fastapi import Request
+    from fastapi.responses import PlainTextResponse
+
+    for engine in engines:
+        instrument_engine(engine)
+    app.add_middleware(InstrumentationMiddleware)
+
+    @app.get(METRICS_PATH, include_in_schema=False)
+    async def metrics(request: Request):
+        if METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {METRICS_TOKEN}":
+            return PlainTextResponse("Forbidden", status_code=403)
+        return PlainTextResponse(registry.render() + _runtime_gauges(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,336 @@
+import heapq
+import itertools
+import os
+import queue
+import threading
+import time
+from typing import TYPE_CHECKING
+
+# smtplib and email are imported where they are used: most workers never send a message
+if TYPE_CHECKING:
+    from email.message import EmailMessage
+
+# Email configuration
+EMAIL_ADDRESS = os.getenv("EMAIL_ADDRESS")
+EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD")
+SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+
+# "smtp", "file" (writes .eml files to MAIL_DIR) or "memory" (keeps messages in a list)
+MAIL_TRANSPORT = os.getenv("MAIL_TRANSPORT", "smtp")
+MAIL_DIR = os.getenv("MAIL_DIR", "outbox")
+MAIL_WORKERS = int(os.getenv("MAIL_WORKERS", "2"))
+MAIL_QUEUE_SIZE = int(os.getenv("MAIL_QUEUE_SIZE", "1000"))
+MAIL_BATCH_SIZE = int(os.getenv("MAIL_BATCH_SIZE", "20"))
+MAIL_MAX_ATTEMPTS = int(os.getenv("MAIL_MAX_ATTEMPTS", "5"))
+MAIL_RETRY_DELAY = float(os.getenv("MAIL_RETRY_DELAY", "2"))
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", str(MAIL_WORKERS)))
+SMTP_IDLE_TIMEOUT = float(os.getenv("SMTP_IDLE_TIMEOUT", "60"))
+
+
+class Transport:
+    """Delivers batches of messages; raise to have the whole batch retried (nothing was sent)"""
+
+    def send_batch(self, messages):
+        """Send messages, returning a list of (message, error) that failed individually"""
+        raise NotImplementedError
+
+    def is_permanent(self, error) -> bool:
+        """True if a message that failed with error would fail the same way again (not retried)"""
+        return False
+
+    def close(self):
+        pass
+
+
+class SMTPTransport(Transport):
+    """Keeps up to SMTP_POOL_SIZE logged-in connections open and reuses them"""
+
+    def __init__(self, host=SMTP_SERVER, port=SMTP_PORT, username=EMAIL_ADDRESS, password=EMAIL_PASSWORD,
+                 pool_size=SMTP_POOL_SIZE, idle_timeout=SMTP_IDLE_TIMEOUT):
+        self.host, self.port = host, port
+        self.username, self.password = username, password
+        self.idle_timeout = idle_timeout
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+
+    def _connect(self):
+        import smtplib
+
+        server = smtplib.SMTP(self.host, self.port, timeout=30)
+        server.starttls()
+        if self.username:
+            server.login(self.username, self.password)
+        return server
+
+    def _checkout(self):
+        import smtplib
+
+        try:
+            server, last_used = self._pool.get_nowait()
+        except queue.Empty:
+            return self._connect()
+        if time.monotonic() - last_used > self.idle_timeout:
+            # The server has probably dropped it; check before trusting it
+            try:
+                if server.noop()[0] == 250:
+                    return server
+            except smtplib.SMTPException:
+                pass
+            self._discard(server)
+            return self._connect()
+        return server
+
+    def _checkin(self, server):
+        try:
+            self._pool.put_nowait((server, time.monotonic()))
+        except queue.Full:
+            self._discard(server)
+
+    def _discard(self, server):
+        import smtplib
+
+        try:
+            server.quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+
+    def send_batch(self, messages):
+        import smtplib
+
+        messages = list(messages)
+        server = self._checkout()
+        failed = []
+        for i, message in enumerate(messages):
+            try:
+                server.send_message(message)
+            except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError) as e:
+                failed.append((message, e))
+            except (smtplib.SMTPException, OSError) as e:
+                # Connection-level failure: drop the connection. The server already took the
+                # messages before this one, so only this one and the rest are retried
+                print(f"❌ SMTP connection failed after {i} of {len(messages)} messages: {e}")
+                self._discard(server)
+                return failed + [(unsent, e) for unsent in messages[i:]]
+        self._checkin(server)
+        return failed
+
+    def is_permanent(self, error) -> bool:
+        """A 5xx reply about the message itself, e.g. an address the server does not know"""
+        import smtplib
+
+        if isinstance(error, smtplib.SMTPRecipientsRefused):
+            return all(code >= 500 for code, _ in error.recipients.values())
+        return isinstance(error, (smtplib.SMTPSenderRefused, smtplib.SMTPDataError)) and error.smtp_code >= 500
+
+    def close(self):
+        while True:
+            try:
+                server, _ = self._pool.get_nowait()
+            except queue.Empty:
+                return
+            self._discard(server)
+
+
+class FileTransport(Transport):
+    """Writes each message to an .eml file; for local runs without SMTP"""
+
+    def __init__(self, directory=MAIL_DIR):
+        self.directory = directory
+        self._seq = itertools.count()
+
+    def send_batch(self, messages):
+        os.makedirs(self.directory, exist_ok=True)
+        for message in messages:
+            name = f"{time.time():.6f}-{next(self._seq)}.eml"
+            with open(os.path.join(self.directory, name), "wb") as f:
+                f.write(message.as_bytes())
+        return []
+
+
+class MemoryTransport(Transport):
+    """Keeps sent messages in self.outbox; for tests"""
+
+    def __init__(self):
+        self.outbox = []
+        self._lock = threading.Lock()
+
+    def send_batch(self, messages):
+        with self._lock:
+            self.outbox.extend(messages)
+        return []
+
+
+TRANSPORTS = {"smtp": SMTPTransport, "file": FileTransport, "memory": MemoryTransport}
+
+
+class MailQueue:
+    """Background delivery: worker threads drain a bounded queue in batches, retrying with backoff.
+
+    Messages the transport refuses for good (Transport.is_permanent) fail at once instead.
+    """
+
+    def __init__(self, transport: Transport, workers=MAIL_WORKERS, maxsize=MAIL_QUEUE_SIZE,
+                 batch_size=MAIL_BATCH_SIZE, max_attempts=MAIL_MAX_ATTEMPTS, retry_delay=MAIL_RETRY_DELAY):
+        self.transport = transport
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._delayed = []  # heap of (due, seq, attempts, message)
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._threads = []
+        self.stats = {"queued": 0, "sent": 0, "retried": 0, "failed": 0, "dropped": 0}
+
+    def start(self):
+        if self._threads:
+            return
+        self._stopping.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"mailer-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 10.0):
+        """Deliver what is already queued (up to timeout), then stop the workers"""
+        deadline = time.monotonic() + timeout
+        while (self._queue.unfinished_tasks or self._delayed) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self._stopping.set()
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        self._threads = []
+        self.transport.close()
+
+    def enqueue(self, message: "EmailMessage") -> bool:
+        """Queue a message without blocking; False when the queue is full"""
+        try:
+            self._queue.put_nowait((0, message))
+        except queue.Full:
+            self._count("dropped")
+            return False
+        self._count("queued")
+        return True
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self.stats[key] += n
+
+    def _promote_due(self):
+        now = time.monotonic()
+        with self._lock:
+            while self._delayed and self._delayed[0][0] <= now:
+                _, _, attempts, message = self._delayed[0]
+                try:
+                    self._queue.put_nowait((attempts, message))
+                except queue.Full:
+                    return
+                heapq.heappop(self._delayed)
+
+    def _give_up(self, message, error):
+        self._count("failed")
+        print(f"❌ Email to {message['To']} refused: {error}")
+
+    def _retry_later(self, attempts, message):
+        if attempts >= self.max_attempts:
+            self._count("failed")
+            print(f"❌ Giving up on email to {message['To']} after {attempts} attempts")
+            return
+        due = time.monotonic() + self.retry_delay * 2 ** (attempts - 1)
+        with self._lock:
+            heapq.heappush(self._delayed, (due, next(self._seq), attempts, message))
+        self._count("retried")
+
+    def _next_batch(self):
+        try:
+            batch = [self._queue.get(timeout=0.25)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._promote_due()
+            batch = self._next_batch()
+            if not batch:
+                continue
+            try:
+                failed = self.transport.send_batch([message for _, message in batch])
+            except Exception as e:
+                print(f"❌ Email batch failed: {e}")
+                failed = [(message, e) for _, message in batch]
+            errors = {id(message): error for message, error in failed}
+            for attempts, message in batch:
+                if id(message) not in errors:
+                    self._count("sent")
+                elif self.transport.is_permanent(errors[id(message)]):
+                    self._give_up(message, errors[id(message)])
+                else:
+                    self._retry_later(attempts + 1, message)
+                self._queue.task_done()
+
+
+_mail_queue = None
+
+
+def get_queue() -> MailQueue:
+    global _mail_queue
+    if _mail_queue is None:
+        _mail_queue = MailQueue(TRANSPORTS[MAIL_TRANSPORT]())
+    return _mail_queue
+
+
+def start():
+    get_queue().start()
+
+
+def stop():
+    if _mail_queue is not None:
+        _mail_queue.stop()
+
+
+def build_reset_email(email: str, reset_url: str) -> "EmailMessage":
+    from email.message import EmailMessage
+
+    msg = EmailMessage()
+    msg['From'] = EMAIL_ADDRESS
+    msg['To'] = email
+    msg['Subject'] = "🔐 Password Reset - Notes App"
+    msg.set_content(f"Reset your Notes App password: {reset_url}\n\nThis link will expire in 1 hour.")
+
+    html_content = f"""
+    <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
+        <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); padding: 30px; text-align: center;">
+            <h1 style="color: white; margin: 0;">📝 Notes App</h1>
+        </div>
+        <div style="padding: 30px; background: #f9f9f9;">
+            <h2 style="color: #333; margin-top: 0;">Reset Your Password</h2>
+            <p>Hi there,</p>
+            <p>You've requested a password reset. Click the button below to create a new password:</p>
+            <div style="text-align: center; margin: 30px 0;">
+                <a href="{reset_url}" style="background: #007bff; color: white; padding: 15px 30px; text-decoration: none; border-radius: 8px; display: inline-block;">Reset Password</a>
+            </div>
+            <p><em>This link will expire in 1 hour.</em></p>
+            <p>If you didn't request this, you can safely ignore this email.</p>
+            <hr style="border: none; border-top: 1px solid #eee; margin: 30px 0;">
+            <p style="color: #666; font-size: 14px;">
+                Best regards,<br>
+                <strong>The Notes App Team</strong>
+            </p>
+        </div>
+    </div>
+    """
+    msg.add_alternative(html_content, subtype="html")
+    return msg
+
+
+def send_reset_email(email: str, reset_url: str) -> bool:
+    """Queue the password reset email; returns as soon as it is queued"""
+    return get_queue().enqueue(build_reset_email(email, reset_url))
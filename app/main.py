@@ -1,73 +1,119 @@
 import os
 from fastapi import FastAPI, Depends, Form, Request, Query, HTTPException
-from fastapi.responses import RedirectResponse, HTMLResponse
-from fastapi.templating import Jinja2Templates
-from fastapi.staticfiles import StaticFiles
-from sqlalchemy.orm import Session
+from fastapi.responses import RedirectResponse, HTMLResponse, Response, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
-
-from app import models, crud, schemas, auth
-from app.database import engine, SessionLocal, Base
+from urllib.parse import urlencode
 
 from dotenv import load_dotenv
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 from datetime import datetime, timedelta
 
-# Load environment variables
+# Load environment variables (before the app modules read their settings)
 load_dotenv()
 
+from app import models, crud, crud_async, schemas, auth, sessions, usercache, mailer, pagecache, api, instrumentation, migrate, storage, ratelimit, sweeper, templating, assets, compression, events, tags
+from app.usercache import CurrentUser
+from app.database import all_sync_engines, dispose_async_engines
+from app.deps import get_db, get_current_user
+
 app = FastAPI()
 
 @app.on_event("startup")
 async def startup():
-    Base.metadata.create_all(bind=engine)
-    print("✅ Tables created!")
+    migrate.ensure_schema()
+    assets.load()
+    mailer.start()
+    sweeper.start()
+    events.start()
 
-# Email configuration
-EMAIL_ADDRESS = os.getenv("EMAIL_ADDRESS")
-EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD")
-SMTP_SERVER = "smtp.gmail.com"
-SMTP_PORT = 587
+@app.on_event("shutdown")
+async def shutdown():
+    events.stop()
+    sweeper.stop()
+    mailer.stop()
+    auth.shutdown_executor()
+    await dispose_async_engines()
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+REVISIONS_PER_PAGE = 50
 
-templates = Jinja2Templates(directory=os.path.join(os.path.dirname(__file__), "templates"))
-app.mount("/static", StaticFiles(directory=os.path.join(os.path.dirname(__file__), "static")), name="static")
+templates = instrumentation.Templates(env=templating.environment())
+app.include_router(api.router)
+instrumentation.install(app, all_sync_engines())
+app.add_middleware(compression.CompressionMiddleware)  # outermost: Server-Timing excludes compression
+app.mount(assets.STATIC_URL, assets.StaticAssets(), name="static")
 
-# Dependency
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-def get_current_user(request: Request, db: Session = Depends(get_db)):
-    user_id = request.cookies.get("user_id")
-    if not user_id:
-        return None
+
+def page_links(path: str, page: int, total_pages: int, result, filters: Optional[dict] = None):
+    """Prev/next URLs for a listing: keyset cursors when the page has them, page numbers otherwise.
+
+    filters are the query parameters the listing was filtered by (search, tags).
+    """
+    filters = {name: value for name, value in (filters or {}).items() if value}
+
+    def url(number, cursor=None):
+        params = {"page": number}
+        if cursor and number > 1:
+            params["cursor"] = cursor
+        params.update(filters)
+        return f"{path}?{urlencode(params)}"
+
+    prev_url = url(page - 1, result.prev_cursor) if page > 1 else None
+    if filters:
+        next_url = url(page + 1) if page < total_pages else None
+    else:
+        next_url = url(page + 1, result.next_cursor) if result.next_cursor else None
+    return prev_url, next_url
+
+
+def cached_page(request: Request, key: str):
+    """304 when the client's copy is current, the cached page on a hit, None on a miss"""
+    etag = pagecache.etag_for(key)
+    hit = pagecache.get_page(key)
+    last_modified = hit[1] if hit else None
+    if pagecache.is_not_modified(request.headers, etag, last_modified):
+        return Response(status_code=304, headers=pagecache.validator_headers(etag, last_modified))
+    if hit:
+        return HTMLResponse(hit[0], headers=pagecache.validator_headers(etag, last_modified))
+    return None
+
+
+def cache_page(key: str, response, last_modified=None):
+    """Store a rendered page and add its validators (ETag, Last-Modified)"""
+    pagecache.set_page(key, response.body, last_modified)
+    response.headers.update(pagecache.validator_headers(pagecache.etag_for(key), last_modified))
+    return response
+
+
+def query_key(request: Request) -> str:
+    return urlencode(sorted(request.query_params.multi_items()))
+
+
+def parse_tags(text: Optional[str]) -> list:
+    """Tags from a form field or the query string; 400 when there are too many"""
     try:
-        user = db.query(models.User).filter(models.User.id == int(user_id)).first()
-        return user
-    except ValueError:
-        return None
+        return tags.parse(text)
+    except ValueError as error:
+        raise HTTPException(400, str(error))
+
+
+def too_busy(request: Request, template: str, context: Optional[dict] = None):
+    """429 page shown when the password hashing pool is saturated"""
+    context = {"request": request, "error": "Too many requests right now. Please try again in a moment.", **(context or {})}
+    return templates.TemplateResponse(template, context, status_code=429, headers={"Retry-After": "1"})
 
 
 @app.get("/", include_in_schema=False)
-def root(request: Request):
+async def root(request: Request):
     return RedirectResponse("/dashboard")
 
 # Signup
 @app.get("/signup")
-def signup_form(request: Request):
+async def signup_form(request: Request):
     return templates.TemplateResponse("signup.html", {"request": request})
 
 @app.post("/signup")
 async def signup(request: Request, username: str = Form(...), email: str = Form(...), 
-                 password: str = Form(...), db: Session = Depends(get_db)):
+                 password: str = Form(...), db: AsyncSession = Depends(get_db)):
     
     if len(username) < 3:
         return templates.TemplateResponse(
@@ -91,7 +137,7 @@ async def signup(request: Request, username: str = Form(...), email: str = Form(
             }
         )
     
-    if crud.get_user_by_email(db, email):
+    if await crud_async.get_user_by_email(db, email):
         return templates.TemplateResponse(
             "signup.html",
             {
@@ -104,86 +150,149 @@ async def signup(request: Request, username: str = Form(...), email: str = Form(
     
     # Create user
     user_in = schemas.UserCreate(username=username, email=email, password=password)
-    crud.create_user(db, user_in)
+    try:
+        hashed_pw = await auth.hash_password_async(password)
+    except auth.HashingBusy:
+        return too_busy(request, "signup.html", {"username": username, "email": email})
+    await crud_async.create_user(db, user_in, hashed_password=hashed_pw)
     return RedirectResponse("/login?msg=Account+created+successfully!+Please+login", status_code=302)
 
 # Login
 @app.get("/login")
-def login_form(request: Request, msg: Optional[str] = None):
+async def login_form(request: Request, msg: Optional[str] = None):
     return templates.TemplateResponse("login.html", {"request": request, "msg": msg})
 
 @app.post("/login")
-def login(request: Request, email: str = Form(...), password: str = Form(...), db: Session = Depends(get_db)):
-    user = crud.authenticate_user(db, email, password)
-    if not user:
+async def login(request: Request, email: str = Form(...), password: str = Form(...), db: AsyncSession = Depends(get_db)):
+    user = await crud_async.get_user_by_email(db, email)
+    valid = False
+    if user:
+        try:
+            valid, new_hash = await auth.verify_and_update_async(password, user.password)
+        except auth.HashingBusy:
+            return too_busy(request, "login.html")
+    if not valid:
         return templates.TemplateResponse("login.html", {"request": request, "error": "Invalid credentials"})
+    if new_hash:
+        await crud_async.update_password_hash(db, user, new_hash)
+    usercache.put(user)
     resp = RedirectResponse("/dashboard", status_code=302)
-    resp.set_cookie(key="user_id", value=str(user.id), httponly=True)
+    resp.set_cookie(
+        key=sessions.SESSION_COOKIE,
+        value=sessions.create_session_token(user),
+        max_age=sessions.SESSION_MAX_AGE,
+        httponly=True,
+        samesite="lax",
+    )
     return resp
 
 # Logout
 @app.get("/logout")
-def logout():
+async def logout():
     resp = RedirectResponse("/login?msg=Logged out", status_code=302)
-    resp.delete_cookie("user_id")
+    resp.delete_cookie(sessions.SESSION_COOKIE)
     return resp
 
 # Dashboard 
 @app.get("/dashboard")
-def dashboard(request: Request, db: Session = Depends(get_db)):
-    user = get_current_user(request, db)
+async def dashboard(request: Request, user: Optional[CurrentUser] = Depends(get_current_user),
+                    db: AsyncSession = Depends(get_db)):
     if not user:
         return RedirectResponse("/login?msg=Please+login")
     
-    # Show dashboard template with user info
-    return templates.TemplateResponse("dashboard.html", {"request": request, "user": user})
+    # Show dashboard template with user info; superadmins also get the usage statistics
+    stats = await crud_async.get_stats(db) if user.role == "superadmin" else None
+    return templates.TemplateResponse("dashboard.html", {"request": request, "user": user, "stats": stats})
 
 # My Notes page
 @app.get("/notes/my")
-def my_notes(request: Request, search: Optional[str] = Query(None), page: int = Query(1, ge=1), db: Session = Depends(get_db)):
-    user = get_current_user(request, db)
+async def my_notes(request: Request, search: Optional[str] = Query(None), page: int = Query(1, ge=1),
+             cursor: Optional[str] = Query(None), tag_filter: Optional[str] = Query(None, alias="tags"),
+             match: str = Query("all"), user: Optional[CurrentUser] = Depends(get_current_user),
+             db: AsyncSession = Depends(get_db)):
     if not user:
         return RedirectResponse("/login?msg=Please+login")
     
+    key = pagecache.listing_key("my", user, f"user:{user.id}", query_key(request))
+    cached = cached_page(request, key)
+    if cached:
+        return cached
+    
     limit = 10
     offset = (page - 1) * limit
-    total, notes = crud.get_notes_by_user(db, user.id, search=search, offset=offset, limit=limit)
-    total_pages = (total + limit - 1) // limit if total else 1
+    tagged = parse_tags(tag_filter)
+    match_all = match != "any"
+    total, result = await crud_async.get_notes_by_user(db, user.id, search=search, offset=offset, limit=limit,
+                                                       cursor=cursor, tagged=tagged, match_all=match_all)
+    total_pages = max((total + limit - 1) // limit, page) if total else 1
+    prev_url, next_url = page_links("/notes/my", page, total_pages, result, {
+        "search": search, "tags": ",".join(tagged), "match": "any" if tagged and not match_all else None,
+    })
     
-    return templates.TemplateResponse("my_notes.html", {
+    return cache_page(key, templates.TemplateResponse("my_notes.html", {
         "request": request, 
         "user": user, 
-        "notes": notes, 
+        "notes": result.items, 
         "search": search, 
+        "tagged": tagged,
+        "match_all": match_all,
+        "user_tags": await crud_async.get_tags(db, user.id),
         "page": page, 
-        "total_pages": total_pages
-    })
+        "total_pages": total_pages,
+        "prev_url": prev_url,
+        "next_url": next_url
+    }))
 
 # All Notes page - for superadmin only 
 @app.get("/notes/all")
-def all_notes(request: Request, search: Optional[str] = Query(None), page: int = Query(1, ge=1), db: Session = Depends(get_db)):
-    user = get_current_user(request, db)
+async def all_notes(request: Request, search: Optional[str] = Query(None), page: int = Query(1, ge=1),
+              cursor: Optional[str] = Query(None), user: Optional[CurrentUser] = Depends(get_current_user),
+              db: AsyncSession = Depends(get_db)):
     if not user or user.role != "superadmin":
         return RedirectResponse("/dashboard?msg=Access+denied")
     
+    key = pagecache.listing_key("all", user, "all", query_key(request))
+    cached = cached_page(request, key)
+    if cached:
+        return cached
+    
     limit = 10
     offset = (page - 1) * limit
-    total, notes = crud.get_all_notes(db, search=search, offset=offset, limit=limit)
-    total_pages = (total + limit - 1) // limit if total else 1
+    total, result = await crud_async.get_all_notes(db, search=search, offset=offset, limit=limit, cursor=cursor)
+    total_pages = max((total + limit - 1) // limit, page) if total else 1
+    prev_url, next_url = page_links("/notes/all", page, total_pages, result, {"search": search})
     
-    return templates.TemplateResponse("all_notes.html", {
+    return cache_page(key, templates.TemplateResponse("all_notes.html", {
         "request": request, 
         "user": user, 
-        "notes": notes, 
+        "notes": result.items, 
         "search": search, 
         "page": page, 
-        "total_pages": total_pages
-    })
+        "total_pages": total_pages,
+        "prev_url": prev_url,
+        "next_url": next_url
+    }))
+
+# Live updates for the list pages (server-sent events, see app.events)
+@app.get("/notes/events")
+async def note_events(request: Request, scope: str = Query("my", pattern="^(my|all)$"),
+                      user: Optional[CurrentUser] = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    if not user:
+        return Response(status_code=401)
+    if events.broker is None:
+        return Response(status_code=204)  # tells EventSource not to reconnect
+    if not events.accepting():
+        return Response(status_code=503, headers={"Retry-After": "60"})
+    await db.close()  # the stream stays open for hours; hold no pooled connection
+    # Everyone's notes only for a superadmin's All Notes page; My Notes shows one owner's, even to them
+    owner_id = None if scope == "all" and user.role == "superadmin" else user.id
+    return StreamingResponse(events.stream(owner_id, request.headers.get("last-event-id")),
+                             media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 # Create note
 @app.get("/note/create")
-def create_note_form(request: Request, db: Session = Depends(get_db)):
-    user = get_current_user(request, db)
+async def create_note_form(request: Request, user: Optional[CurrentUser] = Depends(get_current_user)):
     if not user:
         return RedirectResponse("/login?msg=Please+login")
     
@@ -193,28 +302,29 @@ def create_note_form(request: Request, db: Session = Depends(get_db)):
     return templates.TemplateResponse("create_note.html", {"request": request, "user": user})
 
 @app.post("/note/create")
-def create_note(request: Request, title: str = Form(...), content: str = Form(...), db: Session = Depends(get_db)):
-    user = get_current_user(request, db)
+async def create_note(request: Request, title: str = Form(...), content: str = Form(...),
+                tag_text: str = Form("", alias="tags"),
+                user: Optional[CurrentUser] = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     if not user:
         return RedirectResponse("/login?msg=Please+login")
     
     if user.role == "superadmin":
         raise HTTPException(403, "Superadmin cannot create notes")
     
-    note_in = schemas.NoteCreate(title=title, content=content)
-    crud.create_note(db, note_in, user.id)
+    note_in = schemas.NoteCreate(title=title, content=content, tags=parse_tags(tag_text))
+    await crud_async.create_note(db, note_in, user.id)
     return RedirectResponse("/notes/my?msg=Note+created", status_code=302)
 
 @app.get("/note/{note_id}/edit")
-def edit_note_form(note_id: int, request: Request, db: Session = Depends(get_db)):
-    user = get_current_user(request, db)
+async def edit_note_form(note_id: int, request: Request, user: Optional[CurrentUser] = Depends(get_current_user),
+                   db: AsyncSession = Depends(get_db)):
     if not user:
         return RedirectResponse("/login?msg=Please+login")
     
     if user.role == "superadmin":
         raise HTTPException(403, "Superadmin cannot edit notes")
     
-    note = crud.get_note(db, note_id)
+    note = await crud_async.get_note(db, note_id)
     if not note:
         raise HTTPException(404, "Note not found")
     
@@ -224,49 +334,58 @@ def edit_note_form(note_id: int, request: Request, db: Session = Depends(get_db)
     return templates.TemplateResponse("edit_note.html", {"request": request, "note": note})
 
 @app.post("/note/{note_id}/edit")
-def edit_note(note_id: int, request: Request, title: str = Form(...), content: str = Form(...), db: Session = Depends(get_db)):
-    user = get_current_user(request, db)
+async def edit_note(note_id: int, request: Request, title: str = Form(...), content: str = Form(...),
+              version: Optional[int] = Form(None), tag_text: str = Form("", alias="tags"),
+              user: Optional[CurrentUser] = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     if not user:
         return RedirectResponse("/login?msg=Please+login")
     
     if user.role == "superadmin":
         raise HTTPException(403, "Superadmin cannot edit notes")
     
-    note = crud.get_note(db, note_id)
-    if not note:
+    # Ownership and version are checked by the UPDATE itself
+    data = schemas.NoteUpdate(title=title, content=content, version=version, tags=parse_tags(tag_text))
+    try:
+        updated = await crud_async.update_note(db, note_id, data, owner_id=user.id)
+    except crud.VersionConflict as conflict:
+        # Show what is saved now next to the user's text; saving again overwrites it
+        return templates.TemplateResponse("edit_note.html", {
+            "request": request, "note": conflict.note, "draft": data,
+            "error": "This note was changed after you opened it. Compare with the saved version below, then save again to overwrite it.",
+        }, status_code=409)
+    if not updated:
         raise HTTPException(404, "Note not found")
-    
-    if note.owner_id != user.id:
-        raise HTTPException(403, "Not allowed")
-    
-    updated = crud.update_note(db, note_id, schemas.NoteUpdate(title=title, content=content))
     return RedirectResponse("/notes/my?msg=Note+updated", status_code=302)
 
 # Delete note
 @app.get("/note/{note_id}/delete")
-def delete_note(note_id: int, request: Request, db: Session = Depends(get_db)):
-    user = get_current_user(request, db)
+async def delete_note(note_id: int, request: Request, version: Optional[int] = None,
+                user: Optional[CurrentUser] = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     if not user:
         return RedirectResponse("/login?msg=Please+login")
     
     if user.role == "superadmin":
         raise HTTPException(403, "Superadmin cannot delete notes")
     
-    note = crud.get_note(db, note_id)
-    if not note:
+    try:
+        deleted = await crud_async.delete_note(db, note_id, user.id, version)
+    except crud.VersionConflict:
+        return RedirectResponse("/notes/my?msg=Note+was+changed+since+you+loaded+it%2C+not+deleted", status_code=302)
+    if not deleted:
         raise HTTPException(404, "Note not found")
-    
-    if note.owner_id != user.id:
-        raise HTTPException(403, "Not allowed")
-    
-    crud.delete_note(db, note_id)
     return RedirectResponse("/notes/my?msg=Note+deleted", status_code=302)
 
 # Note detail
 @app.get("/note/{note_id}")
-def note_detail(note_id: int, request: Request, db: Session = Depends(get_db)):
-    user = get_current_user(request, db)
-    note = crud.get_note(db, note_id)
+async def note_detail(note_id: int, request: Request, user: Optional[CurrentUser] = Depends(get_current_user),
+                db: AsyncSession = Depends(get_db)):
+    # Token first: an edit committed while we render gets a new one
+    key = pagecache.detail_key(user, note_id, pagecache.note_token(note_id))
+    cached = cached_page(request, key)
+    if cached:
+        return cached
+    
+    note = await crud_async.get_note(db, note_id, options=crud_async.WITH_OWNER)
     if not note:
         raise HTTPException(404, "Note not found")
     
@@ -274,76 +393,97 @@ def note_detail(note_id: int, request: Request, db: Session = Depends(get_db)):
         raise HTTPException(403, "Not allowed")
     
     can_modify = user and user.role == "user" and note.owner_id == user.id
-    
-    return templates.TemplateResponse("note_detail.html", {
+    context = {
         "request": request, 
         "note": note, 
         "user": user,
-        "can_modify": can_modify
+        "can_modify": can_modify,
+        "content_chunks": storage.iter_chunks(note),
+    }
+    if storage.size(note) < storage.NOTE_STREAM_MIN_BYTES:
+        return cache_page(key, templates.TemplateResponse("note_detail.html", context), note.updated_at)
+
+    # Large body: render as it streams out instead of building one string, and keep it out of the page cache
+    page = templates.get_template("note_detail.html").generate(context)
+    return StreamingResponse(page, media_type="text/html",
+                             headers=pagecache.validator_headers(pagecache.etag_for(key), note.updated_at))
+
+# Note revisions
+async def _history_note(db, note_id: int, user: CurrentUser):
+    """The note if the user may see its history (its owner, or a superadmin)"""
+    note = await crud_async.get_note(db, note_id)
+    if not note:
+        raise HTTPException(404, "Note not found")
+    if user.role == "user" and note.owner_id != user.id:
+        raise HTTPException(403, "Not allowed")
+    return note
+
+@app.get("/note/{note_id}/revisions")
+async def note_revisions(note_id: int, request: Request, before: Optional[int] = Query(None),
+                         user: Optional[CurrentUser] = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    if not user:
+        return RedirectResponse("/login?msg=Please+login")
+    note = await _history_note(db, note_id, user)
+    items = await crud_async.get_revisions(db, note_id, before=before, limit=REVISIONS_PER_PAGE)
+    older_url = None
+    if len(items) == REVISIONS_PER_PAGE and items[-1].number > 1:
+        older_url = f"/note/{note_id}/revisions?before={items[-1].number}"
+    return templates.TemplateResponse("note_revisions.html", {
+        "request": request,
+        "note": note,
+        "revisions": items,
+        "older_url": older_url,
+        "current_number": items[0].number if items and before is None else None,
+        "can_modify": user.role == "user" and note.owner_id == user.id,
     })
 
-# Email sending function
-def send_reset_email(email: str, token: str, request: Request):
-    """Send password reset email to user"""
-    try:
-        # Create reset URL
-        app_url = os.getenv("APP_URL", f"{request.url.scheme}://{request.url.hostname}")
-        # reset_url = f"{request.url.scheme}://{request.url.hostname}/reset-password/{token}"
-        reset_url = f"{app_url}/reset-password/{token}"
-        
-        # Email content
-        msg = MIMEMultipart()
-        msg['From'] = EMAIL_ADDRESS
-        msg['To'] = email
-        msg['Subject'] = "🔐 Password Reset - Notes App"
-        
-        html_content = f"""
-        <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
-            <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); padding: 30px; text-align: center;">
-                <h1 style="color: white; margin: 0;">📝 Notes App</h1>
-            </div>
-            <div style="padding: 30px; background: #f9f9f9;">
-                <h2 style="color: #333; margin-top: 0;">Reset Your Password</h2>
-                <p>Hi there,</p>
-                <p>You've requested a password reset. Click the button below to create a new password:</p>
-                <div style="text-align: center; margin: 30px 0;">
-                    <a href="{reset_url}" style="background: #007bff; color: white; padding: 15px 30px; text-decoration: none; border-radius: 8px; display: inline-block;">Reset Password</a>
-                </div>
-                <p><em>This link will expire in 1 hour.</em></p>
-                <p>If you didn't request this, you can safely ignore this email.</p>
-                <hr style="border: none; border-top: 1px solid #eee; margin: 30px 0;">
-                <p style="color: #666; font-size: 14px;">
-                    Best regards,<br>
-                    <strong>The Notes App Team</strong>
-                </p>
-            </div>
-        </div>
-        """
-        
-        msg.attach(MIMEText(html_content, 'html'))
-        
-        # Send email
-        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
-        server.starttls()
-        server.login(EMAIL_ADDRESS, EMAIL_PASSWORD)
-        server.sendmail(EMAIL_ADDRESS, email, msg.as_string())
-        server.quit()
-        
-        print(f"✅ Reset email sent to {email}")
-        return True
-        
-    except Exception as e:
-        print(f"❌ Email sending failed: {e}")
-        return False
+@app.get("/note/{note_id}/revisions/{number}")
+async def note_revision(note_id: int, number: int, request: Request,
+                        user: Optional[CurrentUser] = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    if not user:
+        return RedirectResponse("/login?msg=Please+login")
+    note = await _history_note(db, note_id, user)
+    found = await crud_async.get_revision(db, note_id, number)
+    if not found:
+        raise HTTPException(404, "Revision not found")
+    revision, content = found
+    return templates.TemplateResponse("note_revision.html", {
+        "request": request,
+        "note": note,
+        "revision": revision,
+        "content": content,
+        "can_modify": user.role == "user" and note.owner_id == user.id,
+    })
+
+@app.post("/note/{note_id}/revisions/{number}/restore")
+async def restore_note_revision(note_id: int, number: int, user: Optional[CurrentUser] = Depends(get_current_user),
+                                db: AsyncSession = Depends(get_db)):
+    if not user:
+        return RedirectResponse("/login?msg=Please+login")
+    if user.role == "superadmin":
+        raise HTTPException(403, "Superadmin cannot edit notes")
+    await _history_note(db, note_id, user)
+    if not await crud_async.restore_revision(db, note_id, number):
+        raise HTTPException(404, "Revision not found")
+    return RedirectResponse(f"/note/{note_id}/revisions?msg=Restored+revision+{number}", status_code=302)
 
 @app.get("/forgot-password")
-def forgot_password_form(request: Request):
+async def forgot_password_form(request: Request):
     return templates.TemplateResponse("forgot_password.html", {"request": request})
 
 @app.post("/forgot-password")
-async def forgot_password(request: Request, email: str = Form(...), db: Session = Depends(get_db)):
+async def forgot_password(request: Request, email: str = Form(...), db: AsyncSession = Depends(get_db)):
+    # Limit per address before looking it up, so unknown addresses are limited the same way
+    key = email.strip().lower()
+    if not ratelimit.reset_requests.hit(key):
+        return templates.TemplateResponse(
+            "forgot_password.html",
+            {"request": request, "error": "Too many reset requests for this email. Please try again later."},
+            status_code=429, headers={"Retry-After": str(ratelimit.reset_requests.retry_after(key))}
+        )
+
     # Check if user exists 
-    user = crud.get_user_by_email(db, email)
+    user = await crud_async.get_user_by_email(db, email)
     
     if not user:
         return templates.TemplateResponse(
@@ -352,15 +492,16 @@ async def forgot_password(request: Request, email: str = Form(...), db: Session
         )
     
     # Create reset token
-    token = crud.create_password_reset_token(db, email)
+    token = await crud_async.create_password_reset_token(db, email)
     if not token:
         return templates.TemplateResponse(
             "forgot_password.html",
             {"request": request, "error": "Failed to generate reset token. Please try again."}
         )
     
-    # Send email
-    success = send_reset_email(email, token.token, request)
+    # Queue email; delivery (with retries) happens in the background
+    app_url = os.getenv("APP_URL", f"{request.url.scheme}://{request.url.hostname}")
+    success = mailer.send_reset_email(email, f"{app_url}/reset-password/{token.token}")
     if success:
         return templates.TemplateResponse(
             "forgot_password.html",
@@ -374,12 +515,12 @@ async def forgot_password(request: Request, email: str = Form(...), db: Session
 
 # Password Reset Routes
 @app.get("/reset-password/{token}")
-def reset_password_form(token: str, request: Request):
+async def reset_password_form(token: str, request: Request):
     return templates.TemplateResponse("reset_password.html", {"request": request, "token": token})
 
 @app.post("/reset-password/{token}")
 async def reset_password(request: Request, token: str, password: str = Form(...), 
-                        confirm_password: str = Form(...), db: Session = Depends(get_db)):
+                        confirm_password: str = Form(...), db: AsyncSession = Depends(get_db)):
     
     # Check if passwords match
     if password != confirm_password:
@@ -388,8 +529,14 @@ async def reset_password(request: Request, token: str, password: str = Form(...)
             {"request": request, "token": token, "error": "Passwords do not match!"}
         )
     
+    # Hash first: a saturated pool must not burn the single-use token
+    try:
+        hashed_pw = await auth.hash_password_async(password)
+    except auth.HashingBusy:
+        return too_busy(request, "reset_password.html", {"token": token})
+    
     # Validate token
-    user = crud.validate_reset_token(db, token)
+    user = await crud_async.validate_reset_token(db, token)
     if not user:
         return templates.TemplateResponse(
             "reset_password.html",
@@ -397,7 +544,7 @@ async def reset_password(request: Request, token: str, password: str = Form(...)
         )
     
     # Reset password
-    success = crud.reset_user_password(db, user.id, password)
+    success = await crud_async.reset_user_password(db, user.id, password, hashed_password=hashed_pw)
     if success:
         return RedirectResponse("/login?msg=Password+reset+successfully!+Please+login+with+your+new+password")
     else:
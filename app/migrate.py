@@ -0,0 +1,88 @@
+"""Run the Alembic migrations in migrations/ from inside the app.
+
+STARTUP_SCHEMA decides what each worker does about the schema when it starts:
+
+    migrate  apply pending migrations and create the search index (the
+             default; keeps `uvicorn app.main:app` working on an empty database)
+    check    only warn about pending migrations (AUTO_MIGRATE=false selects it)
+    skip     nothing: no DDL, no reflection, not even importing Alembic. For
+             deploys that run `python -m app.migrate` once before starting workers
+
+    python -m app.migrate          # upgrade to head and create the search index
+    python -m app.migrate check    # exit 1 if migrations are pending
+"""
+import os
+import sys
+
+from app.database import SessionLocal, engine
+
+AUTO_MIGRATE = os.getenv("AUTO_MIGRATE", "true").lower() in ("1", "true", "yes")
+STARTUP_SCHEMA = os.getenv("STARTUP_SCHEMA", "migrate" if AUTO_MIGRATE else "check").lower()
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "alembic.ini")
+
+
+# Alembic is imported inside these functions: workers started with STARTUP_SCHEMA=skip never need it
+
+def _config():
+    from alembic.config import Config
+
+    config = Config(ALEMBIC_INI)
+    config.attributes["configure_logging"] = False  # leave the app's logging alone
+    return config
+
+
+def upgrade(revision: str = "head"):
+    from alembic import command
+
+    command.upgrade(_config(), revision)
+
+
+def pending() -> list:
+    """Revisions not yet applied to the database, oldest first"""
+    from alembic.runtime.migration import MigrationContext
+    from alembic.script import ScriptDirectory
+
+    script = ScriptDirectory.from_config(_config())
+    with engine.connect() as conn:
+        current = MigrationContext.configure(conn).get_current_heads()
+    revisions = script.iterate_revisions("heads", current or "base")
+    return [rev.revision for rev in reversed(list(revisions))]
+
+
+def ensure_search_index():
+    from app import search_index
+
+    db = SessionLocal()
+    try:
+        search_index.ensure_index(db)
+    finally:
+        db.close()
+
+
+def prepare():
+    """Everything a deploy needs before workers start: migrations, then the search index"""
+    upgrade()
+    ensure_search_index()
+
+
+def ensure_schema():
+    """Startup hook; see STARTUP_SCHEMA"""
+    if STARTUP_SCHEMA == "skip":
+        return
+    if STARTUP_SCHEMA == "migrate":
+        upgrade()
+        print("✅ Database schema is up to date")
+    else:
+        missing = pending()
+        if missing:
+            print(f"⚠️ {len(missing)} pending migration(s) ({', '.join(missing)}); run 'alembic upgrade head'")
+    ensure_search_index()
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["check"]:
+        missing = pending()
+        print(f"Pending migrations: {', '.join(missing)}" if missing else "No pending migrations")
+        sys.exit(1 if missing else 0)
+    prepare()
+    print("✅ Database schema and search index are up to date")
@@ -1,7 +1,9 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, BigInteger, String, Text, LargeBinary, ForeignKey, DateTime, Index
+from sqlalchemy.dialects.mysql import LONGBLOB
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.database import Base
+from app import storage
 
 
 class User(Base):
@@ -11,27 +13,135 @@ class User(Base):
     email = Column(String(100), unique=True, nullable=False)
     password = Column(String(200), nullable=False)
     role = Column(String(20), default="user") 
+    # Maintained by app.stats for the admin dashboard's busiest users
+    note_count = Column(BigInteger, nullable=False, default=0, server_default="0")
+    content_bytes = Column(BigInteger, nullable=False, default=0, server_default="0")
     notes = relationship("Note", back_populates="owner", cascade="all, delete-orphan")
     reset_tokens = relationship("PasswordResetToken", back_populates="user", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index("ix_users_note_count", "note_count", "id"),
+    )
+
 class Note(Base):
     __tablename__ = "notes"
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(200), nullable=False)
-    content = Column(Text, nullable=False)
+    # Body storage, see app.storage; read and assign it through .content
+    stored_content = Column("content", Text, nullable=False)  # the body when content_encoding is NULL
+    content_data = Column(LargeBinary().with_variant(LONGBLOB, "mysql", "mariadb"))
+    content_encoding = Column(String(16))
+    content_ref = Column(String(64), index=True)
+    content_size = Column(Integer)
+    preview = Column(String(255))  # crud.make_preview(content), for list pages
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    owner_id = Column(Integer, ForeignKey("users.id"))
+    owner_id = Column(Integer, ForeignKey("users.id"), index=True)  # (owner_id, id) order for exports
+    version = Column(Integer, nullable=False, default=1, server_default="1")  # +1 per save; see crud.update_note
+    change_seq = Column(BigInteger, nullable=False, default=0, server_default="0")  # owner's change sequence, see app.sync
+    tag_text = Column("tags", String(1000))  # tag names, space separated; read them through .tags (see app.tags)
     owner = relationship("User", back_populates="notes")
 
+    @property
+    def content(self) -> str:
+        return storage.read(self)
+
+    @content.setter
+    def content(self, value: str):
+        for key, column_value in storage.columns(value).items():
+            setattr(self, key, column_value)
+
+    @property
+    def tags(self) -> list:
+        return self.tag_text.split() if self.tag_text else []
+
+    __table_args__ = (
+        # Keyset listings: a user's notes newest first, and everyone's for /notes/all
+        Index("ix_notes_owner_created", "owner_id", "created_at", "id"),
+        Index("ix_notes_created", "created_at", "id"),
+        # Sync: a user's notes changed after a cursor
+        Index("ix_notes_owner_change_seq", "owner_id", "change_seq", "id"),
+    )
+
+
+class NoteRevision(Base):
+    """One saved version of a note: a snapshot or a delta against the previous one (see app.revisions)"""
+    __tablename__ = "note_revisions"
+    id = Column(Integer, primary_key=True)
+    note_id = Column(Integer, ForeignKey("notes.id", ondelete="CASCADE"), nullable=False)
+    number = Column(Integer, nullable=False)
+    kind = Column(String(8), nullable=False)
+    title = Column(String(200), nullable=False)
+    size = Column(Integer, nullable=False)  # characters in the body
+    data = Column(LargeBinary().with_variant(LONGBLOB, "mysql", "mariadb"), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_note_revisions_note_number", "note_id", "number", unique=True),
+    )
+
+
+class NoteTombstone(Base):
+    """A deleted note, kept for SYNC_TOMBSTONE_DAYS so sync clients learn of the delete (see app.sync)"""
+    __tablename__ = "note_tombstones"
+    id = Column(Integer, primary_key=True)
+    note_id = Column(Integer, nullable=False)
+    owner_id = Column(Integer, nullable=False)
+    change_seq = Column(BigInteger, nullable=False)
+    deleted_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)  # the sweeper purges by it
+
+    __table_args__ = (
+        Index("ix_note_tombstones_owner_seq", "owner_id", "change_seq"),
+    )
+
+
+class Tag(Base):
+    """A tag name of one user; note_count is maintained by app.tags"""
+    __tablename__ = "tags"
+    id = Column(Integer, primary_key=True)
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    name = Column(String(40), nullable=False)
+    note_count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        Index("ix_tags_owner_name", "owner_id", "name", unique=True),
+    )
+
+
+class NoteTag(Base):
+    """A tag on a note. The primary key reads a tag's notes as one index range"""
+    __tablename__ = "note_tags"
+    tag_id = Column(Integer, ForeignKey("tags.id", ondelete="CASCADE"), primary_key=True)
+    note_id = Column(Integer, ForeignKey("notes.id", ondelete="CASCADE"), primary_key=True, index=True)
+
+
+class NoteTerm(Base):
+    """Inverted index posting: one row per (term, note)"""
+    __tablename__ = "note_terms"
+    term = Column(String(64), primary_key=True)
+    note_id = Column(Integer, ForeignKey("notes.id", ondelete="CASCADE"), primary_key=True, index=True)
+    owner_id = Column(Integer, nullable=False)
+    weight = Column(Integer, nullable=False, default=1)
+
+    __table_args__ = (
+        Index("ix_note_terms_term_owner", "term", "owner_id"),
+    )
+
+
+class Counter(Base):
+    """Maintained row counts, so listings never need COUNT(*)"""
+    __tablename__ = "counters"
+    name = Column(String(64), primary_key=True)
+    value = Column(BigInteger, nullable=False, default=0)
+
 
 class PasswordResetToken(Base):
     __tablename__ = "password_reset_tokens"
     
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     token = Column(String(64), nullable=False, unique=True, index=True)
-    expires_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)  # the sweeper deletes by it
     used = Column(Integer, default=0)
     
     user = relationship("User", back_populates="reset_tokens")
@@ -0,0 +1,442 @@
+"""Bulk import and export of notes as NDJSON or CSV.
+
+    python -m app.notes_cli export [-o notes.ndjson] [--format csv] [--workers 4]
+    python -m app.notes_cli import notes.ndjson [--checkpoint import.ckpt] [--workers 4]
+
+Both directions stream: export walks the notes table in (owner_id, id)
+batches and import reads one record at a time, so memory stays flat however
+many notes there are. Import writes multi-row INSERTs of --batch-size rows
+and commits every --commit-every rows; the search index, note counters,
+usage statistics and tags are kept up to date in the same transactions.
+Imported notes count as created today on the dashboard, and get no revision
+until they are first edited (see app.revisions).
+
+Records carry title, content, tags, owner_email, created_at and updated_at
+(export also writes id, which import ignores). Tags are a list in NDJSON and
+space separated in CSV; import also takes a comma separated string. Import
+picks the owner from --owner, then owner_email, then owner_id; records
+without a known owner, with an empty title or body, or with too many tags
+are skipped and reported.
+
+--checkpoint records how far the input has been imported after every commit;
+running the same command again resumes from there. A crash between a commit
+and its checkpoint write re-imports that one chunk.
+
+--workers splits the users into that many id ranges, each handled by its
+own process and connection. For import every worker reads the whole input
+and keeps its own owners' records; on SQLite, which has a single writer,
+use one worker. Running app workers see imported notes in cached pages
+after at most PAGE_CACHE_TTL seconds.
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy import insert
+
+import app.counters as counters
+import app.crud as crud
+import app.models as models
+import app.search_index as search_index
+import app.stats as stats
+import app.storage as storage
+import app.sync as sync
+import app.tags as tags
+from app.database import SessionLocal, use_primary
+
+FIELDS = ["id", "owner_email", "title", "content", "tags", "created_at", "updated_at"]
+EXPORT_BATCH_SIZE = 1000
+IMPORT_BATCH_SIZE = 1000
+IMPORT_COMMIT_EVERY = 10000
+TITLE_MAX_LENGTH = 200
+
+csv.field_size_limit(min(sys.maxsize, 2 ** 31 - 1))  # note bodies can be far larger than the 128 KiB default
+
+
+def _log(message: str):
+    print(message, file=sys.stderr, flush=True)
+
+
+def _user_ranges(db, workers: int):
+    """Split the users into `workers` contiguous id ranges of about equal size"""
+    ids = list(db.scalars(db.query(models.User.id).order_by(models.User.id).statement))
+    if not ids:
+        return [(0, 0)]
+    step = -(-len(ids) // workers)
+    return [(ids[i], ids[min(i + step, len(ids)) - 1]) for i in range(0, len(ids), step)]
+
+
+# Export
+
+def iter_notes(db, first_owner: int = None, last_owner: int = None, batch_size: int = EXPORT_BATCH_SIZE):
+    """Yield (note, owner_email) batches in (owner_id, id) order, optionally for a range of owners"""
+    owner_id, after_id = None, 0
+    while True:
+        q = db.query(models.Note, models.User.email).outerjoin(models.User, models.User.id == models.Note.owner_id)
+        if owner_id is not None:
+            # Rest of the current owner's notes first, then the owners after it; both seek ix_notes_owner_id
+            batch = q.filter(models.Note.owner_id == owner_id, models.Note.id > after_id) \
+                .order_by(models.Note.id).limit(batch_size).all()
+        else:
+            batch = []
+        if len(batch) < batch_size:
+            q = q.filter(models.Note.owner_id.isnot(None))
+            if owner_id is not None:
+                q = q.filter(models.Note.owner_id > owner_id)
+            elif first_owner is not None:
+                q = q.filter(models.Note.owner_id >= first_owner)
+            if last_owner is not None:
+                q = q.filter(models.Note.owner_id <= last_owner)
+            batch += q.order_by(models.Note.owner_id, models.Note.id).limit(batch_size - len(batch)).all()
+        if not batch:
+            return
+        yield batch
+        owner_id, after_id = batch[-1][0].owner_id, batch[-1][0].id
+        db.expunge_all()
+
+
+def _record(note, owner_email) -> dict:
+    return {
+        "id": note.id,
+        "owner_email": owner_email,
+        "title": note.title,
+        "content": note.content,
+        "tags": note.tags,
+        "created_at": note.created_at.isoformat() if note.created_at else None,
+        "updated_at": note.updated_at.isoformat() if note.updated_at else None,
+    }
+
+
+def write_records(out, records, fmt: str, header: bool = True):
+    """Write records to a text stream; returns how many were written"""
+    count = 0
+    if fmt == "csv":
+        writer = csv.DictWriter(out, fieldnames=FIELDS)
+        if header:
+            writer.writeheader()
+        for record in records:
+            writer.writerow({**record, "tags": " ".join(record["tags"])})
+            count += 1
+    else:
+        for record in records:
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+
+def _export_range(path: str, fmt: str, first_owner=None, last_owner=None, header: bool = True) -> int:
+    db = SessionLocal()
+    try:
+        with open(path, "w", encoding="utf-8", newline="") as out:
+            records = (_record(note, email)
+                       for batch in iter_notes(db, first_owner, last_owner) for note, email in batch)
+            return write_records(out, records, fmt, header)
+    finally:
+        db.close()
+
+
+def _export_part(args) -> int:
+    return _export_range(*args, header=False)
+
+
+def export_notes(output: str, fmt: str = "ndjson", workers: int = 1) -> int:
+    """Write every note to output ("-" for stdout); returns the number of notes"""
+    if workers <= 1 and output != "-":
+        return _export_range(output, fmt)
+
+    db = SessionLocal()
+    try:
+        ranges = _user_ranges(db, max(1, workers))
+    finally:
+        db.close()
+    part_dir = tempfile.mkdtemp(prefix="notes-export-", dir=None if output == "-" else os.path.dirname(os.path.abspath(output)))
+    try:
+        parts = [(os.path.join(part_dir, f"part{i}"), fmt, lo, hi) for i, (lo, hi) in enumerate(ranges)]
+        if len(parts) > 1:
+            with multiprocessing.get_context("spawn").Pool(len(parts)) as pool:
+                total = sum(pool.map(_export_part, parts))
+        else:
+            total = _export_part(parts[0])
+        out = sys.stdout if output == "-" else open(output, "w", encoding="utf-8", newline="")
+        try:
+            write_records(out, [], fmt)  # the CSV header, if any
+            out.flush()
+            for path, *_ in parts:
+                with open(path, "r", encoding="utf-8", newline="") as part:
+                    shutil.copyfileobj(part, out)
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        return total
+    finally:
+        shutil.rmtree(part_dir, ignore_errors=True)
+
+
+# Import
+
+def read_records(path: str, fmt: str, skip: int = 0, offset: int = 0):
+    """Yield (record, records_read, byte_offset) from an NDJSON or CSV file ("-" for stdin).
+
+    Resume NDJSON at a byte offset; CSV (whose records may span lines) by
+    re-reading and skipping the first `skip` records.
+    """
+    if fmt == "csv":
+        f = sys.stdin if path == "-" else open(path, "r", encoding="utf-8", newline="")
+        try:
+            for n, record in enumerate(csv.DictReader(f), 1):
+                if n > skip:
+                    yield record, n, None
+        finally:
+            if f is not sys.stdin:
+                f.close()
+        return
+
+    f = sys.stdin.buffer if path == "-" else open(path, "rb")
+    try:
+        if offset:
+            f.seek(offset)
+        n = skip
+        for line in f:
+            offset += len(line)
+            if not line.strip():
+                continue
+            n += 1
+            yield json.loads(line), n, offset
+    finally:
+        if f is not sys.stdin.buffer:
+            f.close()
+
+
+def _parse_time(value, default: datetime) -> datetime:
+    if not value:
+        return default
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).replace(tzinfo=None)
+
+
+def _tag_names(value) -> list:
+    """A record's tags, cleaned: a list (NDJSON) or a string (CSV); raises ValueError past MAX_TAGS_PER_NOTE"""
+    if isinstance(value, list):
+        return tags.clean(str(name) for name in value)
+    return tags.parse(value)
+
+
+def _row(record: dict, owner_id: int, now: datetime) -> dict:
+    content = record.get("content") or ""
+    created_at = _parse_time(record.get("created_at"), now)
+    return {
+        "title": record["title"],
+        **storage.columns(content),
+        "preview": crud.make_preview(content),
+        "tag_text": tags.join(record.get("tags") or []),
+        "owner_id": owner_id,
+        "created_at": created_at,
+        "updated_at": _parse_time(record.get("updated_at"), created_at),
+    }
+
+
+class Importer:
+    """Inserts note rows in multi-row batches, maintaining the search index, counters and tags"""
+
+    def __init__(self, db, batch_size: int = IMPORT_BATCH_SIZE):
+        self.db = db
+        self.batch_size = batch_size
+        # MySQL FULLTEXT indexes new rows itself; the other backends need each note's id
+        self.index = search_index.get_backend(db).name != search_index.MySQLFullTextBackend.name
+        self.returning = db.get_bind().dialect.insert_executemany_returning
+        self.pending = []
+
+    def add(self, row: dict):
+        self.pending.append(row)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        rows, self.pending = self.pending, []
+        if not rows:
+            return
+        per_owner = Counter(row["owner_id"] for row in rows)
+        next_seq = {owner_id: sync.allocate(self.db, owner_id, per_owner[owner_id]) for owner_id in sorted(per_owner)}
+        for row in rows:
+            row["change_seq"] = next_seq[row["owner_id"]]
+            next_seq[row["owner_id"]] += 1
+        if not self.index and not any(row["tag_text"] for row in rows):
+            self.db.execute(insert(models.Note), rows)
+        else:
+            if self.returning:
+                notes = self.db.scalars(insert(models.Note).returning(models.Note), rows).all()
+            else:
+                # No RETURNING (MySQL): the ORM inserts row by row to learn each id
+                notes = [models.Note(**row) for row in rows]
+                self.db.add_all(notes)
+                self.db.flush()
+            if self.index:
+                search_index.index_notes(self.db, notes)
+            tagged = {}
+            for note in notes:
+                if note.tag_text:
+                    tagged.setdefault(note.owner_id, []).append((note.id, [], note.tags))
+            for owner_id, changes in tagged.items():
+                tags.assign(self.db, owner_id, changes)
+        sizes = {}
+        for row in rows:
+            sizes.setdefault(row["owner_id"], []).append(row["content_size"])
+        for owner_id, n in per_owner.items():
+            counters.note_added(self.db, owner_id, n)
+            stats.notes_created(self.db, owner_id, sizes[owner_id])
+
+    def commit(self):
+        self.flush()
+        self.db.commit()
+        self.db.expunge_all()
+
+
+def _load_checkpoint(path: str, source: str) -> dict:
+    if path and os.path.exists(path):
+        with open(path) as f:
+            checkpoint = json.load(f)
+        if checkpoint.get("source") == source:
+            return checkpoint
+        _log(f"⚠️ Ignoring checkpoint {path}: it belongs to {checkpoint.get('source')}")
+    return {"source": source, "records": 0, "offset": 0, "imported": 0, "skipped": 0}
+
+
+def _save_checkpoint(path: str, checkpoint: dict):
+    if not path:
+        return
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp, path)
+
+
+def import_notes(path: str, fmt: str = "ndjson", owner_email: str = None, checkpoint_path: str = None,
+                 batch_size: int = IMPORT_BATCH_SIZE, commit_every: int = IMPORT_COMMIT_EVERY,
+                 first_owner: int = None, last_owner: int = None, report_skipped: bool = True,
+                 label: str = "") -> dict:
+    """Import records from path; with first_owner/last_owner, only those owners' records"""
+    source = "-" if path == "-" else os.path.abspath(path)
+    checkpoint = _load_checkpoint(checkpoint_path, source)
+    if checkpoint["records"]:
+        _log(f"⏩ {label}Resuming after record {checkpoint['records']}")
+
+    db = SessionLocal()
+    use_primary(db)
+    try:
+        owners = {email.lower(): user_id for email, user_id in db.query(models.User.email, models.User.id)}
+        known_ids = set(owners.values())
+        forced_owner = None
+        if owner_email:
+            forced_owner = owners.get(owner_email.lower())
+            if forced_owner is None:
+                raise SystemExit(f"❌ No user with email {owner_email}")
+
+        importer = Importer(db, batch_size)
+        now = datetime.utcnow()
+        started = time.monotonic()
+        uncommitted = 0
+        for record, n, offset in read_records(path, fmt, checkpoint["records"], checkpoint["offset"]):
+            checkpoint["records"], checkpoint["offset"] = n, offset or 0
+            owner_id = forced_owner
+            if owner_id is None:
+                if record.get("owner_email"):
+                    owner_id = owners.get(record["owner_email"].lower())
+                elif record.get("owner_id") not in (None, ""):
+                    owner_id = int(record["owner_id"])
+                    owner_id = owner_id if owner_id in known_ids else None
+            title = (record.get("title") or "").strip()
+            if owner_id is not None and first_owner is not None and not first_owner <= owner_id <= last_owner:
+                continue  # another worker's
+            if owner_id is None or not title or len(title) > TITLE_MAX_LENGTH or not record.get("content"):
+                problem = "missing owner, title or content"
+            else:
+                try:
+                    names, problem = _tag_names(record.get("tags")), None
+                except ValueError as e:
+                    problem = str(e)
+            if problem:
+                if report_skipped:
+                    checkpoint["skipped"] += 1
+                    _log(f"⚠️ {label}Skipping record {n}: {problem}")
+                continue
+            importer.add(_row({**record, "title": title, "tags": names}, owner_id, now))
+            checkpoint["imported"] += 1
+            uncommitted += 1
+            if uncommitted >= commit_every:
+                importer.commit()
+                _save_checkpoint(checkpoint_path, checkpoint)
+                uncommitted = 0
+                rate = checkpoint["imported"] / max(time.monotonic() - started, 1e-9)
+                _log(f"⏳ {label}{checkpoint['imported']} notes imported ({rate:.0f}/s)")
+        importer.commit()
+        _save_checkpoint(checkpoint_path, checkpoint)
+        return checkpoint
+    finally:
+        db.close()
+
+
+def _import_part(kwargs) -> dict:
+    return import_notes(**kwargs)
+
+
+def import_parallel(path: str, workers: int, checkpoint_path: str = None, **options) -> dict:
+    db = SessionLocal()
+    try:
+        ranges = _user_ranges(db, workers)
+    finally:
+        db.close()
+    jobs = [dict(path=path, checkpoint_path=f"{checkpoint_path}.{i}" if checkpoint_path else None,
+                 first_owner=lo, last_owner=hi, report_skipped=i == 0, label=f"[{i}] ", **options)
+            for i, (lo, hi) in enumerate(ranges)]
+    with multiprocessing.get_context("spawn").Pool(len(jobs)) as pool:
+        results = pool.map(_import_part, jobs)
+    return {key: sum(r[key] for r in results) for key in ("imported", "skipped")}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.notes_cli", description="Bulk import/export of notes")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_cmd = commands.add_parser("export", help="write every note as NDJSON or CSV")
+    export_cmd.add_argument("-o", "--output", default="-", help="file to write (default: stdout)")
+    export_cmd.add_argument("--format", choices=("ndjson", "csv"))
+    export_cmd.add_argument("--workers", type=int, default=1, help="parallel readers, split by user id range")
+
+    import_cmd = commands.add_parser("import", help="add notes from an NDJSON or CSV file")
+    import_cmd.add_argument("input", help="file to read ('-' for stdin)")
+    import_cmd.add_argument("--format", choices=("ndjson", "csv"))
+    import_cmd.add_argument("--owner", help="import every note for this user's email")
+    import_cmd.add_argument("--checkpoint", help="progress file; rerun with the same file to resume")
+    import_cmd.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE, help="rows per INSERT")
+    import_cmd.add_argument("--commit-every", type=int, default=IMPORT_COMMIT_EVERY, help="rows per transaction")
+    import_cmd.add_argument("--workers", type=int, default=1, help="parallel writers, split by user id range")
+
+    args = parser.parse_args(argv)
+    target = args.output if args.command == "export" else args.input
+    fmt = args.format or ("csv" if target.lower().endswith(".csv") else "ndjson")
+    started = time.monotonic()
+
+    if args.command == "export":
+        total = export_notes(args.output, fmt, args.workers)
+        _log(f"✅ Exported {total} notes in {time.monotonic() - started:.1f}s")
+        return
+
+    if args.input == "-" and (args.checkpoint or args.workers > 1):
+        parser.error("stdin input supports neither --checkpoint nor --workers")
+    options = dict(fmt=fmt, owner_email=args.owner, batch_size=args.batch_size, commit_every=args.commit_every)
+    if args.workers > 1 and not args.owner:
+        result = import_parallel(args.input, args.workers, args.checkpoint, **options)
+    else:
+        result = import_notes(args.input, checkpoint_path=args.checkpoint, **options)
+    _log(f"✅ Imported {result['imported']} notes ({result['skipped']} skipped) in {time.monotonic() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""Rendered-page cache for note detail and listing pages.
+
+Pages are cached per viewer under keys that embed a version token: a
+per-note token for detail pages and a per-listing generation for listings. The crud write
+functions replace those tokens (note_changed), so stale pages are never
+served again and simply age out of the LRU.
+
+The default backend is in-process: each worker invalidates only its own
+cache, so with several workers a page can be up to PAGE_CACHE_TTL seconds
+stale. A shared backend (same get/set/delete interface) removes that.
+"""
+import hashlib
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+PAGE_CACHE_BACKEND = os.getenv("PAGE_CACHE_BACKEND", "memory")  # "memory" or "none"
+PAGE_CACHE_SIZE = int(os.getenv("PAGE_CACHE_SIZE", "5000"))
+PAGE_CACHE_TTL = float(os.getenv("PAGE_CACHE_TTL", "300"))
+
+
+class CacheBackend:
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl: float = PAGE_CACHE_TTL):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class LRUBackend(CacheBackend):
+    """Thread-safe in-process LRU with per-entry TTL"""
+
+    def __init__(self, max_entries: int = PAGE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: float = PAGE_CACHE_TTL):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class NullBackend(CacheBackend):
+    """Caching disabled"""
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl: float = PAGE_CACHE_TTL):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def clear(self):
+        pass
+
+
+BACKENDS = {"memory": LRUBackend, "none": NullBackend}
+
+backend = BACKENDS[PAGE_CACHE_BACKEND]()
+
+
+def set_backend(new_backend: CacheBackend):
+    global backend
+    backend = new_backend
+
+
+# Version tokens
+
+def _token(key: str) -> str:
+    token = backend.get(key)
+    if token is None:
+        token = uuid.uuid4().hex[:16]
+        backend.set(key, token)
+    return token
+
+
+def note_token(note_id: int) -> str:
+    """Version token of a note, created on first use.
+
+    Callers take the token before loading the note: a write that lands in
+    between replaces it, so the page rendered from the old row is stored
+    under a key nobody asks for again.
+    """
+    return _token(f"note:{note_id}")
+
+
+def list_generation(scope: str) -> str:
+    """Generation token of a listing scope: 'all' or 'user:<id>'"""
+    return _token(f"list:{scope}")
+
+
+def note_changed(note_id: int, owner_id: int):
+    """Invalidate every cached page that shows this note; called after a write commits"""
+    backend.delete(f"note:{note_id}")
+    backend.delete(f"list:user:{owner_id}")
+    backend.delete("list:all")
+
+
+# Keys and conditional requests
+
+def _viewer(user) -> str:
+    # Role is part of the key: it decides what a page shows (e.g. edit links)
+    return f"{user.id}.{user.role}" if user else "anon"
+
+
+def detail_key(user, note_id: int, token: str) -> str:
+    return f"page:detail:{_viewer(user)}:{note_id}:{token}"
+
+
+def listing_key(name: str, user, scope: str, query: str) -> str:
+    return f"page:{name}:{_viewer(user)}:{list_generation(scope)}:{query}"
+
+
+def etag_for(key: str) -> str:
+    return '"%s"' % hashlib.sha1(key.encode()).hexdigest()[:20]
+
+
+def http_date(value: datetime) -> str:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)  # stored as naive UTC
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def _opaque(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def is_not_modified(headers, etag: str, last_modified: datetime = None) -> bool:
+    """Evaluate If-None-Match (preferred) or If-Modified-Since against the current version"""
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        # Weak comparison: a compressed copy carries W/"..." (see app.compression)
+        return _opaque(etag) in [_opaque(tag) for tag in if_none_match.split(",")] or if_none_match.strip() == "*"
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if last_modified.tzinfo is None:
+            last_modified = last_modified.replace(tzinfo=timezone.utc)
+        return last_modified.replace(microsecond=0) <= since
+    return False
+
+
+def validator_headers(etag: str, last_modified: datetime = None) -> dict:
+    # private: pages are per user; no-cache: browsers revalidate and get a 304
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    return headers
+
+
+def get_page(key: str):
+    """Cached (body, last_modified) for key, or None"""
+    return backend.get(key)
+
+
+def set_page(key: str, body: bytes, last_modified: datetime = None):
+    backend.set(key, (body, last_modified))
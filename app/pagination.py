@@ -0,0 +1,81 @@
+import base64
+import binascii
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+import app.models as models
+
+# One page of a listing plus the cursors that lead to its neighbours
+Page = namedtuple("Page", ["items", "next_cursor", "prev_cursor"])
+
+NEXT = "n"
+PREV = "p"
+
+
+def encode_cursor(direction: str, created_at: datetime, note_id: int) -> str:
+    raw = f"{direction}|{created_at.isoformat()}|{note_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    """Return (direction, created_at, note_id), or None for a malformed cursor"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        direction, created_at, note_id = raw.split("|")
+        if direction not in (NEXT, PREV):
+            return None
+        return direction, datetime.fromisoformat(created_at), int(note_id)
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        return None
+
+
+def keyset_page(q, cursor: str = None, limit: int = 10) -> Page:
+    """Newest-first page of a Note query, seeking on (created_at, id) instead of OFFSET"""
+    created, note_id = models.Note.created_at, models.Note.id
+    decoded = decode_cursor(cursor) if cursor else None
+    direction = decoded[0] if decoded else NEXT
+
+    if decoded:
+        _, c_created, c_id = decoded
+        if direction == NEXT:
+            q = q.filter(or_(created < c_created, and_(created == c_created, note_id < c_id)))
+        else:
+            q = q.filter(or_(created > c_created, and_(created == c_created, note_id > c_id)))
+
+    if direction == NEXT:
+        rows = q.order_by(created.desc(), note_id.desc()).limit(limit + 1).all()
+    else:
+        rows = q.order_by(created.asc(), note_id.asc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    items = rows[:limit]
+    if direction == PREV:
+        items.reverse()
+
+    if not items:
+        return Page(items, None, None)
+    first, last = items[0], items[-1]
+    # Paging forwards always has newer rows behind it; paging back always has older ones ahead
+    has_next = has_more if direction == NEXT else True
+    has_prev = decoded is not None if direction == NEXT else has_more
+    return Page(
+        items,
+        encode_cursor(NEXT, last.created_at, last.id) if has_next else None,
+        encode_cursor(PREV, first.created_at, first.id) if has_prev else None,
+    )
+
+
+def offset_page(q, offset: int, limit: int) -> Page:
+    """OFFSET-based page in keyset order, with cursors so the following pages can seek"""
+    created, note_id = models.Note.created_at, models.Note.id
+    rows = q.order_by(created.desc(), note_id.desc()).offset(offset).limit(limit + 1).all()
+    items = rows[:limit]
+    if not items:
+        return Page(items, None, None)
+    first, last = items[0], items[-1]
+    return Page(
+        items,
+        encode_cursor(NEXT, last.created_at, last.id) if len(rows) > limit else None,
+        encode_cursor(PREV, first.created_at, first.id) if offset > 0 else None,
+    )
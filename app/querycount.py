@@ -0,0 +1,53 @@
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from app.database import all_sync_engines
+
+# Statement budgets for the listing pages: current user, counter, page of notes (+ slack)
+LISTING_QUERY_BUDGET = {
+    "/notes/my": 5,
+    "/notes/all": 5,
+}
+
+
+class QueryCounter:
+    """Record every SQL statement an engine executes while active"""
+
+    def __init__(self, bind=None):
+        # By default watch every engine: sync, async (AsyncSessionLocal) and replicas
+        self.binds = [bind] if bind is not None else all_sync_engines()
+        self.statements = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        for bind in self.binds:
+            event.listen(bind, "before_cursor_execute", self._before_cursor_execute)
+        return self
+
+    def __exit__(self, *exc):
+        for bind in self.binds:
+            event.remove(bind, "before_cursor_execute", self._before_cursor_execute)
+        return False
+
+
+@contextmanager
+def assert_max_queries(limit: int, bind=None):
+    """Fail with AssertionError if the block issues more than `limit` statements.
+
+    Meant for tests, e.g.:
+
+        with assert_max_queries(LISTING_QUERY_BUDGET["/notes/all"]):
+            client.get("/notes/all")
+    """
+    with QueryCounter(bind) as counter:
+        yield counter
+    if counter.count > limit:
+        listing = "\n".join(f"  {i}. {sql}" for i, sql in enumerate(counter.statements, 1))
+        raise AssertionError(f"Expected at most {limit} SQL statements, got {counter.count}:\n{listing}")
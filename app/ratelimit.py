@@ -0,0 +1,58 @@
+"""In-memory sliding-window rate limits.
+
+Counts are per worker process, so with N workers a client can get up to N
+times the limit through; the limit still caps what each worker passes on to
+the database and SMTP.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+RESET_REQUESTS_PER_EMAIL = int(os.getenv("RESET_REQUESTS_PER_EMAIL", "3"))
+RESET_REQUEST_WINDOW = float(os.getenv("RESET_REQUEST_WINDOW", "3600"))  # seconds
+
+
+class RateLimiter:
+    """Allow `limit` hits per key in any `window` seconds; remembers at most `max_keys` keys"""
+
+    def __init__(self, limit: int, window: float, max_keys: int = 100_000):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self._hits = OrderedDict()  # key -> deque of hit times, least recently used first
+        self._lock = threading.Lock()
+
+    def hit(self, key: str) -> bool:
+        """Record a hit; False (and nothing recorded) when the key is over its limit"""
+        now = time.monotonic()
+        with self._lock:
+            hits = self._hits.get(key)
+            if hits is None:
+                hits = self._hits[key] = deque()
+                if len(self._hits) > self.max_keys:
+                    self._hits.popitem(last=False)
+            else:
+                self._hits.move_to_end(key)
+            while hits and hits[0] <= now - self.window:
+                hits.popleft()
+            if len(hits) >= self.limit:
+                return False
+            hits.append(now)
+            return True
+
+    def retry_after(self, key: str) -> int:
+        """Seconds until the key may hit again"""
+        with self._lock:
+            hits = self._hits.get(key)
+            if not hits or len(hits) < self.limit:
+                return 0
+            return max(1, int(hits[0] + self.window - time.monotonic()) + 1)
+
+    def reset(self):
+        with self._lock:
+            self._hits.clear()
+
+
+# /forgot-password, keyed by the normalised email address
+reset_requests = RateLimiter(RESET_REQUESTS_PER_EMAIL, RESET_REQUEST_WINDOW)
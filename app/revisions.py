@@ -0,0 +1,140 @@
+"""Note revision history, stored as line deltas with periodic full snapshots.
+
+Every saved version of a note is a NoteRevision, numbered from 1 per note;
+the highest number is the note's current state. Revision N is stored either
+as a snapshot (the whole body) or as a delta against revision N-1. A
+snapshot is forced every REVISION_SNAPSHOT_INTERVAL revisions, and whenever
+a delta would be larger than a snapshot. Rebuilding any revision then reads
+one snapshot and fewer than REVISION_SNAPSHOT_INTERVAL deltas, however long
+the history is.
+
+Notes saved before revisions existed get their previous version recorded as
+a snapshot on their first edit.
+
+Deltas are JSON op lists over the old body's lines, zlib-compressed: [i, j]
+copies old lines i..j-1, a string inserts new text.
+"""
+import json
+import os
+import zlib
+from difflib import SequenceMatcher
+
+from sqlalchemy import func, insert
+from sqlalchemy.orm import Session
+
+import app.models as models
+
+REVISION_SNAPSHOT_INTERVAL = int(os.getenv("REVISION_SNAPSHOT_INTERVAL", "20"))
+
+SNAPSHOT = "snapshot"
+DELTA = "delta"
+
+
+# Deltas
+
+def diff(old: str, new: str) -> list:
+    old_lines, new_lines = old.splitlines(keepends=True), new.splitlines(keepends=True)
+    ops = []
+    for tag, i1, i2, j1, j2 in SequenceMatcher(None, old_lines, new_lines).get_opcodes():
+        if tag == "equal":
+            ops.append([i1, i2])
+        elif j2 > j1:  # replace / insert; deletes just copy nothing
+            ops.append("".join(new_lines[j1:j2]))
+    return ops
+
+
+def patch(old: str, ops: list) -> str:
+    old_lines = old.splitlines(keepends=True)
+    return "".join("".join(old_lines[op[0]:op[1]]) if isinstance(op, list) else op for op in ops)
+
+
+def _pack(value) -> bytes:
+    return zlib.compress(json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+
+def _unpack(data: bytes):
+    return json.loads(zlib.decompress(data).decode("utf-8"))
+
+
+# Writing
+
+def _row(note_id: int, number: int, title: str, content: str, previous: str = None) -> dict:
+    kind, data = SNAPSHOT, _pack(content)
+    if previous is not None and (number - 1) % REVISION_SNAPSHOT_INTERVAL:
+        delta = _pack(diff(previous, content))
+        if len(delta) < len(data):
+            kind, data = DELTA, delta
+    return {"note_id": note_id, "number": number, "kind": kind, "title": title,
+            "size": len(content), "data": data}
+
+
+def record(db: Session, changes):
+    """Add a revision per saved note; runs inside the caller's transaction.
+
+    changes: (note_id, title, content, previous) tuples, where previous is the
+    (title, content) being replaced, or None for a new note.
+    """
+    changes = [c for c in changes if c[3] is None or tuple(c[3]) != (c[1], c[2])]  # skip no-op saves
+    if not changes:
+        return
+    last = dict(
+        db.query(models.NoteRevision.note_id, func.max(models.NoteRevision.number))
+        .filter(models.NoteRevision.note_id.in_({c[0] for c in changes}))
+        .group_by(models.NoteRevision.note_id)
+    )
+    rows = []
+    for note_id, title, content, previous in changes:
+        number = last.get(note_id, 0)
+        previous_content = None
+        if previous is not None:
+            if number == 0:  # older than the history: keep the version being replaced
+                number = 1
+                rows.append(_row(note_id, number, previous[0], previous[1]))
+            previous_content = previous[1]
+        number += 1
+        last[note_id] = number
+        rows.append(_row(note_id, number, title, content, previous_content))
+    db.execute(insert(models.NoteRevision), rows)
+
+
+def remove_notes(db: Session, note_ids):
+    note_ids = list(note_ids)
+    if note_ids:
+        db.query(models.NoteRevision).filter(
+            models.NoteRevision.note_id.in_(note_ids)
+        ).delete(synchronize_session=False)
+
+
+# Reading
+
+def get_revisions(db: Session, note_id: int, before: int = None, limit: int = 50):
+    """Newest first, without bodies; page with before=<number of the last one seen>"""
+    q = db.query(
+        models.NoteRevision.number, models.NoteRevision.kind, models.NoteRevision.title,
+        models.NoteRevision.size, models.NoteRevision.created_at,
+    ).filter(models.NoteRevision.note_id == note_id)
+    if before is not None:
+        q = q.filter(models.NoteRevision.number < before)
+    return q.order_by(models.NoteRevision.number.desc()).limit(limit).all()
+
+
+def get_revision(db: Session, note_id: int, number: int):
+    """(revision, content) rebuilt from the nearest snapshot, or None"""
+    start = db.query(func.max(models.NoteRevision.number)).filter(
+        models.NoteRevision.note_id == note_id,
+        models.NoteRevision.kind == SNAPSHOT,
+        models.NoteRevision.number <= number,
+    ).scalar()
+    if start is None:
+        return None
+    chain = db.query(models.NoteRevision).filter(
+        models.NoteRevision.note_id == note_id,
+        models.NoteRevision.number.between(start, number),
+    ).order_by(models.NoteRevision.number).all()
+    if chain[-1].number != number:
+        return None
+    content = None
+    for revision in chain:
+        value = _unpack(revision.data)
+        content = value if revision.kind == SNAPSHOT else patch(content, value)
+    return chain[-1], content
@@ -1,14 +1,16 @@
-from pydantic import BaseModel, EmailStr, Field, validator
+from pydantic import BaseModel, ConfigDict, EmailStr, Field, ValidationInfo, field_validator
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 import re
+import app.tags as tags
 
 class UserCreate(BaseModel):
     username: str = Field(..., min_length=3, max_length=50)
     email: EmailStr
     password: str = Field(..., min_length=8)
 
-    @validator('password')
+    @field_validator('password')
+    @classmethod
     def validate_password(cls, v):
         if len(v) < 8:
             raise ValueError('Password must be at least 8 characters long')
@@ -34,7 +36,8 @@ class PasswordReset(BaseModel):
     password: str = Field(..., min_length=8)
     confirm_password: str
 
-    @validator('password')
+    @field_validator('password')
+    @classmethod
     def validate_password(cls, v):
         if len(v) < 8:
             raise ValueError('Password must be at least 8 characters long')
@@ -48,27 +51,87 @@ class PasswordReset(BaseModel):
             raise ValueError('Password must contain at least 1 special character')
         return v
 
-    @validator('confirm_password')
-    def passwords_match(cls, v, values):
-        if 'password' in values and v != values['password']:
+    @field_validator('confirm_password')
+    @classmethod
+    def passwords_match(cls, v, info: ValidationInfo):
+        if 'password' in info.data and v != info.data['password']:
             raise ValueError('Passwords do not match')
         return v
 
 class NoteBase(BaseModel):
     title: str = Field(..., min_length=1, max_length=200)
     content: str = Field(..., min_length=1)
+    tags: List[str] = []
+
+    @field_validator('tags')
+    @classmethod
+    def clean_tags(cls, v):
+        return tags.clean(v) if v is not None else v
 
 class NoteCreate(NoteBase):
     pass
 
 class NoteUpdate(NoteBase):
-    pass
+    # The version being edited; the save fails with a conflict if the note has moved on
+    version: Optional[int] = None
+    tags: Optional[List[str]] = None  # None keeps the note's tags
 
 class NoteOut(NoteBase):
     id: int
     created_at: datetime
     updated_at: datetime
     owner_id: int
+    version: int
+
+    model_config = ConfigDict(from_attributes=True)
+
+class RevisionOut(BaseModel):
+    number: int
+    kind: str
+    title: str
+    size: int
+    created_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+class RevisionDetail(RevisionOut):
+    content: str
+
+# JSON API schemas
+class NotePage(BaseModel):
+    items: List[NoteOut]
+    total: int
+    next_cursor: Optional[str] = None
+
+class NoteBulkCreate(BaseModel):
+    notes: List[NoteCreate]
+
+class NoteBulkUpdateItem(NoteUpdate):
+    id: int
+
+class NoteBulkUpdate(BaseModel):
+    notes: List[NoteBulkUpdateItem]
+
+class NoteBulkDelete(BaseModel):
+    ids: List[int]
+
+class SyncChange(BaseModel):
+    """A note as it is now, or a deleted one (deleted: true, id and seq only)"""
+    id: int
+    seq: int
+    deleted: Optional[bool] = None
+    version: Optional[int] = None
+    title: Optional[str] = None
+    content: Optional[str] = None
+    tags: Optional[List[str]] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+class SyncPage(BaseModel):
+    changes: List[SyncChange]
+    cursor: str
+    has_more: bool
 
-    class Config:
-        orm_mode = True
\ No newline at end of file
+class Token(BaseModel):
+    access_token: str
+    token_type: str = "bearer"
@@ -0,0 +1,265 @@
+import os
+import re
+from collections import Counter
+
+from sqlalchemy import func, inspect, text
+from sqlalchemy.orm import Session
+
+import app.models as models
+import app.storage as storage
+
+# Which backend serves note search: "auto" picks one from the database dialect (see backend_name)
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "auto")
+
+TITLE_WEIGHT = 3
+MAX_TERM_LENGTH = 64
+MAX_QUERY_TERMS = 8
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text_value: str):
+    """Split text into lowercase search terms"""
+    if not text_value:
+        return []
+    return [t[:MAX_TERM_LENGTH] for t in _TOKEN_RE.findall(text_value.lower()) if len(t) > 1]
+
+
+def query_terms(query: str):
+    """Distinct terms of a search query, in the order they were typed"""
+    terms = []
+    for term in tokenize(query):
+        if term not in terms:
+            terms.append(term)
+    return terms[:MAX_QUERY_TERMS]
+
+
+class SearchBackend:
+    """Interface every search backend implements"""
+    name = "base"
+
+    def ensure(self, db: Session):
+        """Create backend structures if missing and backfill them"""
+
+    def index_notes(self, db: Session, notes):
+        """Add or refresh notes in the index (runs inside the caller's transaction)"""
+
+    def remove_notes(self, db: Session, note_ids):
+        """Drop notes from the index (runs inside the caller's transaction)"""
+
+    def search(self, db: Session, query: str, owner_id: int = None, offset: int = 0, limit: int = 10):
+        """Return (total, note ids ranked best first)"""
+        raise NotImplementedError
+
+    def rebuild(self, db: Session, batch_size: int = 500):
+        """Re-index every note"""
+        last_id = 0
+        while True:
+            batch = (
+                db.query(models.Note)
+                .filter(models.Note.id > last_id)
+                .order_by(models.Note.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not batch:
+                break
+            self.index_notes(db, batch)
+            db.commit()
+            last_id = batch[-1].id
+
+
+class InvertedIndexBackend(SearchBackend):
+    """Portable term -> note postings kept in the note_terms table"""
+    name = "inverted"
+
+    def ensure(self, db: Session):
+        has_notes = db.query(models.Note.id).first() is not None
+        has_terms = db.query(models.NoteTerm.note_id).first() is not None
+        if has_notes and not has_terms:
+            self.rebuild(db)
+
+    def index_notes(self, db: Session, notes):
+        notes = list(notes)
+        if not notes:
+            return
+        self.remove_notes(db, [n.id for n in notes])
+        rows = []
+        for note in notes:
+            weights = Counter(tokenize(note.content))
+            for term in tokenize(note.title):
+                weights[term] += TITLE_WEIGHT
+            rows.extend(
+                {"term": term, "note_id": note.id, "owner_id": note.owner_id, "weight": weight}
+                for term, weight in weights.items()
+            )
+        if rows:
+            db.execute(models.NoteTerm.__table__.insert(), rows)
+
+    def remove_notes(self, db: Session, note_ids):
+        note_ids = list(note_ids)
+        if note_ids:
+            db.query(models.NoteTerm).filter(
+                models.NoteTerm.note_id.in_(note_ids)
+            ).delete(synchronize_session=False)
+
+    def search(self, db: Session, query: str, owner_id: int = None, offset: int = 0, limit: int = 10):
+        terms = query_terms(query)
+        if not terms:
+            return 0, []
+        score = func.sum(models.NoteTerm.weight).label("score")
+        q = db.query(models.NoteTerm.note_id, score).filter(models.NoteTerm.term.in_(terms))
+        if owner_id is not None:
+            q = q.filter(models.NoteTerm.owner_id == owner_id)
+        # Every term must match: one posting per (term, note) pair
+        q = q.group_by(models.NoteTerm.note_id).having(func.count() == len(terms))
+        total = db.query(func.count()).select_from(q.subquery()).scalar()
+        rows = q.order_by(score.desc(), models.NoteTerm.note_id.desc()).offset(offset).limit(limit).all()
+        return total, [row.note_id for row in rows]
+
+
+class SQLiteFTS5Backend(SearchBackend):
+    """SQLite FTS5 virtual table; used for local runs"""
+    name = "fts5"
+    table = "notes_fts"
+
+    def ensure(self, db: Session):
+        if inspect(db.get_bind()).has_table(self.table):
+            return
+        db.execute(text(
+            f"CREATE VIRTUAL TABLE {self.table} USING fts5(title, content, owner, tokenize='unicode61')"
+        ))
+        db.commit()
+        self.rebuild(db)
+
+    def index_notes(self, db: Session, notes):
+        notes = list(notes)
+        if not notes:
+            return
+        self.remove_notes(db, [n.id for n in notes])
+        db.execute(
+            text(f"INSERT INTO {self.table} (rowid, title, content, owner) VALUES (:id, :title, :content, :owner)"),
+            [{"id": n.id, "title": n.title, "content": n.content, "owner": f"u{n.owner_id}"} for n in notes],
+        )
+
+    def remove_notes(self, db: Session, note_ids):
+        note_ids = list(note_ids)
+        if note_ids:
+            db.execute(text(f"DELETE FROM {self.table} WHERE rowid = :id"), [{"id": i} for i in note_ids])
+
+    def search(self, db: Session, query: str, owner_id: int = None, offset: int = 0, limit: int = 10):
+        terms = query_terms(query)
+        if not terms:
+            return 0, []
+        # Quote every term so user input can never be parsed as FTS5 syntax
+        match = "{title content} : (%s)" % " ".join(f'"{t}"' for t in terms)
+        if owner_id is not None:
+            match = f'owner : "u{int(owner_id)}" AND {match}'
+        params = {"match": match, "limit": limit, "offset": offset}
+        total = db.execute(
+            text(f"SELECT COUNT(*) FROM {self.table} WHERE {self.table} MATCH :match"), params
+        ).scalar()
+        rows = db.execute(
+            text(
+                f"SELECT rowid FROM {self.table} WHERE {self.table} MATCH :match "
+                f"ORDER BY bm25({self.table}, 10.0, 1.0, 0.0), rowid DESC LIMIT :limit OFFSET :offset"
+            ),
+            params,
+        ).all()
+        return total, [row[0] for row in rows]
+
+
+class MySQLFullTextBackend(SearchBackend):
+    """InnoDB FULLTEXT index on notes(title, content); MySQL keeps it in sync itself.
+
+    Only sees bodies stored inline: compressed and blob bodies leave content empty.
+    """
+    name = "mysql"
+    index_name = "ft_notes_title_content"
+
+    def ensure(self, db: Session):
+        indexes = inspect(db.get_bind()).get_indexes("notes")
+        if any(ix["name"] == self.index_name for ix in indexes):
+            return
+        db.execute(text(f"ALTER TABLE notes ADD FULLTEXT INDEX {self.index_name} (title, content)"))
+        db.commit()
+
+    def search(self, db: Session, query: str, owner_id: int = None, offset: int = 0, limit: int = 10):
+        terms = query_terms(query)
+        if not terms:
+            return 0, []
+        boolean_query = " ".join(f"+{t}" for t in terms)
+        match = "MATCH (title, content) AGAINST (:q IN BOOLEAN MODE)"
+        where = match + (" AND owner_id = :owner_id" if owner_id is not None else "")
+        params = {"q": boolean_query, "owner_id": owner_id, "limit": limit, "offset": offset}
+        total = db.execute(text(f"SELECT COUNT(*) FROM notes WHERE {where}"), params).scalar()
+        rows = db.execute(
+            text(f"SELECT id FROM notes WHERE {where} ORDER BY {match} DESC, id DESC LIMIT :limit OFFSET :offset"),
+            params,
+        ).all()
+        return total, [row[0] for row in rows]
+
+
+BACKENDS = {
+    InvertedIndexBackend.name: InvertedIndexBackend,
+    SQLiteFTS5Backend.name: SQLiteFTS5Backend,
+    MySQLFullTextBackend.name: MySQLFullTextBackend,
+}
+
+_AUTO_BACKENDS = {"sqlite": "fts5", "mysql": "mysql", "mariadb": "mysql"}
+
+_backends = {}
+
+
+def backend_name(dialect: str) -> str:
+    """The backend SEARCH_BACKEND selects for dialect.
+
+    The MySQL FULLTEXT index reads notes.content, which is empty for
+    compressed and blob bodies: "auto" uses the inverted index instead while
+    CONTENT_COMPRESSION or CONTENT_BLOB_DIR is set, and an explicit "mysql"
+    refuses to start with them.
+    """
+    name = SEARCH_BACKEND
+    if name == "auto":
+        name = _AUTO_BACKENDS.get(dialect, InvertedIndexBackend.name)
+        if name == MySQLFullTextBackend.name and not storage.inline_only():
+            name = InvertedIndexBackend.name
+    elif name == MySQLFullTextBackend.name and not storage.inline_only():
+        raise RuntimeError("SEARCH_BACKEND=mysql cannot search compressed or blob-stored notes; "
+                           "use SEARCH_BACKEND=inverted or unset CONTENT_COMPRESSION and CONTENT_BLOB_DIR")
+    return name
+
+
+def get_backend(db: Session) -> SearchBackend:
+    """Backend for the database this session is bound to"""
+    dialect = db.get_bind().dialect.name
+    if dialect not in _backends:
+        _backends[dialect] = BACKENDS[backend_name(dialect)]()
+    return _backends[dialect]
+
+
+def ensure_index(db: Session):
+    get_backend(db).ensure(db)
+
+
+def index_notes(db: Session, notes):
+    get_backend(db).index_notes(db, notes)
+
+
+def remove_notes(db: Session, note_ids):
+    get_backend(db).remove_notes(db, note_ids)
+
+
+def search_notes(db: Session, query: str, owner_id: int = None, offset: int = 0, limit: int = 10):
+    return get_backend(db).search(db, query, owner_id=owner_id, offset=offset, limit=limit)
+
+
+if __name__ == "__main__":
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    backend = get_backend(db)
+    backend.ensure(db)
+    backend.rebuild(db)
+    print(f"✅ Search index rebuilt ({backend.name})")
+    db.close()
@@ -1,9 +1,9 @@
-from app.database import SessionLocal, engine, Base
-from app import models, crud, schemas
+from app.database import SessionLocal
+from app import models, crud, schemas, migrate
 import getpass
 
 def create_tables_and_admin():
-    Base.metadata.create_all(bind=engine)
+    migrate.upgrade()
     db = SessionLocal()
 
     username = input("Enter superadmin username: ")
@@ -0,0 +1,62 @@
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import time
+
+SESSION_COOKIE = "session"
+SESSION_MAX_AGE = int(os.getenv("SESSION_MAX_AGE", str(7 * 24 * 3600)))
+
+SECRET_KEY = os.getenv("SECRET_KEY")
+if not SECRET_KEY:
+    # Sessions will not survive a restart or work across several workers
+    SECRET_KEY = secrets.token_urlsafe(32)
+    print("⚠️ SECRET_KEY not set, using a random per-process key")
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _b64decode(value: str) -> bytes:
+    return base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+
+
+def _sign(payload: str) -> str:
+    return _b64encode(hmac.new(SECRET_KEY.encode(), payload.encode(), hashlib.sha256).digest())
+
+
+def password_fingerprint(password_hash: str) -> str:
+    """Short digest of the stored hash; changes whenever the password does"""
+    return hashlib.sha256(password_hash.encode()).hexdigest()[:16]
+
+
+def create_session_token(user) -> str:
+    """Signed token carrying the user's id, role and password fingerprint"""
+    claims = {
+        "uid": user.id,
+        "role": user.role,
+        "pwd": password_fingerprint(user.password),
+        "iat": int(time.time()),
+    }
+    payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode())
+    return f"{payload}.{_sign(payload)}"
+
+
+def read_session_token(token: str):
+    """Return the token's claims, or None if it is missing, forged or expired"""
+    if not token or "." not in token:
+        return None
+    payload, signature = token.rsplit(".", 1)
+    if not hmac.compare_digest(signature, _sign(payload)):
+        return None
+    try:
+        claims = json.loads(_b64decode(payload))
+    except (ValueError, binascii.Error):
+        return None
+    if time.time() - claims.get("iat", 0) > SESSION_MAX_AGE:
+        return None
+    return claims
@@ -0,0 +1,71 @@
+// Live note lists: patch the list from /notes/events (server-sent events, see app/events.py)
+(function () {
+  var list = document.querySelector("[data-live-events]");
+  var template = document.getElementById("live-note-template");
+  if (!list || !template || !window.EventSource) return;
+  var insertNew = list.dataset.liveInsert === "true";
+  var pageSize = parseInt(list.dataset.pageSize, 10) || 10;
+
+  function find(id) {
+    return list.querySelector('[data-note-id="' + id + '"]');
+  }
+
+  function fill(item, note) {
+    item.querySelectorAll("[data-note-href]").forEach(function (link) {
+      link.href = link.dataset.noteHref.replace("{id}", note.id).replace("{version}", note.version);
+    });
+    item.querySelector(".note-title").textContent = note.title;
+    var preview = item.querySelector(".note-preview");
+    preview.textContent = note.preview || "";
+    preview.hidden = !note.preview;
+    var tags = item.querySelector(".note-tags");
+    if (tags) {
+      tags.textContent = "";
+      (note.tags || []).forEach(function (tag) {
+        var link = document.createElement("a");
+        link.className = "tag";
+        link.href = "/notes/my?tags=" + encodeURIComponent(tag);
+        link.textContent = "#" + tag;
+        tags.append(link, " ");
+      });
+    }
+    var meta = item.querySelector(".note-meta");
+    if (meta && note.created_at && (note.owner_username || !meta.textContent)) {
+      meta.textContent = "by " + (note.owner_username || "user " + note.owner_id) + " • " +
+        note.created_at.slice(0, 16).replace("T", " ");
+    }
+  }
+
+  var events = new EventSource(list.dataset.liveEvents);
+
+  events.addEventListener("created", function (e) {
+    var note = JSON.parse(e.data);
+    if (!insertNew || find(note.id)) return;
+    var item = template.content.firstElementChild.cloneNode(true);
+    item.className = "note-item";
+    item.dataset.noteId = note.id;
+    fill(item, note);
+    var empty = list.querySelector(".note-empty");
+    if (empty) empty.remove();
+    list.insertBefore(item, list.firstChild);
+    var items = list.querySelectorAll("[data-note-id]");
+    if (items.length > pageSize) items[items.length - 1].remove();
+  });
+
+  events.addEventListener("updated", function (e) {
+    var note = JSON.parse(e.data);
+    var item = find(note.id);
+    if (item) fill(item, note);
+  });
+
+  events.addEventListener("deleted", function (e) {
+    var item = find(JSON.parse(e.data).id);
+    if (item) item.remove();
+  });
+
+  // Missed events that can't be replayed: start over from a fresh page
+  events.addEventListener("resync", function () {
+    events.close();
+    window.location.reload();
+  });
+})();
@@ -0,0 +1,216 @@
+"""Usage statistics for the superadmin dashboard, kept up to date by the writes.
+
+Nothing here aggregates notes when the dashboard is viewed. The crud write
+functions add their changes inside their own transaction:
+
+    counters  stats:day:<date>:<metric>:<shard>   notes created/updated/deleted per UTC day
+              stats:size:<bucket>:<shard>         notes per content size bucket
+              stats:bytes:<shard>                 content bytes of all notes
+              stats:users                         registered users
+    users     note_count, content_bytes           per user; indexed for the busiest users
+
+Every writer would otherwise update the same few rows and wait on each
+other's locks, so the busy counters are split into STATS_SHARDS rows by
+owner and summed when read. The dashboard reads a fixed number of rows,
+however many notes and users there are.
+
+The note total is counters.ALL_NOTES. Migration 0011 fills the rest in
+from the existing rows: users, sizes, per-user totals and daily creations;
+edits and deletes from before it are not known. `python -m app.stats`
+rebuilds the same from the tables to repair drift; run it while nothing
+writes, as writes during the rebuild can be counted twice.
+"""
+import bisect
+import os
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import bindparam, delete, func, select, update
+from sqlalchemy.orm import Session
+
+import app.counters as counters
+import app.models as models
+from app.database import use_primary
+
+STATS_SHARDS = int(os.getenv("STATS_SHARDS", "8"))
+STATS_DAYS = 14  # days of activity on the dashboard
+TOP_USERS = 10
+
+CREATED, UPDATED, DELETED = "created", "updated", "deleted"
+SIZE_BOUNDS = (1024, 10 * 1024, 100 * 1024, 1024 * 1024)
+SIZE_LABELS = ("under 1 KB", "1-10 KB", "10-100 KB", "100 KB-1 MB", "1 MB and over")
+USERS = "stats:users"
+
+Day = namedtuple("Day", ["date", "created", "updated", "deleted"])
+Stats = namedtuple("Stats", ["users", "notes", "content_bytes", "days", "sizes", "top_users"])
+
+
+def size_bucket(size: int) -> int:
+    return bisect.bisect_right(SIZE_BOUNDS, size)
+
+
+def _shard(owner_id: int) -> int:
+    return (owner_id or 0) % STATS_SHARDS
+
+
+def _day(day: date, metric: str, shard: int) -> str:
+    return f"stats:day:{day.isoformat()}:{metric}:{shard}"
+
+
+def _size(bucket: int, shard: int) -> str:
+    return f"stats:size:{bucket}:{shard}"
+
+
+def _bytes(shard: int) -> str:
+    return f"stats:bytes:{shard}"
+
+
+# Writing, inside the caller's transaction
+
+def _record(db: Session, owner_id: int, metric: str, n: int, removed_sizes=(), added_sizes=()):
+    shard = _shard(owner_id)
+    deltas = {_day(datetime.utcnow().date(), metric, shard): n} if n else {}
+    for size in removed_sizes:
+        name = _size(size_bucket(size), shard)
+        deltas[name] = deltas.get(name, 0) - 1
+    for size in added_sizes:
+        name = _size(size_bucket(size), shard)
+        deltas[name] = deltas.get(name, 0) + 1
+    added_bytes = sum(added_sizes) - sum(removed_sizes)
+    deltas[_bytes(shard)] = added_bytes
+    counters.add(db, deltas)
+    notes = len(added_sizes) - len(removed_sizes)
+    if notes or added_bytes:
+        db.execute(update(models.User).where(models.User.id == owner_id).values(
+            note_count=models.User.note_count + notes, content_bytes=models.User.content_bytes + added_bytes,
+        ))
+
+
+def notes_created(db: Session, owner_id: int, sizes):
+    """sizes: content size of each new note"""
+    sizes = list(sizes)
+    _record(db, owner_id, CREATED, len(sizes), added_sizes=sizes)
+
+
+def notes_updated(db: Session, owner_id: int, changes):
+    """changes: (old size, new size) per save"""
+    changes = list(changes)
+    _record(db, owner_id, UPDATED, len(changes),
+            removed_sizes=[old for old, _ in changes], added_sizes=[new for _, new in changes])
+
+
+def notes_deleted(db: Session, owner_id: int, sizes):
+    """sizes: content size of each deleted note"""
+    sizes = list(sizes)
+    _record(db, owner_id, DELETED, len(sizes), removed_sizes=sizes)
+
+
+def sizes_changed(db: Session, owner_id: int, changes):
+    """changes: (old size, new size) per note whose stored size was recomputed rather than edited"""
+    changes = list(changes)
+    _record(db, owner_id, UPDATED, 0,
+            removed_sizes=[old for old, _ in changes], added_sizes=[new for _, new in changes])
+
+
+def user_added(db: Session):
+    counters.add(db, {USERS: 1})
+
+
+def _stored_size():
+    """storage.size() in SQL"""
+    return func.coalesce(models.Note.content_size, func.length(models.Note.stored_content))
+
+
+def note_sizes(db: Session, note_ids) -> dict:
+    """note id -> content size, for notes about to be deleted"""
+    return dict(db.execute(
+        select(models.Note.id, _stored_size()).where(models.Note.id.in_(list(note_ids)))
+    ).all())
+
+
+# Reading
+
+def get_stats(db: Session, days: int = STATS_DAYS) -> Stats:
+    fixed = [USERS, counters.ALL_NOTES] + [_bytes(s) for s in range(STATS_SHARDS)]
+    fixed += [_size(b, s) for b in range(len(SIZE_LABELS)) for s in range(STATS_SHARDS)]
+    values = dict(db.execute(select(models.Counter.name, models.Counter.value)
+                             .where(models.Counter.name.in_(fixed))).all())
+
+    today = datetime.utcnow().date()
+    first = today - timedelta(days=days - 1)
+    by_day = {}
+    for name, value in db.execute(
+        select(models.Counter.name, models.Counter.value).where(
+            models.Counter.name >= f"stats:day:{first.isoformat()}",
+            models.Counter.name < f"stats:day:{(today + timedelta(days=1)).isoformat()}",
+        )
+    ):
+        _, _, day, metric, _ = name.split(":")
+        by_day.setdefault(day, {}).setdefault(metric, 0)
+        by_day[day][metric] += value
+    activity = []
+    for i in range(days):
+        day = today - timedelta(days=i)
+        found = by_day.get(day.isoformat(), {})
+        activity.append(Day(day, found.get(CREATED, 0), found.get(UPDATED, 0), found.get(DELETED, 0)))
+
+    sizes = [(label, sum(values.get(_size(b, s), 0) for s in range(STATS_SHARDS)))
+             for b, label in enumerate(SIZE_LABELS)]
+    top_users = db.execute(
+        select(models.User.username, models.User.note_count, models.User.content_bytes)
+        .order_by(models.User.note_count.desc(), models.User.id.desc()).limit(TOP_USERS)
+    ).all()
+    return Stats(
+        users=values.get(USERS, 0),
+        notes=values.get(counters.ALL_NOTES, 0),
+        content_bytes=sum(values.get(_bytes(s), 0) for s in range(STATS_SHARDS)),
+        days=activity, sizes=sizes, top_users=top_users,
+    )
+
+
+# Maintenance
+
+def recount(db: Session, batch_size: int = 1000):
+    """Rebuild users, sizes, per-user totals and daily creations from the tables; commits"""
+    use_primary(db)
+    Note, User = models.Note, models.User
+    db.execute(delete(models.Counter).where(
+        models.Counter.name.like("stats:size:%") | models.Counter.name.like("stats:bytes:%")
+        | models.Counter.name.like("stats:day:%:created:%") | (models.Counter.name == USERS)
+    ))
+    deltas = {USERS: db.scalar(select(func.count()).select_from(User)) or 0}
+    per_user = {user_id: [0, 0] for user_id in db.scalars(select(User.id))}
+    last_id = 0
+    while True:
+        rows = db.execute(
+            select(Note.id, Note.owner_id, Note.created_at, _stored_size())
+            .where(Note.id > last_id).order_by(Note.id).limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        for _, owner_id, created_at, size in rows:
+            shard = _shard(owner_id or 0)
+            for name, delta in ((_size(size_bucket(size), shard), 1), (_bytes(shard), size),
+                                (_day((created_at or datetime.utcnow()).date(), CREATED, shard), 1)):
+                deltas[name] = deltas.get(name, 0) + delta
+            if owner_id in per_user:
+                per_user[owner_id][0] += 1
+                per_user[owner_id][1] += size
+        last_id = rows[-1].id
+    counters.add(db, deltas)
+    if per_user:
+        table = User.__table__
+        db.execute(table.update().where(table.c.id == bindparam("user")).values(
+            note_count=bindparam("notes"), content_bytes=bindparam("size"),
+        ), [{"user": user_id, "notes": notes, "size": size} for user_id, (notes, size) in per_user.items()])
+    db.commit()
+
+
+if __name__ == "__main__":
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    recount(db)
+    stats = get_stats(db)
+    print(f"✅ Statistics rebuilt ({stats.users} users, {stats.notes} notes)")
+    db.close()
@@ -0,0 +1,236 @@
+"""Where note bodies live: inline, compressed in the row, or in a blob store on disk.
+
+Note.content is a property over these columns (see models.Note):
+
+    content_encoding  NULL                  text in the content column
+                      "zlib" / "zstd"       compressed UTF-8 in content_data
+                      "blob", "blob+zlib"…  a file in CONTENT_BLOB_DIR named by content_ref
+    content_ref       SHA-256 of the UTF-8 body; identical bodies share one blob
+    content_size      body size in UTF-8 bytes
+
+New bodies of CONTENT_COMPRESS_MIN_BYTES or more are compressed with
+CONTENT_COMPRESSION. With CONTENT_BLOB_DIR set, bodies of CONTENT_BLOB_MIN_BYTES
+or more go to the blob store instead. Every encoding stays readable whatever
+the current settings are.
+
+    python -m app.storage rewrite   # re-encode existing notes with the current settings
+                                    # (keeps the search index and usage statistics in step)
+    python -m app.storage gc        # delete blobs no note refers to any more
+"""
+import codecs
+import hashlib
+import os
+import sys
+import tempfile
+import time
+import zlib
+
+CONTENT_COMPRESSION = os.getenv("CONTENT_COMPRESSION", "none")  # none, zlib or zstd
+CONTENT_COMPRESS_MIN_BYTES = int(os.getenv("CONTENT_COMPRESS_MIN_BYTES", "16384"))
+CONTENT_BLOB_DIR = os.getenv("CONTENT_BLOB_DIR")  # unset = no blob store
+CONTENT_BLOB_MIN_BYTES = int(os.getenv("CONTENT_BLOB_MIN_BYTES", str(1024 * 1024)))
+# Note pages with bodies this large are streamed and not kept in the page cache
+NOTE_STREAM_MIN_BYTES = int(os.getenv("NOTE_STREAM_MIN_BYTES", str(256 * 1024)))
+
+CHUNK_SIZE = 64 * 1024  # characters per streamed chunk
+READ_SIZE = 16 * 1024   # compressed bytes fed to the decompressor at a time
+GC_GRACE_SECONDS = 3600  # younger blobs may belong to a transaction that hasn't committed yet
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError("zstd note compression needs the 'zstandard' package") from None
+    return zstandard
+
+
+# name -> (compress(bytes) -> bytes, new streaming decompressor)
+CODECS = {
+    "zlib": (lambda data: zlib.compress(data, 6), zlib.decompressobj),
+    "zstd": (lambda data: _zstd().ZstdCompressor(level=3).compress(data),
+             lambda: _zstd().ZstdDecompressor().decompressobj()),
+}
+
+if CONTENT_COMPRESSION != "none":
+    if CONTENT_COMPRESSION not in CODECS:
+        raise ValueError(f"CONTENT_COMPRESSION must be none, {' or '.join(CODECS)}")
+    if CONTENT_COMPRESSION == "zstd":
+        _zstd()  # fail at startup, not on the first large note
+
+
+# Writing
+
+def blob_path(ref: str, codec: str = None) -> str:
+    name = f"{ref}.{codec}" if codec else ref
+    return os.path.join(CONTENT_BLOB_DIR, ref[:2], name)
+
+
+def _write_blob(ref: str, codec: str, data: bytes):
+    path = blob_path(ref, codec)
+    if os.path.exists(path):
+        return  # same body stored before
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(CODECS[codec][0](data) if codec else data)
+    os.replace(tmp, path)  # readers never see a partial file
+
+
+def columns(content: str) -> dict:
+    """Column values (by Note attribute name) that store `content` under the current settings"""
+    data = content.encode("utf-8")
+    size = len(data)
+    row = {"stored_content": content, "content_data": None, "content_encoding": None,
+           "content_ref": None, "content_size": size}
+    codec = CONTENT_COMPRESSION if CONTENT_COMPRESSION != "none" and size >= CONTENT_COMPRESS_MIN_BYTES else None
+    if CONTENT_BLOB_DIR and size >= CONTENT_BLOB_MIN_BYTES:
+        ref = hashlib.sha256(data).hexdigest()
+        _write_blob(ref, codec, data)
+        return {**row, "stored_content": "", "content_encoding": f"blob+{codec}" if codec else "blob",
+                "content_ref": ref}
+    if codec:
+        return {**row, "stored_content": "", "content_data": CODECS[codec][0](data), "content_encoding": codec}
+    return row
+
+
+def inline_only() -> bool:
+    """Whether every new body is stored as plain text in the content column"""
+    return CONTENT_COMPRESSION == "none" and not CONTENT_BLOB_DIR
+
+
+# Reading
+
+def _codec(encoding: str):
+    """Compression of a stored body: "blob+zlib" -> "zlib", "zstd" -> "zstd", "blob" -> None"""
+    if encoding.startswith("blob"):
+        return encoding.partition("+")[2] or None
+    return encoding
+
+
+def _raw_chunks(note):
+    """The stored bytes, still compressed, READ_SIZE at a time"""
+    if note.content_encoding.startswith("blob"):
+        with open(blob_path(note.content_ref, _codec(note.content_encoding)), "rb") as f:
+            while True:
+                chunk = f.read(READ_SIZE)
+                if not chunk:
+                    return
+                yield chunk
+    else:
+        data = memoryview(note.content_data)
+        for start in range(0, len(data), READ_SIZE):
+            yield data[start:start + READ_SIZE]
+
+
+def _byte_chunks(note):
+    codec = _codec(note.content_encoding)
+    if not codec:
+        yield from _raw_chunks(note)
+        return
+    decompressor = CODECS[codec][1]()
+    for chunk in _raw_chunks(note):
+        out = decompressor.decompress(chunk)
+        if out:
+            yield out
+    tail = decompressor.flush()
+    if tail:
+        yield tail
+
+
+def iter_chunks(note, chunk_size: int = CHUNK_SIZE):
+    """The body as text chunks, without holding the whole decoded body in memory"""
+    if not note.content_encoding:
+        text = note.stored_content
+        for start in range(0, len(text), chunk_size):
+            yield text[start:start + chunk_size]
+        return
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    for data in _byte_chunks(note):
+        text = decoder.decode(data)
+        for start in range(0, len(text), chunk_size):
+            yield text[start:start + chunk_size]
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+def read(note) -> str:
+    if not note.content_encoding:
+        return note.stored_content
+    return "".join(iter_chunks(note))
+
+
+def size(note) -> int:
+    """Body size in bytes (characters for rows written before content_size existed)"""
+    return note.content_size if note.content_size is not None else len(note.stored_content)
+
+
+# Maintenance
+
+def rewrite(db, batch_size: int = 200) -> int:
+    """Re-encode every note whose storage differs from what the current settings give.
+
+    Rows written before content_size existed counted characters; their new
+    byte sizes go to the usage statistics, and rewritten notes are re-indexed.
+    """
+    from app import models, search_index, stats
+
+    changed = 0
+    last_id = 0
+    while True:
+        notes = db.query(models.Note).filter(models.Note.id > last_id).order_by(models.Note.id).limit(batch_size).all()
+        if not notes:
+            return changed
+        rewritten, resized = [], {}
+        for note in notes:
+            row = columns(note.content)
+            if row["content_encoding"] != note.content_encoding or note.content_size is None:
+                old_size = size(note)
+                for key, value in row.items():
+                    setattr(note, key, value)
+                rewritten.append(note)
+                if row["content_size"] != old_size:
+                    resized.setdefault(note.owner_id, []).append((old_size, row["content_size"]))
+        search_index.index_notes(db, rewritten)
+        for owner_id, changes in resized.items():
+            stats.sizes_changed(db, owner_id, changes)
+        changed += len(rewritten)
+        db.commit()
+        last_id = notes[-1].id
+        db.expunge_all()
+
+
+def collect_garbage(db) -> int:
+    """Delete blob files that no note refers to; returns how many were removed"""
+    from app import models
+
+    if not CONTENT_BLOB_DIR or not os.path.isdir(CONTENT_BLOB_DIR):
+        return 0
+    referenced = {ref for (ref,) in db.query(models.Note.content_ref).filter(models.Note.content_ref.isnot(None))}
+    cutoff = time.time() - GC_GRACE_SECONDS
+    removed = 0
+    for directory, _, files in os.walk(CONTENT_BLOB_DIR):
+        for name in files:
+            path = os.path.join(directory, name)
+            if name.split(".")[0] not in referenced and os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+    return removed
+
+
+if __name__ == "__main__":
+    from app.database import SessionLocal
+
+    commands = {
+        "rewrite": (rewrite, "Re-encoded {} note bodies"),
+        "gc": (collect_garbage, "Deleted {} unreferenced blobs"),
+    }
+    if len(sys.argv) != 2 or sys.argv[1] not in commands:
+        sys.exit(f"usage: python -m app.storage {{{','.join(commands)}}}")
+    command, message = commands[sys.argv[1]]
+    db = SessionLocal()
+    try:
+        print("✅ " + message.format(command(db)))
+    finally:
+        db.close()
@@ -0,0 +1,81 @@
+"""Background deletion of expired and used password reset tokens, and of old sync tombstones.
+
+A daemon thread calls crud.purge_reset_tokens every TOKEN_SWEEP_INTERVAL
+seconds. Each run deletes in chunks of TOKEN_SWEEP_BATCH rows, one short
+transaction per chunk, so it never holds locks on a large range. Sync
+tombstones older than SYNC_TOMBSTONE_DAYS go the same way (see app.sync).
+Every worker runs its own sweeper; the deletes are idempotent, so they
+don't conflict.
+"""
+import os
+import random
+import threading
+
+from app import crud
+from app.database import SessionLocal
+
+TOKEN_SWEEP_INTERVAL = float(os.getenv("TOKEN_SWEEP_INTERVAL", "300"))  # 0 = off
+TOKEN_SWEEP_BATCH = int(os.getenv("TOKEN_SWEEP_BATCH", "1000"))
+
+
+class Sweeper:
+    def __init__(self, interval: float = TOKEN_SWEEP_INTERVAL, batch_size: int = TOKEN_SWEEP_BATCH):
+        self.interval = interval
+        self.batch_size = batch_size
+        self._stopping = threading.Event()
+        self._thread = None
+        self.stats = {"runs": 0, "deleted": 0, "tombstones": 0, "errors": 0}
+
+    def start(self):
+        if self._thread or self.interval <= 0:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="token-sweeper", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stopping.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def sweep(self) -> tuple:
+        """One run; returns (reset tokens deleted, sync tombstones deleted)"""
+        db = SessionLocal()
+        try:
+            deleted = crud.purge_reset_tokens(db, self.batch_size)
+            tombstones = crud.purge_tombstones(db, self.batch_size)
+        finally:
+            db.close()
+        self.stats["runs"] += 1
+        self.stats["deleted"] += deleted
+        self.stats["tombstones"] += tombstones
+        return deleted, tombstones
+
+    def _run(self):
+        # Jitter so the workers of one deployment don't all sweep at the same moment
+        while not self._stopping.wait(self.interval * random.uniform(0.8, 1.2)):
+            try:
+                deleted, tombstones = self.sweep()
+                if deleted:
+                    print(f"🧹 Purged {deleted} expired reset tokens")
+                if tombstones:
+                    print(f"🧹 Purged {tombstones} sync tombstones")
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"❌ Token sweep failed: {e}")
+
+
+_sweeper = None
+
+
+def start():
+    global _sweeper
+    if _sweeper is None:
+        _sweeper = Sweeper()
+    _sweeper.start()
+
+
+def stop():
+    if _sweeper is not None:
+        _sweeper.stop()
@@ -0,0 +1,170 @@
+"""Change feed for clients that mirror their notes (GET /api/v1/sync).
+
+Every note write takes the next number of its owner's change sequence (a
+row in the counters table) and stores it in notes.change_seq. Deletes leave a
+NoteTombstone carrying their own number. A client asks for the changes after
+its cursor and gets the notes and tombstones past it, in sequence order,
+through the (owner_id, change_seq) indexes. Notes saved before the sequence
+existed have change_seq 0 and only come with a first sync.
+
+Taking a number updates the owner's counter row, which stays locked until
+the write commits. One owner's writes therefore commit in sequence order, and
+a reader can never see number N+1 while N is still to come. Writers take
+the number before touching anything else, so they all lock in one order.
+
+Tombstones are purged after SYNC_TOMBSTONE_DAYS by the background sweeper.
+The highest purged number per owner is kept, and a cursor from before it
+gets 410 Gone: the client has to start over.
+
+A cursor is (seq, id, base): the last change returned, and the sequence
+value when the client's first sync began. A first sync pages through every
+note, but deletes made before it started don't concern it, so tombstones
+are only read past max(seq, base).
+"""
+import base64
+import binascii
+import os
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, delete, or_, select, update
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.orm import Session
+
+import app.models as models
+
+SYNC_TOMBSTONE_DAYS = float(os.getenv("SYNC_TOMBSTONE_DAYS", "30"))
+
+Cursor = namedtuple("Cursor", ["seq", "id", "base"])
+# A batch of changes: notes and tombstones in sequence order
+Changes = namedtuple("Changes", ["items", "cursor", "has_more"])
+
+
+class CursorExpired(Exception):
+    """Deletes the cursor's client has not seen were purged; it must sync from the start"""
+
+
+def _sequence(owner_id: int) -> str:
+    return f"sync:user:{owner_id}"
+
+
+def _horizon(owner_id: int) -> str:
+    return f"sync:purged:{owner_id}"
+
+
+def _upsert(db: Session, name: str, value: int, add: bool):
+    """Create the counter at value, or add value to it (add) / set it to value (not add)"""
+    table = models.Counter.__table__
+    new_value = table.c.value + value if add else value
+    dialect = db.get_bind().dialect.name
+    if dialect in ("mysql", "mariadb"):
+        db.execute(mysql.insert(table).values(name=name, value=value).on_duplicate_key_update(value=new_value))
+    elif dialect in ("sqlite", "postgresql"):
+        insert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+        db.execute(insert(table).values(name=name, value=value)
+                   .on_conflict_do_update(index_elements=["name"], set_={"value": new_value}))
+    elif db.execute(update(table).where(table.c.name == name).values(value=new_value)).rowcount == 0:
+        db.execute(table.insert().values(name=name, value=value))
+
+
+def _value(db: Session, name: str) -> int:
+    return db.scalar(select(models.Counter.value).where(models.Counter.name == name)) or 0
+
+
+def last_change(connection, owner_id: int) -> int:
+    """owner_id's latest change number, read on connection (app.tags checks its cache against it)"""
+    return connection.execute(
+        select(models.Counter.value).where(models.Counter.name == _sequence(owner_id))
+    ).scalar() or 0
+
+
+def allocate(db: Session, owner_id: int, n: int = 1) -> int:
+    """Take the next n change numbers of owner_id inside the caller's transaction; returns the first"""
+    _upsert(db, _sequence(owner_id), n, add=True)
+    return _value(db, _sequence(owner_id)) - n + 1
+
+
+def add_tombstones(db: Session, owner_id: int, note_ids) -> int:
+    """Tombstones for notes being deleted, numbered in order; returns the first number"""
+    note_ids = list(note_ids)
+    if not note_ids:
+        return None
+    first = allocate(db, owner_id, len(note_ids))
+    now = datetime.utcnow()
+    db.execute(models.NoteTombstone.__table__.insert(), [
+        {"note_id": note_id, "owner_id": owner_id, "change_seq": first + i, "deleted_at": now}
+        for i, note_id in enumerate(note_ids)
+    ])
+    return first
+
+
+# Reading
+
+def encode_cursor(cursor: Cursor) -> str:
+    raw = f"{cursor.seq}|{cursor.id}|{cursor.base}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str):
+    """The Cursor, or None for a malformed token"""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode()
+        return Cursor(*(int(part) for part in raw.split("|")))
+    except (ValueError, TypeError, binascii.Error, UnicodeDecodeError):
+        return None
+
+
+def get_changes(db: Session, owner_id: int, cursor: Cursor = None, limit: int = 100) -> Changes:
+    """owner_id's notes and tombstones changed after cursor (None: a first sync), oldest change first.
+
+    Raises CursorExpired when tombstones the cursor still needs were purged.
+    """
+    if cursor is None:
+        cursor = Cursor(-1, 0, _value(db, _sequence(owner_id)))
+    Note, Tombstone = models.Note, models.NoteTombstone
+    notes = db.query(Note).filter(
+        Note.owner_id == owner_id,
+        Note.change_seq >= cursor.seq,  # the index range; the OR alone would make it scan from the start
+        or_(Note.change_seq > cursor.seq, and_(Note.change_seq == cursor.seq, Note.id > cursor.id)),
+    ).order_by(Note.change_seq, Note.id).limit(limit + 1).all()
+    floor = max(cursor.seq, cursor.base)
+    tombstones = db.query(Tombstone).filter(
+        Tombstone.owner_id == owner_id, Tombstone.change_seq > floor,
+    ).order_by(Tombstone.change_seq).limit(limit + 1).all()
+    # Read after the tombstones: a purge that removed some of them has committed its horizon too
+    if _value(db, _horizon(owner_id)) > floor:
+        raise CursorExpired()
+
+    merged = sorted(notes + tombstones, key=lambda item: (item.change_seq, getattr(item, "note_id", item.id)))
+    items = merged[:limit]
+    if items:
+        last = items[-1]
+        cursor = Cursor(last.change_seq, getattr(last, "note_id", last.id), cursor.base)
+    return Changes(items, cursor, len(merged) > limit)
+
+
+# Purging
+
+def purge_tombstones(db: Session, batch_size: int = 1000, older_than: datetime = None) -> int:
+    """Delete tombstones older than SYNC_TOMBSTONE_DAYS in chunks, committing each; returns the count"""
+    Tombstone = models.NoteTombstone
+    if older_than is None:
+        older_than = datetime.utcnow() - timedelta(days=SYNC_TOMBSTONE_DAYS)
+    deleted = 0
+    while True:
+        rows = db.execute(
+            select(Tombstone.id, Tombstone.owner_id, Tombstone.change_seq)
+            .where(Tombstone.deleted_at < older_than).limit(batch_size)
+        ).all()
+        if not rows:
+            return deleted
+        horizons = {}
+        for _, owner_id, seq in rows:
+            horizons[owner_id] = max(horizons.get(owner_id, 0), seq)
+        for owner_id, seq in horizons.items():
+            _upsert(db, _horizon(owner_id), max(seq, _value(db, _horizon(owner_id))), add=False)
+        db.execute(delete(Tombstone).where(Tombstone.id.in_([row.id for row in rows])))
+        db.commit()
+        deleted += len(rows)
+        if len(rows) < batch_size:
+            return deleted
@@ -0,0 +1,56 @@
+"""The Jinja2 environment for app/templates, with a persistent bytecode cache.
+
+Jinja compiles each template to Python the first time it is rendered. With a
+bytecode cache the compiled code is written to TEMPLATE_CACHE_DIR and reused
+by every later worker, so a fresh worker loads marshalled code instead of
+parsing and compiling each template on its first request. Entries are keyed
+by the template source, so an edited template is never served stale.
+
+    python -m app.templating    # compile every template into the cache (e.g. at deploy)
+"""
+import os
+
+import jinja2
+
+from app import assets
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), "templates")
+# Unset: a per-user directory under the system temp dir; "none" turns the cache off
+TEMPLATE_CACHE_DIR = os.getenv("TEMPLATE_CACHE_DIR")
+# Re-check template files for changes on every render; turn off in production
+TEMPLATE_AUTO_RELOAD = os.getenv("TEMPLATE_AUTO_RELOAD", "true").lower() in ("1", "true", "yes")
+
+
+def bytecode_cache():
+    if TEMPLATE_CACHE_DIR and TEMPLATE_CACHE_DIR.lower() == "none":
+        return None
+    if TEMPLATE_CACHE_DIR:
+        os.makedirs(TEMPLATE_CACHE_DIR, exist_ok=True)
+    return jinja2.FileSystemBytecodeCache(TEMPLATE_CACHE_DIR)
+
+
+def environment() -> jinja2.Environment:
+    env = jinja2.Environment(
+        loader=jinja2.FileSystemLoader(TEMPLATE_DIR),
+        autoescape=True,
+        auto_reload=TEMPLATE_AUTO_RELOAD,
+        bytecode_cache=bytecode_cache(),
+    )
+    env.globals["static_url"] = assets.static_url
+    return env
+
+
+def compile_all(env: jinja2.Environment = None) -> int:
+    """Load every template once, which fills the bytecode cache; returns how many there are"""
+    env = env or environment()
+    names = env.list_templates(extensions=["html"])
+    for name in names:
+        env.get_template(name)
+    return len(names)
+
+
+if __name__ == "__main__":
+    env = environment()
+    count = compile_all(env)
+    where = env.bytecode_cache.directory if env.bytecode_cache else "memory only (TEMPLATE_CACHE_DIR=none)"
+    print(f"✅ Compiled {count} templates into {where}")
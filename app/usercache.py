@@ -0,0 +1,59 @@
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from app.sessions import password_fingerprint
+
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+
+# Detached, read-only view of a user: what routes and templates need for the current user
+CurrentUser = namedtuple("CurrentUser", ["id", "username", "email", "role", "password_fingerprint"])
+
+_lock = threading.Lock()
+_entries = OrderedDict()  # user id -> (expires_at, CurrentUser)
+
+
+def snapshot(user) -> CurrentUser:
+    return CurrentUser(user.id, user.username, user.email, user.role, password_fingerprint(user.password))
+
+
+def get(user_id: int):
+    """Cached user, or None when missing or expired"""
+    with _lock:
+        entry = _entries.get(user_id)
+        if entry is None:
+            return None
+        expires_at, user = entry
+        if expires_at < time.monotonic():
+            del _entries[user_id]
+            return None
+        _entries.move_to_end(user_id)
+        return user
+
+
+def put(user) -> CurrentUser:
+    """Cache an ORM user (or snapshot) and return the snapshot"""
+    if not isinstance(user, CurrentUser):
+        user = snapshot(user)
+    with _lock:
+        _entries[user.id] = (time.monotonic() + USER_CACHE_TTL, user)
+        _entries.move_to_end(user.id)
+        while len(_entries) > USER_CACHE_SIZE:
+            _entries.popitem(last=False)
+    return user
+
+
+def invalidate(user_id: int):
+    """Drop a user after a password or role change.
+
+    Only this process's cache is cleared; other workers catch up within USER_CACHE_TTL.
+    """
+    with _lock:
+        _entries.pop(user_id, None)
+
+
+def clear():
+    with _lock:
+        _entries.clear()
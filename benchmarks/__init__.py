@@ -0,0 +1,9 @@
+"""Benchmark and load-test suite.
+
+    python -m benchmarks.run --users 20 --notes-per-user 500
+    python -m benchmarks.compare benchmarks/results/old.json benchmarks/results/new.json
+
+See benchmarks/run.py for every option. The app modules read their settings
+at import time, so everything under benchmarks/ imports app lazily, after
+run.py has pointed DATABASE_URL at the benchmark database.
+"""
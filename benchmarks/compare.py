@@ -0,0 +1,52 @@
+"""Compare two benchmark result files and flag regressions.
+
+    python -m benchmarks.compare OLD.json NEW.json [--metric p95_ms] [--threshold 0.15]
+
+Exits with status 1 when any benchmark got slower than the threshold, or
+issues more queries per call than before, so it can gate CI.
+"""
+import argparse
+import json
+import sys
+
+
+def load(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(old: dict, new: dict, metric: str = "p95_ms", threshold: float = 0.15):
+    """Yield (section, name, old value, new value, change, regressed)"""
+    for section in ("crud", "routes", "startup"):
+        for name, new_stats in new.get(section, {}).items():
+            old_stats = old.get(section, {}).get(name)
+            if not old_stats:
+                continue
+            before, after = old_stats[metric], new_stats[metric]
+            change = (after - before) / before if before else 0.0
+            more_queries = new_stats.get("queries_per_call", 0) > old_stats.get("queries_per_call", 0)
+            yield section, name, before, after, change, change > threshold or more_queries
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--metric", default="p95_ms")
+    parser.add_argument("--threshold", type=float, default=0.15, help="relative slowdown counted as a regression")
+    args = parser.parse_args(argv)
+
+    old, new = load(args.old), load(args.new)
+    print(f"{old['meta']['commit']} -> {new['meta']['commit']} ({args.metric})")
+    regressions = 0
+    for section, name, before, after, change, regressed in compare(old, new, args.metric, args.threshold):
+        flag = "❌" if regressed else "  "
+        print(f"{flag} {section:<6} {name:<38} {before:>10.3f} {after:>10.3f} {change:>+8.1%}")
+        regressions += regressed
+    if regressions:
+        print(f"{regressions} regression(s)")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
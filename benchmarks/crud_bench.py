@@ -0,0 +1,176 @@
+"""Microbenchmarks for every function in app/crud.py.
+
+Each iteration gets a fresh session. Setup work (e.g. creating the note a
+delete benchmark removes) runs and commits on it first and is excluded from
+the timings. The page cache is cleared before every call.
+"""
+import itertools
+import random
+import time
+import tracemalloc
+from collections import namedtuple
+
+from app import auth, crud, models, pagecache, schemas, tags
+from app.database import SessionLocal
+from app.querycount import QueryCounter
+
+from benchmarks import seed
+from benchmarks.stats import summarize
+
+# setup(db, ctx) -> args for call; call(db, *args)
+Case = namedtuple("Case", ["name", "call", "setup", "repeat"])
+
+_seq = itertools.count()
+
+
+def _note_in(i=None):
+    i = next(_seq) if i is None else i
+    return schemas.NoteCreate(title=f"bench note {i}", content=f"benchmark body {i} {seed.COMMON_TERM}")
+
+
+def _user_in():
+    i = next(_seq)
+    return schemas.UserCreate(username=f"new{i}", email=f"new{i}@example.com", password=seed.PASSWORD)
+
+
+def _own_note(db, ctx):
+    return crud.create_note(db, _note_in(), ctx["user_id"])
+
+
+def _fresh_token(db, ctx):
+    return (crud.create_password_reset_token(db, ctx["email"]).token,)
+
+
+def _rehash_args(db, ctx):
+    # Swap between two hashes of the same password so every call really writes
+    user = db.get(models.User, ctx["user_id"])
+    return user, next(h for h in ctx["hashes"] if h != user.password)
+
+
+def _cursor(db, ctx):
+    _, page = crud.get_notes_by_user(db, ctx["user_id"])
+    return page.next_cursor
+
+
+def cases(bcrypt_repeat: int):
+    return [
+        Case("get_user_by_email", lambda db, email: crud.get_user_by_email(db, email),
+             lambda db, ctx: (ctx["email"],), None),
+        Case("create_user", lambda db, user_in, pw: crud.create_user(db, user_in, hashed_password=pw),
+             lambda db, ctx: (_user_in(), ctx["password_hash"]), None),
+        Case("set_user_role", lambda db, uid: crud.set_user_role(db, uid, "user"),
+             lambda db, ctx: (ctx["user_id"],), None),
+        Case("update_password_hash", lambda db, user, pw: crud.update_password_hash(db, user, pw),
+             _rehash_args, None),
+        Case("authenticate_user", lambda db, email: crud.authenticate_user(db, email, seed.PASSWORD),
+             lambda db, ctx: (ctx["email"],), bcrypt_repeat),
+        Case("create_note", lambda db, note_in, uid: crud.create_note(db, note_in, uid),
+             lambda db, ctx: (_note_in(), ctx["user_id"]), None),
+        Case("get_note", lambda db, nid: crud.get_note(db, nid),
+             lambda db, ctx: (random.choice(ctx["note_ids"]),), None),
+        Case("update_note", lambda db, nid, data: crud.update_note(db, nid, data),
+             lambda db, ctx: (_own_note(db, ctx).id, schemas.NoteUpdate(title="edited", content="edited body")), None),
+        Case("delete_note", lambda db, nid, uid: crud.delete_note(db, nid, uid),
+             lambda db, ctx: (_own_note(db, ctx).id, ctx["user_id"]), None),
+        Case("create_notes[100]", lambda db, notes, uid: crud.create_notes(db, notes, uid),
+             lambda db, ctx: ([_note_in() for _ in range(100)], ctx["user_id"]), None),
+        Case("update_notes[100]", lambda db, updates, uid: crud.update_notes(db, updates, uid),
+             lambda db, ctx: ([schemas.NoteBulkUpdateItem(id=n.id, title="bulk", content="bulk edit")
+                               for n in crud.create_notes(db, [_note_in() for _ in range(100)], ctx["user_id"])],
+                              ctx["user_id"]), None),
+        Case("delete_notes[100]", lambda db, ids, uid: crud.delete_notes(db, ids, uid),
+             lambda db, ctx: ([n.id for n in crud.create_notes(db, [_note_in() for _ in range(100)], ctx["user_id"])],
+                              ctx["user_id"]), None),
+        Case("get_notes_after", lambda db, uid: crud.get_notes_after(db, uid, 0, 1000),
+             lambda db, ctx: (ctx["user_id"],), None),
+        Case("get_notes_by_ids[10]", lambda db, ids: crud.get_notes_by_ids(db, ids),
+             lambda db, ctx: (random.sample(ctx["note_ids"], min(10, len(ctx["note_ids"]))),), None),
+        Case("get_note_summaries_by_ids[10]", lambda db, ids: crud.get_note_summaries_by_ids(db, ids),
+             lambda db, ctx: (random.sample(ctx["note_ids"], min(10, len(ctx["note_ids"]))),), None),
+        Case("search_notes", lambda db, uid: crud.search_notes(db, seed.COMMON_TERM, user_id=uid),
+             lambda db, ctx: (ctx["user_id"],), None),
+        Case("get_notes_by_user", lambda db, uid: crud.get_notes_by_user(db, uid),
+             lambda db, ctx: (ctx["user_id"],), None),
+        Case("get_notes_by_user[full]", lambda db, uid: crud.get_notes_by_user(db, uid, summary=False),
+             lambda db, ctx: (ctx["user_id"],), None),
+        Case("get_notes_by_user[cursor]", lambda db, uid, cursor: crud.get_notes_by_user(db, uid, cursor=cursor),
+             lambda db, ctx: (ctx["user_id"], _cursor(db, ctx)), None),
+        Case("get_notes_by_user[search]",
+             lambda db, uid: crud.get_notes_by_user(db, uid, search=f"{seed.COMMON_TERM} {seed.RARE_TERM}"),
+             lambda db, ctx: (ctx["user_id"],), None),
+        Case("get_notes_by_user[tags]",
+             lambda db, uid: crud.get_notes_by_user(db, uid, tagged=list(seed.TAG_SHARES)),
+             lambda db, ctx: (ctx["user_id"],), None),
+        Case("get_notes_by_user[tags, cold]",
+             lambda db, uid: crud.get_notes_by_user(db, uid, tagged=list(seed.TAG_SHARES)),
+             lambda db, ctx: (tags.clear(), ctx["user_id"])[1:], None),
+        Case("get_notes_by_user[any tag]",
+             lambda db, uid: crud.get_notes_by_user(db, uid, tagged=list(seed.TAG_SHARES), match_all=False),
+             lambda db, ctx: (ctx["user_id"],), None),
+        Case("get_all_notes", lambda db: crud.get_all_notes(db), lambda db, ctx: (), None),
+        Case("get_stats", lambda db: crud.get_stats(db), lambda db, ctx: (), None),
+        Case("get_all_notes[search]", lambda db: crud.get_all_notes(db, search=seed.RARE_TERM),
+             lambda db, ctx: (), None),
+        Case("create_password_reset_token", lambda db, email: crud.create_password_reset_token(db, email),
+             lambda db, ctx: (ctx["email"],), None),
+        Case("validate_reset_token", lambda db, token: crud.validate_reset_token(db, token),
+             _fresh_token, None),
+        Case("reset_user_password", lambda db, uid, pw: crud.reset_user_password(db, uid, seed.PASSWORD, hashed_password=pw),
+             lambda db, ctx: (ctx["user_id"], ctx["password_hash"]), None),
+    ]
+
+
+def _context():
+    db = SessionLocal()
+    try:
+        user = crud.get_user_by_email(db, seed.user_email(0))
+        note_ids = [row.id for row in db.query(models.Note.id).filter(models.Note.owner_id == user.id)]
+        hashes = [user.password, auth.hash_password(seed.PASSWORD)]
+        return {"user_id": user.id, "email": user.email, "password_hash": user.password, "hashes": hashes,
+                "note_ids": note_ids}
+    finally:
+        db.close()
+
+
+def _run_once(case, ctx, measure_memory=False):
+    db = SessionLocal()
+    try:
+        args = case.setup(db, ctx)
+        db.commit()
+        pagecache.backend.clear()
+        if measure_memory:
+            tracemalloc.start()
+        with QueryCounter() as qc:
+            started = time.perf_counter()
+            case.call(db, *args)
+            elapsed = time.perf_counter() - started
+        peak = 0
+        if measure_memory:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        return elapsed, qc.count, peak
+    finally:
+        db.close()
+
+
+def run(repeat: int = 50, bcrypt_repeat: int = 5, only=None, log=print) -> dict:
+    """Benchmark every case; returns {case name: summary}"""
+    random.seed(0)
+    ctx = _context()
+    results = {}
+    for case in cases(bcrypt_repeat):
+        if only and not any(pattern in case.name for pattern in only):
+            continue
+        n = case.repeat or repeat
+        _run_once(case, ctx)  # warm-up: imports, statement caches, counter seeding
+        latencies, queries = [], 0
+        for _ in range(n):
+            elapsed, count, _ = _run_once(case, ctx)
+            latencies.append(elapsed)
+            queries += count
+        # Separate pass: tracemalloc slows allocation-heavy code down a lot
+        _, _, peak = _run_once(case, ctx, measure_memory=True)
+        results[case.name] = summarize(latencies, queries=queries, mem_peak_kib=round(peak / 1024, 1))
+        log(f"  {case.name:<30} p50 {results[case.name]['p50_ms']:>9.3f} ms  "
+            f"p95 {results[case.name]['p95_ms']:>9.3f} ms  {results[case.name]['queries_per_call']:>6} q")
+    return results
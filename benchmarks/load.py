@@ -0,0 +1,280 @@
+"""In-process load test: drives app.main:app through httpx's ASGI transport.
+
+Every route gets its own phase. The requests of a phase are built first
+(untimed: builders may create the note a delete will remove), then sent by
+`concurrency` clients, each logged in as a different seeded user. A phase
+reports latency percentiles, throughput, status codes, SQL statements per
+request and the peak Python memory of a single request.
+"""
+import asyncio
+import itertools
+import random
+import time
+import tracemalloc
+from collections import Counter, namedtuple
+
+import httpx
+
+from app import crud_async, main, models, pagecache, schemas
+from app.database import AsyncSessionLocal, SessionLocal
+from app.querycount import QueryCounter
+
+from benchmarks import seed
+from benchmarks.stats import summarize
+
+# build(worker) -> (method, url, request kwargs). slow: bcrypt-bound, gets the smaller request
+# count; pool: which clients send it ("users", "admin" or "anonymous")
+Route = namedtuple("Route", ["name", "build", "slow", "pool"], defaults=(False, "users"))
+
+
+class Worker:
+    def __init__(self, client: httpx.AsyncClient, email=None, user_id=None, password_hash=None, note_ids=(), rng=None):
+        self.client = client
+        self.email = email
+        self.user_id = user_id
+        self.password_hash = password_hash
+        self.note_ids = list(note_ids)
+        self.rng = rng
+        self.token = None
+
+    def note_id(self) -> int:
+        return self.rng.choice(self.note_ids)
+
+
+_seq = itertools.count()
+
+
+async def _new_note(worker) -> int:
+    async with AsyncSessionLocal() as db:
+        note = await crud_async.create_note(db, schemas.NoteCreate(title="load note", content="load body"), worker.user_id)
+        return note.id
+
+
+async def _new_notes(worker, n: int = 100):
+    async with AsyncSessionLocal() as db:
+        notes = await crud_async.create_notes(
+            db, [schemas.NoteCreate(title=f"load {i}", content="load body") for i in range(n)], worker.user_id
+        )
+        return [note.id for note in notes]
+
+
+async def _reset_token(worker) -> str:
+    # A throwaway user: resetting a worker's own password would end its session
+    async with AsyncSessionLocal() as db:
+        i = next(_seq)
+        user = await crud_async.create_user(
+            db, schemas.UserCreate(username=f"reset{i}", email=f"reset{i}@example.com", password=seed.PASSWORD),
+            hashed_password=worker.password_hash,
+        )
+        token = await crud_async.create_password_reset_token(db, user.email)
+        return token.token
+
+
+def _form(data):
+    return {"data": data}
+
+
+def _bearer(worker):
+    return {"Authorization": f"Bearer {worker.token}"}
+
+
+def routes():
+    common, rare = seed.COMMON_TERM, seed.RARE_TERM
+    password = seed.PASSWORD
+
+    async def signup(w):
+        i = next(_seq)
+        return "POST", "/signup", _form({"username": f"load{i}", "email": f"load{i}@example.com", "password": password})
+
+    async def edit_form(w):
+        return "GET", f"/note/{await _new_note(w)}/edit", {}
+
+    async def edit(w):
+        return "POST", f"/note/{await _new_note(w)}/edit", _form({"title": "edited", "content": "edited body"})
+
+    async def delete(w):
+        return "GET", f"/note/{await _new_note(w)}/delete", {}
+
+    async def reset(w):
+        return "POST", f"/reset-password/{await _reset_token(w)}", _form({"password": password, "confirm_password": password})
+
+    async def api_update(w):
+        return "PUT", f"/api/v1/notes/{await _new_note(w)}", {"json": {"title": "edited", "content": "edited"}, "headers": _bearer(w)}
+
+    async def api_delete(w):
+        return "DELETE", f"/api/v1/notes/{await _new_note(w)}", {"headers": _bearer(w)}
+
+    async def api_bulk_update(w):
+        ids = await _new_notes(w)
+        body = {"notes": [{"id": i, "title": "bulk", "content": "bulk edit"} for i in ids]}
+        return "PUT", "/api/v1/notes/bulk", {"json": body, "headers": _bearer(w)}
+
+    async def api_bulk_delete(w):
+        return "POST", "/api/v1/notes/bulk-delete", {"json": {"ids": await _new_notes(w)}, "headers": _bearer(w)}
+
+    def get(url):
+        async def build(w):
+            return "GET", url(w) if callable(url) else url, {}
+        return build
+
+    def api(method, url, body=None):
+        async def build(w):
+            kwargs = {"headers": _bearer(w)}
+            if body is not None:
+                kwargs["json"] = body
+            return method, url(w) if callable(url) else url, kwargs
+        return build
+
+    async def login(w):
+        return "POST", "/login", _form({"email": w.email, "password": password})
+
+    async def token(w):
+        return "POST", "/api/v1/token", {"json": {"email": w.email, "password": password}}
+
+    async def create(w):
+        return "POST", "/note/create", _form({"title": "load note", "content": f"load body {common}"})
+
+    async def forgot(w):
+        return "POST", "/forgot-password", _form({"email": w.email})
+
+    return [
+        Route("GET /", get("/"), pool="anonymous"),
+        Route("GET /signup", get("/signup"), pool="anonymous"),
+        Route("POST /signup", signup, slow=True, pool="anonymous"),
+        Route("GET /login", get("/login"), pool="anonymous"),
+        Route("POST /login", login, slow=True),
+        Route("GET /dashboard", get("/dashboard")),
+        Route("GET /notes/my", get("/notes/my")),
+        Route("GET /notes/my?page=3", get("/notes/my?page=3")),
+        Route("GET /notes/my?search", get(f"/notes/my?search={common}+{rare}")),
+        Route("GET /notes/all", get("/notes/all"), pool="admin"),
+        Route("GET /notes/all?search", get(f"/notes/all?search={rare}"), pool="admin"),
+        Route("GET /note/{id}", get(lambda w: f"/note/{w.note_id()}")),
+        Route("GET /note/create", get("/note/create")),
+        Route("POST /note/create", create),
+        Route("GET /note/{id}/edit", edit_form),
+        Route("POST /note/{id}/edit", edit),
+        Route("GET /note/{id}/delete", delete),
+        Route("GET /forgot-password", get("/forgot-password"), pool="anonymous"),
+        Route("POST /forgot-password", forgot),
+        Route("GET /reset-password/{token}", get("/reset-password/not-a-real-token"), pool="anonymous"),
+        Route("POST /reset-password/{token}", reset, slow=True),
+        # Anonymous clients: logging out would drop a worker's session cookie
+        Route("GET /logout", get("/logout"), pool="anonymous"),
+        Route("POST /api/v1/token", token, slow=True),
+        Route("GET /api/v1/notes", api("GET", "/api/v1/notes")),
+        Route("GET /api/v1/notes?search", api("GET", f"/api/v1/notes?search={common}")),
+        Route("GET /api/v1/notes/{id}", api("GET", lambda w: f"/api/v1/notes/{w.note_id()}")),
+        Route("POST /api/v1/notes", api("POST", "/api/v1/notes", {"title": "api", "content": "api body"})),
+        Route("PUT /api/v1/notes/{id}", api_update),
+        Route("DELETE /api/v1/notes/{id}", api_delete),
+        Route("POST /api/v1/notes/bulk[100]", api("POST", "/api/v1/notes/bulk",
+                                                  {"notes": [{"title": f"b{i}", "content": "bulk"} for i in range(100)]})),
+        Route("PUT /api/v1/notes/bulk[100]", api_bulk_update),
+        Route("POST /api/v1/notes/bulk-delete[100]", api_bulk_delete),
+        Route("GET /api/v1/notes/export", api("GET", "/api/v1/notes/export")),
+    ]
+
+
+def _worker_users(concurrency: int):
+    db = SessionLocal()
+    try:
+        users = (
+            db.query(models.User).filter(models.User.role == "user")
+            .filter(models.User.email.like("bench%")).order_by(models.User.id).limit(concurrency).all()
+        )
+        result = []
+        for user in users:
+            note_ids = [row.id for row in db.query(models.Note.id).filter(models.Note.owner_id == user.id).limit(1000)]
+            result.append((user.email, user.id, user.password, note_ids))
+        return result
+    finally:
+        db.close()
+
+
+async def _login(client, email):
+    r = await client.post("/login", data={"email": email, "password": seed.PASSWORD})
+    if r.status_code != 302:
+        raise RuntimeError(f"Benchmark login failed for {email}: {r.status_code}")
+    r = await client.post("/api/v1/token", json={"email": email, "password": seed.PASSWORD})
+    return r.json()["access_token"]
+
+
+async def _send(client, method, url, kwargs):
+    started = time.perf_counter()
+    response = await client.request(method, url, **kwargs)
+    elapsed = time.perf_counter() - started
+    return elapsed, response.status_code
+
+
+async def _phase(route, pool, n: int):
+    # Build every request up front so builder queries stay out of the counts
+    batches = [[] for _ in pool]
+    for i in range(n):
+        worker = pool[i % len(pool)]
+        batches[i % len(pool)].append(await route.build(worker))
+    memory_probe = await route.build(pool[0])
+
+    latencies, statuses = [], Counter()
+
+    async def run(worker, requests):
+        for method, url, kwargs in requests:
+            elapsed, status = await _send(worker.client, method, url, kwargs)
+            latencies.append(elapsed)
+            statuses[status] += 1
+
+    pagecache.backend.clear()
+    with QueryCounter() as qc:
+        started = time.perf_counter()
+        await asyncio.gather(*(run(w, reqs) for w, reqs in zip(pool, batches)))
+        wall = time.perf_counter() - started
+
+    method, url, kwargs = memory_probe
+    tracemalloc.start()
+    await _send(pool[0].client, method, url, kwargs)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return summarize(latencies, wall, qc.count, concurrency=len(pool),
+                     statuses={str(k): v for k, v in sorted(statuses.items())},
+                     mem_peak_kib=round(peak / 1024, 1))
+
+
+async def run(requests: int = 200, slow_requests: int = 20, concurrency: int = 10, only=None, log=print) -> dict:
+    """Load-test every route; returns {route name: summary}"""
+    await main.startup()
+    transport = httpx.ASGITransport(app=main.app)
+    clients = []
+
+    def client():
+        c = httpx.AsyncClient(transport=transport, base_url="http://bench", follow_redirects=False)
+        clients.append(c)
+        return c
+
+    try:
+        rng = random.Random(0)
+        workers = []
+        for email, user_id, password_hash, note_ids in _worker_users(concurrency):
+            worker = Worker(client(), email, user_id, password_hash, note_ids, rng)
+            worker.token = await _login(worker.client, email)
+            workers.append(worker)
+        admins = []
+        for _ in workers:
+            admin = Worker(client(), seed.ADMIN_EMAIL, note_ids=workers[0].note_ids, rng=rng)
+            admin.token = await _login(admin.client, seed.ADMIN_EMAIL)
+            admins.append(admin)
+        pools = {"users": workers, "admin": admins, "anonymous": [Worker(client()) for _ in workers]}
+
+        results = {}
+        for route in routes():
+            if only and not any(pattern in route.name for pattern in only):
+                continue
+            results[route.name] = await _phase(route, pools[route.pool], slow_requests if route.slow else requests)
+            r = results[route.name]
+            log(f"  {route.name:<36} p50 {r['p50_ms']:>9.3f} ms  p99 {r['p99_ms']:>9.3f} ms  "
+                f"{r['throughput_rps']:>8} rps  {r['queries_per_call']:>6} q  {r['statuses']}")
+        return results
+    finally:
+        for c in clients:
+            await c.aclose()
+        await main.shutdown()
@@ -0,0 +1,124 @@
+"""Seed a scratch database, run the crud microbenchmarks and the route load test, save JSON.
+
+    python -m benchmarks.run                                  # SQLite file, default volumes
+    python -m benchmarks.run --users 50 --notes-per-user 2000 --content-size 2000
+    python -m benchmarks.run --db mysql+pymysql://root:pw@localhost/note_bench --wipe
+    python -m benchmarks.run --skip-seed --only search --only /notes/my
+    python -m benchmarks.run --skip-seed --no-crud --no-load --startup-runs 20
+
+Results go to benchmarks/results/<commit>-<timestamp>.json (or --out); compare
+two runs with `python -m benchmarks.compare old.json new.json`.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+DEFAULT_DB = "sqlite:///" + os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench.db")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=DEFAULT_DB, help="database URL (wiped unless --skip-seed)")
+    parser.add_argument("--wipe", action="store_true", help="required to seed a non-SQLite database")
+    parser.add_argument("--skip-seed", action="store_true", help="reuse the data of a previous run")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--notes-per-user", type=int, default=200)
+    parser.add_argument("--content-size", type=int, default=500, help="approximate characters per note")
+    parser.add_argument("--repeat", type=int, default=50, help="iterations per crud benchmark")
+    parser.add_argument("--requests", type=int, default=200, help="requests per route")
+    parser.add_argument("--slow-requests", type=int, default=20, help="requests per bcrypt-bound route")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--bcrypt-rounds", type=int, default=None, help="override BCRYPT_ROUNDS")
+    parser.add_argument("--page-cache", action="store_true",
+                        help="keep the rendered-page cache on (off by default so every request reaches the DB)")
+    parser.add_argument("--only", action="append", help="run only benchmarks whose name contains this (repeatable)")
+    parser.add_argument("--no-crud", action="store_true")
+    parser.add_argument("--no-load", action="store_true")
+    parser.add_argument("--startup-runs", type=int, default=5, help="fresh worker processes timed (0 to skip)")
+    parser.add_argument("--out", help="output JSON path")
+    return parser.parse_args(argv)
+
+
+def configure_environment(args):
+    """Must run before anything imports app: its modules read settings at import time"""
+    os.environ["DATABASE_URL"] = args.db
+    os.environ.pop("ASYNC_DATABASE_URL", None)
+    os.environ.pop("DATABASE_REPLICA_URLS", None)
+    os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+    os.environ["MAIL_TRANSPORT"] = "memory"
+    if not args.page_cache:
+        os.environ["PAGE_CACHE_BACKEND"] = "none"
+    if args.bcrypt_rounds:
+        os.environ["BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not args.skip_seed and not args.db.startswith("sqlite") and not args.wipe:
+        sys.exit("Refusing to wipe a non-SQLite database without --wipe")
+    configure_environment(args)
+
+    import sqlalchemy
+    from app.database import engine
+    from benchmarks import crud_bench, load, seed, startup
+    from benchmarks.stats import max_rss_mib
+
+    commit = git_commit()
+    meta = {
+        "commit": commit,
+        "started_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "python": platform.python_version(),
+        "sqlalchemy": sqlalchemy.__version__,
+        "database": engine.dialect.name,
+        "page_cache": args.page_cache,
+        "concurrency": args.concurrency,
+    }
+    results = {"meta": meta}
+
+    if not args.skip_seed:
+        print(f"🌱 Seeding {args.users} users x {args.notes_per_user} notes ...")
+        started = time.perf_counter()
+        meta["volumes"] = seed.seed(args.users, args.notes_per_user, args.content_size)
+        meta["seed_seconds"] = round(time.perf_counter() - started, 2)
+
+    if not args.no_crud:
+        print("⏱️ crud microbenchmarks")
+        results["crud"] = crud_bench.run(repeat=args.repeat, only=args.only)
+
+    if not args.no_load:
+        print(f"🚀 Route load test ({args.concurrency} concurrent clients)")
+        results["routes"] = asyncio.run(
+            load.run(args.requests, args.slow_requests, args.concurrency, only=args.only)
+        )
+
+    if args.startup_runs:
+        print(f"🥶 Worker cold start ({args.startup_runs} processes)")
+        results["startup"] = startup.run(args.startup_runs)
+
+    meta["max_rss_mib"] = max_rss_mib()
+    out = args.out or os.path.join(RESULTS_DIR, f"{commit}-{datetime.utcnow():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"✅ Results written to {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Fill a scratch database with deterministic users and notes.
+
+Everything in the target database is dropped first and the migrations are
+re-applied. Notes are written with multi-row bulk INSERTs, then the search
+index and counters are rebuilt the same way the app's maintenance commands
+do it.
+"""
+import random
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, select, text
+
+from app import auth, counters, crud, migrate, models, search_index, stats, storage, tags
+from app.database import Base, SessionLocal, engine
+
+PASSWORD = "Bench-pass1!"
+ADMIN_EMAIL = "bench-admin@example.com"
+# Planted words with known frequencies, so search benchmarks always have hits
+COMMON_TERM = "quarterly"  # in about half of all notes
+RARE_TERM = "zeppelin"     # in about 1% of notes
+# Tags and the share of notes carrying each, for the tag filter benchmarks
+TAG_SHARES = {"work": 0.5, "review": 0.3, "urgent": 0.1}
+INSERT_BATCH = 5000
+
+
+def user_email(i: int) -> str:
+    return f"bench{i}@example.com"
+
+
+def _vocabulary(rng, size: int = 3000):
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choice(letters) for _ in range(rng.randint(3, 10))) for _ in range(size)]
+
+
+def _text(rng, vocabulary, size: int) -> str:
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(vocabulary)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)
+
+
+def _reset_schema(db):
+    backend = search_index.get_backend(db)
+    if backend.name == "fts5":
+        db.execute(text(f"DROP TABLE IF EXISTS {backend.table}"))
+        db.commit()
+    Base.metadata.drop_all(bind=engine)
+    db.execute(text("DROP TABLE IF EXISTS alembic_version"))
+    db.commit()
+    migrate.upgrade()  # the same schema and indexes as a migrated deployment
+
+
+def seed(users: int = 20, notes_per_user: int = 200, content_size: int = 500, seed_value: int = 42) -> dict:
+    """Create `users` users (plus one superadmin), each with `notes_per_user` notes"""
+    rng = random.Random(seed_value)
+    vocabulary = _vocabulary(rng)
+    db = SessionLocal()
+    try:
+        _reset_schema(db)
+        password_hash = auth.hash_password(PASSWORD)  # one bcrypt run, shared by every user
+        user_rows = [
+            {"username": f"bench{i}", "email": user_email(i), "password": password_hash, "role": "user"}
+            for i in range(users)
+        ]
+        user_rows.append({"username": "benchadmin", "email": ADMIN_EMAIL, "password": password_hash, "role": "superadmin"})
+        db.execute(insert(models.User), user_rows)
+        db.commit()
+        user_ids = [u.id for u in db.query(models.User.id).filter(models.User.role == "user").order_by(models.User.id)]
+
+        start = datetime.utcnow() - timedelta(days=365)
+        batch = []
+        total = 0
+        for n in range(notes_per_user):
+            for user_id in user_ids:
+                words = [_text(rng, vocabulary, content_size)]
+                if rng.random() < 0.5:
+                    words.append(COMMON_TERM)
+                if rng.random() < 0.01:
+                    words.append(RARE_TERM)
+                created = start + timedelta(seconds=total * 7)
+                content = " ".join(words)
+                note_tags = [name for name, share in TAG_SHARES.items() if rng.random() < share]
+                batch.append({
+                    "title": " ".join(rng.choice(vocabulary) for _ in range(rng.randint(2, 6))),
+                    **storage.columns(content),
+                    "preview": crud.make_preview(content),
+                    "tag_text": tags.join(note_tags),
+                    "owner_id": user_id,
+                    "created_at": created,
+                    "updated_at": created,
+                })
+                total += 1
+                if len(batch) >= INSERT_BATCH:
+                    db.execute(insert(models.Note), batch)
+                    batch = []
+        if batch:
+            db.execute(insert(models.Note), batch)
+        db.commit()
+
+        tagged = {}
+        for note_id, owner_id, tag_text in db.execute(
+            select(models.Note.id, models.Note.owner_id, models.Note.tag_text).where(models.Note.tag_text.isnot(None))
+        ):
+            tagged.setdefault(owner_id, []).append((note_id, [], tag_text.split()))
+        for owner_id, changes in tagged.items():
+            tags.assign(db, owner_id, changes)
+        db.commit()
+
+        search_index.ensure_index(db)  # builds the index for the fresh notes
+        counters.recount(db)
+        stats.recount(db)
+        return {"users": users, "notes_per_user": notes_per_user, "content_size": content_size, "notes": total}
+    finally:
+        db.close()
@@ -0,0 +1,87 @@
+"""Worker cold-start benchmark: how long a fresh process takes to serve its first request.
+
+Each run starts a new interpreter that imports app.main, runs the startup
+hooks and renders /login once, timing each phase. The parent also times the
+whole process, interpreter start and exit included.
+
+    python -m benchmarks.startup                    # DATABASE_URL from the environment
+    python -m benchmarks.startup --runs 20 --env STARTUP_SCHEMA=skip --env TEMPLATE_CACHE_DIR=none
+
+The first --warmup runs are not counted (they fill the OS file cache and the
+template bytecode cache, as an earlier worker of a deploy would).
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks.stats import summarize
+
+PHASES = ("import", "startup", "first_request", "in_process", "process")
+
+
+def _child():
+    from fastapi.testclient import TestClient  # the harness itself is not timed
+
+    started = time.perf_counter()
+    from app.main import app
+    imported = time.perf_counter()
+    with TestClient(app) as client:  # runs the startup hooks
+        ready = time.perf_counter()
+        response = client.get("/login")
+        served = time.perf_counter()
+    assert response.status_code == 200, response.status_code
+    print(json.dumps({
+        "import": imported - started,
+        "startup": ready - imported,
+        "first_request": served - ready,
+        "in_process": served - started,
+    }))
+
+
+def _run_once(env: dict) -> dict:
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-m", "benchmarks.startup", "--child"], env=env, capture_output=True, text=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    elapsed = time.perf_counter() - started
+    if proc.returncode != 0:
+        raise RuntimeError(f"startup run failed:\n{proc.stderr[-2000:]}")
+    timings = json.loads(proc.stdout.strip().splitlines()[-1])
+    timings["process"] = elapsed
+    return timings
+
+
+def run(runs: int = 5, warmup: int = 1, env: dict = None) -> dict:
+    """Per-phase latency summaries over `runs` fresh processes"""
+    env = {**os.environ, **(env or {})}
+    for _ in range(warmup):
+        _run_once(env)
+    samples = [_run_once(env) for _ in range(runs)]
+    return {phase: summarize([s[phase] for s in samples]) for phase in PHASES}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--env", action="append", default=[], metavar="NAME=VALUE",
+                        help="extra environment for the measured processes (repeatable)")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        _child()
+        return
+
+    env = dict(item.split("=", 1) for item in args.env)
+    results = run(args.runs, args.warmup, env)
+    print(f"{'phase':<14} {'p50_ms':>10} {'p95_ms':>10} {'max_ms':>10}")
+    for phase, stats in results.items():
+        print(f"{phase:<14} {stats['p50_ms']:>10.1f} {stats['p95_ms']:>10.1f} {stats['max_ms']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+import math
+import resource
+import sys
+
+
+def percentile(sorted_values, pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies, wall_seconds: float = None, queries: int = None, **extra) -> dict:
+    """Latency percentiles in milliseconds plus throughput and queries per call"""
+    values = sorted(latencies)
+    n = len(values)
+    summary = {
+        "n": n,
+        "mean_ms": round(sum(values) / n * 1000, 3) if n else 0.0,
+        "p50_ms": round(percentile(values, 50) * 1000, 3),
+        "p95_ms": round(percentile(values, 95) * 1000, 3),
+        "p99_ms": round(percentile(values, 99) * 1000, 3),
+        "max_ms": round(values[-1] * 1000, 3) if n else 0.0,
+    }
+    if wall_seconds:
+        summary["throughput_rps"] = round(n / wall_seconds, 1)
+    if queries is not None and n:
+        summary["queries_per_call"] = round(queries / n, 2)
+    summary.update(extra)
+    return summary
+
+
+def max_rss_mib() -> float:
+    """Peak resident set size of this process"""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, KiB elsewhere
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
@@ -0,0 +1,64 @@
+"""Baseline: users, notes and password_reset_tokens
+
+Databases created before migrations existed (by Base.metadata.create_all)
+already have these tables; they are left alone, so `alembic upgrade head`
+works on both fresh and existing databases.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _missing(table: str) -> bool:
+    return not sa.inspect(op.get_bind()).has_table(table)
+
+
+def upgrade():
+    if _missing("users"):
+        op.create_table(
+            "users",
+            sa.Column("id", sa.Integer, primary_key=True),
+            sa.Column("username", sa.String(50), nullable=False, unique=True),
+            sa.Column("email", sa.String(100), nullable=False, unique=True),
+            sa.Column("password", sa.String(200), nullable=False),
+            sa.Column("role", sa.String(20)),
+        )
+        op.create_index("ix_users_id", "users", ["id"])
+
+    if _missing("notes"):
+        op.create_table(
+            "notes",
+            sa.Column("id", sa.Integer, primary_key=True),
+            sa.Column("title", sa.String(200), nullable=False),
+            sa.Column("content", sa.Text, nullable=False),
+            sa.Column("created_at", sa.DateTime),
+            sa.Column("updated_at", sa.DateTime),
+            sa.Column("owner_id", sa.Integer, sa.ForeignKey("users.id")),
+        )
+        op.create_index("ix_notes_id", "notes", ["id"])
+
+    if _missing("password_reset_tokens"):
+        op.create_table(
+            "password_reset_tokens",
+            sa.Column("id", sa.Integer, primary_key=True),
+            sa.Column("user_id", sa.Integer, sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("token", sa.String(64), nullable=False),
+            sa.Column("expires_at", sa.DateTime, nullable=False),
+            sa.Column("used", sa.Integer),
+        )
+        op.create_index("ix_password_reset_tokens_id", "password_reset_tokens", ["id"])
+        op.create_index("ix_password_reset_tokens_token", "password_reset_tokens", ["token"], unique=True)
+
+
+def downgrade():
+    op.drop_table("password_reset_tokens")
+    op.drop_table("notes")
+    op.drop_table("users")
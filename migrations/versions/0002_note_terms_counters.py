@@ -0,0 +1,63 @@
+"""Inverted search index and denormalised counters
+
+Also skipped when create_all already made them. The FTS5 table and the MySQL
+FULLTEXT index are not here: which one exists depends on SEARCH_BACKEND, and
+search_index.ensure_index() creates and backfills it at startup.
+
+The note counters (see app.counters) are counted here, once; from then on
+the writes keep them up to date.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def _missing(table: str) -> bool:
+    return not sa.inspect(op.get_bind()).has_table(table)
+
+
+def _seed_note_counters(bind):
+    counters = sa.table("counters", sa.column("name", sa.String), sa.column("value", sa.BigInteger))
+    notes = sa.table("notes", sa.column("id", sa.Integer), sa.column("owner_id", sa.Integer))
+    if bind.execute(sa.select(counters.c.name).where(counters.c.name.like("notes:%")).limit(1)).first():
+        return
+    # Names as app.counters spells them at this revision
+    rows = [{"name": "notes:all", "value": bind.scalar(sa.select(sa.func.count()).select_from(notes))}]
+    rows += [{"name": f"notes:user:{owner_id}", "value": count} for owner_id, count in bind.execute(
+        sa.select(notes.c.owner_id, sa.func.count()).where(notes.c.owner_id.isnot(None)).group_by(notes.c.owner_id)
+    )]
+    bind.execute(counters.insert(), rows)
+
+
+def upgrade():
+    if _missing("note_terms"):
+        op.create_table(
+            "note_terms",
+            sa.Column("term", sa.String(64), primary_key=True),
+            sa.Column("note_id", sa.Integer, sa.ForeignKey("notes.id", ondelete="CASCADE"), primary_key=True),
+            sa.Column("owner_id", sa.Integer, nullable=False),
+            sa.Column("weight", sa.Integer, nullable=False),
+        )
+        op.create_index("ix_note_terms_note_id", "note_terms", ["note_id"])
+        op.create_index("ix_note_terms_term_owner", "note_terms", ["term", "owner_id"])
+
+    if _missing("counters"):
+        op.create_table(
+            "counters",
+            sa.Column("name", sa.String(64), primary_key=True),
+            sa.Column("value", sa.BigInteger, nullable=False),
+        )
+    _seed_note_counters(op.get_bind())
+
+
+def downgrade():
+    op.drop_table("counters")
+    op.drop_table("note_terms")
@@ -0,0 +1,40 @@
+"""Indexes for the keyset listings and reset-token lookups
+
+/notes/my filters on owner_id and orders by (created_at, id); /notes/all
+orders by (created_at, id) alone. Without these both sort the whole table
+for every page. The export walks a user's notes in id order, which the plain
+owner_id index gives (index entries end with the primary key); MySQL would
+otherwise drop its implicit foreign-key index in favour of the composite one
+and sort each batch. password_reset_tokens is looked up by user_id whenever a
+new token is issued.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+INDEXES = (
+    ("ix_notes_owner_created", "notes", ["owner_id", "created_at", "id"]),
+    ("ix_notes_created", "notes", ["created_at", "id"]),
+    ("ix_notes_owner_id", "notes", ["owner_id"]),
+    ("ix_password_reset_tokens_user_id", "password_reset_tokens", ["user_id"]),
+)
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    for name, table, columns in INDEXES:
+        if name not in {ix["name"] for ix in inspector.get_indexes(table)}:
+            op.create_index(name, table, columns)
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,58 @@
+"""notes.preview: a short, precomputed snippet for list pages
+
+List pages select it instead of content. Existing notes are backfilled in id
+order, a batch at a time.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+# Frozen copy of app.crud.make_preview as of this revision
+PREVIEW_LENGTH = 200
+
+
+def make_preview(content: str) -> str:
+    text = " ".join(content[:PREVIEW_LENGTH * 2].split())
+    if len(text) <= PREVIEW_LENGTH and len(content) <= PREVIEW_LENGTH * 2:
+        return text
+    cut = text[:PREVIEW_LENGTH]
+    if " " in cut[PREVIEW_LENGTH // 2:]:
+        cut = cut.rsplit(" ", 1)[0]
+    return cut + "…"
+
+
+def upgrade():
+    bind = op.get_bind()
+    if "preview" not in {c["name"] for c in sa.inspect(bind).get_columns("notes")}:
+        op.add_column("notes", sa.Column("preview", sa.String(255)))
+
+    notes = sa.table("notes", sa.column("id", sa.Integer), sa.column("content", sa.Text),
+                     sa.column("preview", sa.String))
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(notes.c.id, notes.c.content)
+            .where(notes.c.id > last_id, notes.c.preview.is_(None))
+            .order_by(notes.c.id).limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        bind.execute(
+            notes.update().where(notes.c.id == sa.bindparam("note_id")),
+            [{"note_id": row.id, "preview": make_preview(row.content)} for row in rows],
+        )
+        last_id = rows[-1].id
+
+
+def downgrade():
+    with op.batch_alter_table("notes") as batch:
+        batch.drop_column("preview")
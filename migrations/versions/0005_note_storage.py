@@ -0,0 +1,40 @@
+"""Columns for compressed and blob-stored note bodies (see app.storage)
+
+Existing notes stay inline (content_encoding NULL). Run
+`python -m app.storage rewrite` to re-encode them with the current settings.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+COLUMNS = (
+    ("content_data", sa.LargeBinary().with_variant(mysql.LONGBLOB(), "mysql", "mariadb")),
+    ("content_encoding", sa.String(16)),
+    ("content_ref", sa.String(64)),
+    ("content_size", sa.Integer()),
+)
+
+
+def upgrade():
+    existing = {c["name"] for c in sa.inspect(op.get_bind()).get_columns("notes")}
+    for name, type_ in COLUMNS:
+        if name not in existing:
+            op.add_column("notes", sa.Column(name, type_))
+    if "ix_notes_content_ref" not in {ix["name"] for ix in sa.inspect(op.get_bind()).get_indexes("notes")}:
+        op.create_index("ix_notes_content_ref", "notes", ["content_ref"])
+
+
+def downgrade():
+    op.drop_index("ix_notes_content_ref", table_name="notes")
+    with op.batch_alter_table("notes") as batch:
+        for name, _ in reversed(COLUMNS):
+            batch.drop_column(name)
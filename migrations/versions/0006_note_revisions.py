@@ -0,0 +1,37 @@
+"""note_revisions: delta-compressed edit history (see app.revisions)
+
+Existing notes get their first revision when they are next edited.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if sa.inspect(op.get_bind()).has_table("note_revisions"):
+        return
+    op.create_table(
+        "note_revisions",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("note_id", sa.Integer, sa.ForeignKey("notes.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("number", sa.Integer, nullable=False),
+        sa.Column("kind", sa.String(8), nullable=False),
+        sa.Column("title", sa.String(200), nullable=False),
+        sa.Column("size", sa.Integer, nullable=False),
+        sa.Column("data", sa.LargeBinary().with_variant(mysql.LONGBLOB(), "mysql", "mariadb"), nullable=False),
+        sa.Column("created_at", sa.DateTime),
+    )
+    op.create_index("ix_note_revisions_note_number", "note_revisions", ["note_id", "number"], unique=True)
+
+
+def downgrade():
+    op.drop_table("note_revisions")
@@ -0,0 +1,27 @@
+"""Index password_reset_tokens.expires_at for the token sweeper
+
+app.sweeper deletes tokens by expires_at (used tokens are expired when they
+are used), in small batches; without the index every batch scans the table.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+NAME = "ix_password_reset_tokens_expires_at"
+
+
+def upgrade():
+    if NAME not in {ix["name"] for ix in sa.inspect(op.get_bind()).get_indexes("password_reset_tokens")}:
+        op.create_index(NAME, "password_reset_tokens", ["expires_at"])
+
+
+def downgrade():
+    op.drop_index(NAME, table_name="password_reset_tokens")
@@ -0,0 +1,27 @@
+"""notes.version: optimistic concurrency for note edits
+
+Every save increments it, and edits and deletes are conditional on the
+version the client last saw (see app.crud.update_note). Existing notes
+start at 1.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if "version" not in {c["name"] for c in sa.inspect(op.get_bind()).get_columns("notes")}:
+        op.add_column("notes", sa.Column("version", sa.Integer, nullable=False, server_default="1"))
+
+
+def downgrade():
+    with op.batch_alter_table("notes") as batch:
+        batch.drop_column("version")
@@ -0,0 +1,42 @@
+"""Change feed for sync clients: notes.change_seq and note_tombstones (see app.sync)
+
+Existing notes get change_seq 0; they reach clients with their first sync,
+and every later write numbers them from the owner's sequence.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if "change_seq" not in {c["name"] for c in inspector.get_columns("notes")}:
+        op.add_column("notes", sa.Column("change_seq", sa.BigInteger, nullable=False, server_default="0"))
+    if "ix_notes_owner_change_seq" not in {ix["name"] for ix in inspector.get_indexes("notes")}:
+        op.create_index("ix_notes_owner_change_seq", "notes", ["owner_id", "change_seq", "id"])
+    if not inspector.has_table("note_tombstones"):
+        op.create_table(
+            "note_tombstones",
+            sa.Column("id", sa.Integer, primary_key=True),
+            sa.Column("note_id", sa.Integer, nullable=False),
+            sa.Column("owner_id", sa.Integer, nullable=False),
+            sa.Column("change_seq", sa.BigInteger, nullable=False),
+            sa.Column("deleted_at", sa.DateTime, nullable=False),
+        )
+        op.create_index("ix_note_tombstones_owner_seq", "note_tombstones", ["owner_id", "change_seq"])
+        op.create_index("ix_note_tombstones_deleted_at", "note_tombstones", ["deleted_at"])
+
+
+def downgrade():
+    op.drop_table("note_tombstones")
+    op.drop_index("ix_notes_owner_change_seq", table_name="notes")
+    with op.batch_alter_table("notes") as batch:
+        batch.drop_column("change_seq")
@@ -0,0 +1,42 @@
+"""Tags: tags, note_tags and notes.tags (see app.tags)
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0010"
+down_revision = "0009"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if "tags" not in {c["name"] for c in inspector.get_columns("notes")}:
+        op.add_column("notes", sa.Column("tags", sa.String(1000)))
+    if not inspector.has_table("tags"):
+        op.create_table(
+            "tags",
+            sa.Column("id", sa.Integer, primary_key=True),
+            sa.Column("owner_id", sa.Integer, sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("name", sa.String(40), nullable=False),
+            sa.Column("note_count", sa.Integer, nullable=False),
+        )
+        op.create_index("ix_tags_owner_name", "tags", ["owner_id", "name"], unique=True)
+    if not inspector.has_table("note_tags"):
+        op.create_table(
+            "note_tags",
+            sa.Column("tag_id", sa.Integer, sa.ForeignKey("tags.id", ondelete="CASCADE"), primary_key=True),
+            sa.Column("note_id", sa.Integer, sa.ForeignKey("notes.id", ondelete="CASCADE"), primary_key=True),
+        )
+        op.create_index("ix_note_tags_note_id", "note_tags", ["note_id"])
+
+
+def downgrade():
+    op.drop_table("note_tags")
+    op.drop_table("tags")
+    with op.batch_alter_table("notes") as batch:
+        batch.drop_column("tags")
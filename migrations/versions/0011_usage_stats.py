@@ -0,0 +1,80 @@
+"""Usage statistics: users.note_count and users.content_bytes (see app.stats)
+
+Fills the stats:* counters and the per-user totals in from the existing
+rows: users, note sizes, content bytes and notes created per day. Edits and
+deletes made before this revision are not known.
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-17
+"""
+import bisect
+import os
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0011"
+down_revision = "0010"
+branch_labels = None
+depends_on = None
+
+# As app.stats spells them at this revision; the shard count is the app's setting
+STATS_SHARDS = int(os.getenv("STATS_SHARDS", "8"))
+SIZE_BOUNDS = (1024, 10 * 1024, 100 * 1024, 1024 * 1024)
+
+
+def _seed_stats(bind, batch_size=1000):
+    counters = sa.table("counters", sa.column("name", sa.String), sa.column("value", sa.BigInteger))
+    users = sa.table("users", sa.column("id", sa.Integer), sa.column("note_count", sa.BigInteger),
+                     sa.column("content_bytes", sa.BigInteger))
+    notes = sa.table("notes", sa.column("id", sa.Integer), sa.column("owner_id", sa.Integer),
+                     sa.column("created_at", sa.DateTime), sa.column("content", sa.Text),
+                     sa.column("content_size", sa.Integer))
+    if bind.execute(sa.select(counters.c.name).where(counters.c.name.like("stats:%")).limit(1)).first():
+        return
+    size = sa.func.coalesce(notes.c.content_size, sa.func.length(notes.c.content))
+    values = {"stats:users": bind.scalar(sa.select(sa.func.count()).select_from(users))}
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(notes.c.id, notes.c.owner_id, notes.c.created_at, size)
+            .where(notes.c.id > last_id).order_by(notes.c.id).limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        for _, owner_id, created_at, note_size in rows:
+            shard = (owner_id or 0) % STATS_SHARDS
+            day = (created_at or datetime.utcnow()).date().isoformat()
+            for name, delta in ((f"stats:size:{bisect.bisect_right(SIZE_BOUNDS, note_size)}:{shard}", 1),
+                                (f"stats:bytes:{shard}", note_size), (f"stats:day:{day}:created:{shard}", 1)):
+                values[name] = values.get(name, 0) + delta
+        last_id = rows[-1].id
+    bind.execute(counters.insert(), [{"name": name, "value": value} for name, value in values.items()])
+
+    owned = notes.c.owner_id == users.c.id
+    bind.execute(users.update().values(
+        note_count=sa.select(sa.func.count()).where(owned).scalar_subquery(),
+        content_bytes=sa.select(sa.func.coalesce(sa.func.sum(size), 0)).where(owned).scalar_subquery(),
+    ))
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    columns = {c["name"] for c in inspector.get_columns("users")}
+    if "note_count" not in columns:
+        op.add_column("users", sa.Column("note_count", sa.BigInteger, nullable=False, server_default="0"))
+    if "content_bytes" not in columns:
+        op.add_column("users", sa.Column("content_bytes", sa.BigInteger, nullable=False, server_default="0"))
+    if "ix_users_note_count" not in {ix["name"] for ix in inspector.get_indexes("users")}:
+        op.create_index("ix_users_note_count", "users", ["note_count", "id"])
+    _seed_stats(op.get_bind())
+
+
+def downgrade():
+    op.execute("DELETE FROM counters WHERE name LIKE 'stats:%'")
+    op.drop_index("ix_users_note_count", table_name="users")
+    with op.batch_alter_table("users") as batch:
+        batch.drop_column("content_bytes")
+        batch.drop_column("note_count")
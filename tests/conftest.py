@@ -0,0 +1,68 @@
+"""The app on a throwaway SQLite database.
+
+The app modules read their settings when imported, so these are set before
+anything from app/ is imported. Tests share one database: each makes its
+own users (new_user) and only looks at their notes.
+"""
+import itertools
+import os
+import tempfile
+
+_DB_DIR = tempfile.mkdtemp(prefix="notes-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_DB_DIR, 'test.db')}"
+for name in ("ASYNC_DATABASE_URL", "DATABASE_REPLICA_URLS", "CONTENT_COMPRESSION", "CONTENT_BLOB_DIR"):
+    os.environ.pop(name, None)
+os.environ.update({
+    "SECRET_KEY": "test",
+    "BCRYPT_ROUNDS": "4",
+    "HASH_EXECUTOR": "thread",
+    "MAIL_TRANSPORT": "memory",
+    "PAGE_CACHE_BACKEND": "none",  # every request reaches the database
+})
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import crud, schemas
+from app.database import SessionLocal
+from app.main import app
+
+PASSWORD = "Passw0rd!"
+_user_numbers = itertools.count(1)
+
+
+@pytest.fixture(scope="session")
+def started():
+    """The app after its startup hooks: migrations applied, background workers running"""
+    with TestClient(app):
+        yield app
+
+
+@pytest.fixture
+def db(started):
+    session = SessionLocal()
+    yield session
+    session.close()
+
+
+def new_user(db, role: str = "user"):
+    name = f"user{next(_user_numbers)}"
+    user_in = schemas.UserCreate(username=name, email=f"{name}@example.com", password=PASSWORD)
+    return crud.create_user(db, user_in, role=role)
+
+
+def add_notes(db, user, n: int, **fields):
+    """n notes titled 'note 0'... with bodies 'body 0'..., created in order (later ones are newer)"""
+    notes_in = [schemas.NoteCreate(**{"title": f"note {i}", "content": f"body {i}", **fields}) for i in range(n)]
+    return crud.create_notes(db, notes_in, user.id)
+
+
+@pytest.fixture
+def login(started):
+    """login(user) -> a TestClient signed in as user"""
+    def login(user):
+        client = TestClient(started)
+        response = client.post("/login", data={"email": user.email, "password": PASSWORD}, follow_redirects=False)
+        assert response.status_code == 302, response.text
+        return client
+    return login
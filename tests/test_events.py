@@ -0,0 +1,33 @@
+"""Which notes a live list page's event stream (/notes/events) carries."""
+import pytest
+
+from app import events
+from tests.conftest import new_user
+
+
+@pytest.fixture
+def streams(monkeypatch):
+    """The owner_id of every stream opened; each stream ends at once"""
+    opened = []
+
+    async def stream(owner_id=None, last_event_id=None):
+        opened.append(owner_id)
+        yield "retry: 5000\n\n"
+
+    monkeypatch.setattr(events, "stream", stream)
+    return opened
+
+
+def test_pages_subscribe_to_their_own_scope(db, login):
+    admin = login(new_user(db, role="superadmin"))
+    assert 'data-live-events="/notes/events?scope=my"' in admin.get("/notes/my").text
+    assert 'data-live-events="/notes/events?scope=all"' in admin.get("/notes/all").text
+
+
+def test_only_superadmin_all_notes_gets_every_owner(db, login, streams):
+    admin_user, user = new_user(db, role="superadmin"), new_user(db)
+    admin, client = login(admin_user), login(user)
+    for http, url in [(admin, "/notes/events?scope=my"), (admin, "/notes/events"),
+                      (admin, "/notes/events?scope=all"), (client, "/notes/events?scope=all")]:
+        assert http.get(url).status_code == 200
+    assert streams == [admin_user.id, admin_user.id, None, user.id]
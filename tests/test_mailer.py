@@ -0,0 +1,89 @@
+"""SMTP batches that lose their connection part way through, and recipients the server refuses."""
+import smtplib
+from email.message import EmailMessage
+
+from app.mailer import MailQueue, SMTPTransport
+
+
+class FakeServer:
+    """Accepts messages until the connection 'drops' at message number drop_at.
+
+    refuse maps an address to the SMTP code it is refused with.
+    """
+
+    def __init__(self, drop_at=None, refuse=None):
+        self.drop_at = drop_at
+        self.refuse = refuse or {}
+        self.accepted = []
+        self.closed = False
+
+    def send_message(self, message):
+        if len(self.accepted) == self.drop_at:
+            raise smtplib.SMTPServerDisconnected("connection lost")
+        if message["To"] in self.refuse:
+            raise smtplib.SMTPRecipientsRefused({message["To"]: (self.refuse[message["To"]], b"refused")})
+        self.accepted.append(message)
+
+    def quit(self):
+        self.closed = True
+
+
+class FakeTransport(SMTPTransport):
+    def __init__(self, servers):
+        super().__init__(host="smtp.invalid", port=25, username=None, password=None, pool_size=1)
+        self.servers = list(servers)
+
+    def _connect(self):
+        return self.servers.pop(0)
+
+
+def _messages(n):
+    messages = []
+    for i in range(n):
+        message = EmailMessage()
+        message["To"] = f"user{i}@example.com"
+        message.set_content(f"message {i}")
+        messages.append(message)
+    return messages
+
+
+def test_dropped_connection_fails_only_unsent_messages():
+    server = FakeServer(drop_at=2)
+    messages = _messages(5)
+    failed = FakeTransport([server]).send_batch(messages)
+    assert server.accepted == messages[:2]
+    assert [message for message, _ in failed] == messages[2:]
+    assert server.closed
+
+
+def test_queue_does_not_resend_accepted_messages():
+    first, second = FakeServer(drop_at=2), FakeServer()
+    mail_queue = MailQueue(FakeTransport([first, second]), workers=1, batch_size=5, retry_delay=0)
+    messages = _messages(5)
+    for message in messages:
+        mail_queue.enqueue(message)
+    mail_queue.start()
+    mail_queue.stop(timeout=5)
+    assert first.accepted + second.accepted == messages
+    assert mail_queue.stats["sent"] == 5 and mail_queue.stats["retried"] == 3
+
+
+def test_refused_address_fails_without_retries():
+    server = FakeServer(refuse={"user1@example.com": 550, "user2@example.com": 451})
+    mail_queue = MailQueue(FakeTransport([server]), workers=1, batch_size=5, max_attempts=3, retry_delay=0)
+    messages = _messages(4)
+    for message in messages:
+        mail_queue.enqueue(message)
+    mail_queue.start()
+    mail_queue.stop(timeout=5)
+    assert server.accepted == [messages[0], messages[3]]
+    # 550 (no such user) is final; 451 (try later) uses up its attempts
+    assert mail_queue.stats == {"queued": 4, "sent": 2, "retried": 2, "failed": 2, "dropped": 0}
+
+
+def test_permanent_errors():
+    transport = FakeTransport([])
+    assert transport.is_permanent(smtplib.SMTPRecipientsRefused({"a@example.com": (550, b"unknown user")}))
+    assert not transport.is_permanent(smtplib.SMTPRecipientsRefused({"a@example.com": (450, b"mailbox busy")}))
+    assert transport.is_permanent(smtplib.SMTPDataError(554, b"message rejected"))
+    assert not transport.is_permanent(smtplib.SMTPServerDisconnected("connection lost"))
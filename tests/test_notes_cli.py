@@ -0,0 +1,68 @@
+"""Bulk export and import (app.notes_cli): every note field carried across, statistics kept."""
+import json
+
+import pytest
+
+from app import counters, crud, models, notes_cli, schemas, stats, tags
+from tests.conftest import new_user
+
+
+def _export(db, user, path, fmt):
+    """user's notes, as `python -m app.notes_cli export` writes them"""
+    return notes_cli._export_range(str(path), fmt, user.id, user.id)
+
+
+@pytest.mark.parametrize("fmt", ["ndjson", "csv"])
+def test_round_trip_keeps_tags(db, tmp_path, fmt):
+    source, target = new_user(db), new_user(db)
+    written = {}
+    for i, names in enumerate([["work"], ["work", "urgent"], [], ["home"]]):
+        note = crud.create_note(db, schemas.NoteCreate(title=f"note {i}", content=f"body {i}", tags=names), source.id)
+        written[note.title] = sorted(names)
+    path = tmp_path / f"notes.{fmt}"
+    assert _export(db, source, path, fmt) == 4
+
+    result = notes_cli.import_notes(str(path), fmt, owner_email=target.email)
+    assert (result["imported"], result["skipped"]) == (4, 0)
+    db.expire_all()
+    total, page = crud.get_notes_by_user(db, target.id, summary=False)
+    assert total == 4 and {n.title: n.tags for n in page.items} == written
+    assert dict(tags.get_tags(db, target.id)) == {"home": 1, "urgent": 1, "work": 2}
+    total, page = crud.get_notes_by_user(db, target.id, tagged=["work"])
+    assert sorted(n.title for n in page.items) == ["note 0", "note 1"]
+
+
+def test_import_cleans_tags_and_skips_too_many(db, tmp_path):
+    user = new_user(db)
+    path = tmp_path / "notes.ndjson"
+    records = [{"title": "listed", "content": "x", "tags": ["Work Projects", "work-projects", "B"]},
+               {"title": "typed", "content": "x", "tags": "a, b c"},
+               {"title": "too many", "content": "x", "tags": [f"t{i}" for i in range(tags.MAX_TAGS_PER_NOTE + 1)]}]
+    path.write_text("".join(json.dumps(r) + "\n" for r in records), encoding="utf-8")
+
+    result = notes_cli.import_notes(str(path), owner_email=user.email)
+    assert (result["imported"], result["skipped"]) == (2, 1)
+    db.expire_all()
+    _, page = crud.get_notes_by_user(db, user.id, summary=False)
+    assert {n.title: n.tags for n in page.items} == {"listed": ["b", "work-projects"], "typed": ["a", "b", "c"]}
+
+
+def test_import_keeps_usage_statistics(db, tmp_path):
+    user = new_user(db)
+    bodies = ["short", "é" * 600, "x" * 20000]  # different size buckets; 1200 bytes for 600 characters
+    path = tmp_path / "notes.ndjson"
+    path.write_text("".join(json.dumps({"title": f"note {i}", "content": body}) + "\n"
+                            for i, body in enumerate(bodies)), encoding="utf-8")
+    before = stats.get_stats(db)
+
+    assert notes_cli.import_notes(str(path), owner_email=user.email)["imported"] == 3
+    db.expire_all()
+    after = stats.get_stats(db)
+    sizes = [len(body.encode("utf-8")) for body in bodies]
+    assert after.notes == before.notes + 3 == counters.get(db, counters.ALL_NOTES)
+    assert after.content_bytes == before.content_bytes + sum(sizes)
+    assert after.days[0].created == before.days[0].created + 3
+    added = {label: count - dict(before.sizes)[label] for label, count in after.sizes if count != dict(before.sizes)[label]}
+    assert added == {label: 1 for label in (stats.SIZE_LABELS[stats.size_bucket(size)] for size in sizes)}
+    owner = db.get(models.User, user.id)
+    assert (owner.note_count, owner.content_bytes) == (3, sum(sizes))
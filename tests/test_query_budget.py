@@ -0,0 +1,40 @@
+"""The listing pages stay within their SQL statement budgets (app.querycount)."""
+import pytest
+
+from app import tags, usercache
+from app.querycount import LISTING_QUERY_BUDGET, assert_max_queries
+from tests.conftest import add_notes, new_user
+
+
+@pytest.fixture
+def owners(db):
+    """Two users with a few pages of notes each, and a superadmin"""
+    alice, bob = new_user(db), new_user(db)
+    add_notes(db, alice, 25, tags=["work"])
+    add_notes(db, bob, 15)
+    return alice, bob, new_user(db, role="superadmin")
+
+
+def _cold():
+    """Nothing cached in the worker: the first request after a restart"""
+    usercache.clear()
+    tags.clear()
+
+
+@pytest.mark.parametrize("url", ["/notes/my", "/notes/my?page=2", "/notes/my?search=body", "/notes/my?tags=work"])
+def test_my_notes_budget(owners, login, url):
+    client = login(owners[0])
+    _cold()
+    with assert_max_queries(LISTING_QUERY_BUDGET["/notes/my"]):
+        response = client.get(url)
+    assert response.status_code == 200
+    assert "note 24" in response.text or "page=2" in url
+
+
+@pytest.mark.parametrize("url", ["/notes/all", "/notes/all?page=2", "/notes/all?search=body"])
+def test_all_notes_budget(owners, login, url):
+    client = login(owners[2])
+    _cold()
+    with assert_max_queries(LISTING_QUERY_BUDGET["/notes/all"]):
+        response = client.get(url)
+    assert response.status_code == 200
@@ -0,0 +1,64 @@
+"""Every revision rebuilds its exact text from the snapshots and deltas (app.revisions)."""
+import random
+
+from app import crud, revisions, schemas
+from tests.conftest import new_user
+
+
+def _edits(n: int):
+    """n bodies, each a small random edit of the one before, with a full rewrite now and then"""
+    rng = random.Random(16)
+    lines = [f"line {i}\n" for i in range(30)]
+    for i in range(n):
+        if i % 17 == 16:
+            lines = [f"rewritten {i} {j} ünïcødé\n" for j in range(rng.randint(1, 40))]
+        else:
+            at = rng.randrange(len(lines) + 1)
+            choice = rng.random()
+            if choice < 0.4 or len(lines) < 3:
+                lines.insert(at, f"added in edit {i}\n")
+            elif choice < 0.7:
+                del lines[min(at, len(lines) - 1)]
+            else:
+                lines[min(at, len(lines) - 1)] = f"changed in edit {i}\n"
+        body = "".join(lines)
+        yield body.rstrip("\n") if i % 5 == 0 else body  # sometimes no final newline
+
+
+def test_every_revision_rebuilds_its_text(db):
+    user = new_user(db)
+    first = "".join(f"line {i}\n" for i in range(30))
+    note = crud.create_note(db, schemas.NoteCreate(title="title 0", content=first), user.id)
+    expected = [("title 0", first)]
+    for i, body in enumerate(_edits(2 * revisions.REVISION_SNAPSHOT_INTERVAL + 5), 1):
+        note = crud.update_note(db, note.id, schemas.NoteUpdate(title=f"title {i}", content=body,
+                                                                version=note.version), user.id)
+        expected.append((f"title {i}", body))
+    # The bulk path too, with the same note twice in one batch
+    batch = [schemas.NoteBulkUpdateItem(id=note.id, title="bulk a", content="bulk\nfirst\n"),
+             schemas.NoteBulkUpdateItem(id=note.id, title="bulk b", content="bulk\nsecond\n")]
+    crud.update_notes(db, batch, user.id)
+    expected += [("bulk a", "bulk\nfirst\n"), ("bulk b", "bulk\nsecond\n")]
+
+    kinds = {r.kind for r in crud.get_revisions(db, note.id, limit=len(expected))}
+    assert kinds == {revisions.SNAPSHOT, revisions.DELTA}
+    for number, (title, body) in enumerate(expected, 1):
+        revision, content = crud.get_revision(db, note.id, number)
+        assert (revision.title, content) == (title, body), f"revision {number}"
+    assert crud.get_revision(db, note.id, len(expected) + 1) is None
+
+
+def test_unchanged_save_adds_no_revision(db):
+    user = new_user(db)
+    note = crud.create_note(db, schemas.NoteCreate(title="same", content="text"), user.id)
+    crud.update_note(db, note.id, schemas.NoteUpdate(title="same", content="text"), user.id)
+    assert [r.number for r in crud.get_revisions(db, note.id)] == [1]
+
+
+def test_restore_saves_old_revision_as_newest(db):
+    user = new_user(db)
+    note = crud.create_note(db, schemas.NoteCreate(title="v1", content="first\n"), user.id)
+    crud.update_note(db, note.id, schemas.NoteUpdate(title="v2", content="second\n"), user.id)
+    restored = crud.restore_revision(db, note.id, 1)
+    assert (restored.title, restored.content) == ("v1", "first\n")
+    assert crud.get_revision(db, note.id, 3)[1] == "first\n"
@@ -0,0 +1,39 @@
+"""Search finds notes whatever way their bodies are stored (app.storage)."""
+import pytest
+
+from app import crud, schemas, search_index, storage
+from tests.conftest import new_user
+
+
+@pytest.fixture
+def compressed(monkeypatch):
+    """New bodies of 100 bytes or more are zlib-compressed, leaving notes.content empty"""
+    monkeypatch.setattr(storage, "CONTENT_COMPRESSION", "zlib")
+    monkeypatch.setattr(storage, "CONTENT_COMPRESS_MIN_BYTES", 100)
+
+
+@pytest.mark.parametrize("backend", ["fts5", "inverted"])
+def test_search_finds_compressed_note(db, compressed, monkeypatch, backend):
+    monkeypatch.setattr(search_index, "_backends", {"sqlite": search_index.BACKENDS[backend]()})
+    user = new_user(db)
+    body = "A long body about pelicans. " * 20
+    note = crud.create_note(db, schemas.NoteCreate(title="Birds", content=body), user.id)
+    assert note.content_encoding == "zlib" and note.stored_content == ""
+
+    total, page = crud.search_notes(db, "pelicans", user_id=user.id)
+    assert total == 1 and [n.id for n in page.items] == [note.id]
+
+    crud.update_note(db, note.id, schemas.NoteUpdate(title="Birds", content="Now about herons. " * 20), user.id)
+    assert crud.search_notes(db, "pelicans", user_id=user.id)[0] == 0
+    assert crud.search_notes(db, "herons", user_id=user.id)[0] == 1
+
+
+def test_mysql_fulltext_only_with_inline_bodies(compressed, monkeypatch):
+    monkeypatch.setattr(search_index, "SEARCH_BACKEND", "auto")
+    assert search_index.backend_name("mysql") == "inverted"
+    assert search_index.backend_name("sqlite") == "fts5"
+    monkeypatch.setattr(search_index, "SEARCH_BACKEND", "mysql")
+    with pytest.raises(RuntimeError):
+        search_index.backend_name("mysql")
+    monkeypatch.setattr(storage, "CONTENT_COMPRESSION", "none")
+    assert search_index.backend_name("mysql") == "mysql"
@@ -0,0 +1,81 @@
+"""The superadmin dashboard's statistics (app.stats): kept by the writes, filled in by migration 0011."""
+import importlib.util
+import os
+
+from sqlalchemy import delete, update
+
+from app import counters, crud, models, schemas, stats, storage
+from app.querycount import QueryCounter
+from tests.conftest import add_notes, new_user
+
+MIGRATION = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                         "migrations", "versions", "0011_usage_stats.py")
+
+
+def _comparable(s: stats.Stats):
+    """Everything the existing rows can tell (daily edits and deletes of gone notes are not among it)"""
+    return s.users, s.notes, s.content_bytes, s.sizes, [tuple(row) for row in s.top_users]
+
+
+def test_writes_keep_the_numbers(db):
+    before = stats.get_stats(db)
+    user = new_user(db)
+    notes = add_notes(db, user, 3)
+    crud.update_note(db, notes[0].id, schemas.NoteUpdate(title="big", content="x" * 2000), user.id)
+    crud.delete_note(db, notes[1].id, user.id)
+
+    after = stats.get_stats(db)
+    assert after.users == before.users + 1
+    assert after.notes == before.notes + 2 == counters.get(db, counters.ALL_NOTES)
+    assert after.content_bytes == before.content_bytes + 2000 + len("body 2")
+    today, today_before = after.days[0], before.days[0]
+    assert (today.created, today.updated, today.deleted) == (
+        today_before.created + 3, today_before.updated + 1, today_before.deleted + 1)
+    db.refresh(user)
+    assert (user.note_count, user.content_bytes) == (2, 2000 + len("body 2"))
+
+
+def test_dashboard_only_reads(db):
+    add_notes(db, new_user(db), 2)
+    with QueryCounter() as counter:
+        stats.get_stats(db)
+    assert counter.count == 3  # fixed counters, days, top users
+    assert all(sql.lstrip().upper().startswith("SELECT") for sql in counter.statements)
+
+
+def test_migration_fills_in_existing_rows(db):
+    add_notes(db, new_user(db), 4, content="y" * 20000)
+    stats.recount(db)  # the tests' notes include some created before deletes; start from what the rows say
+    expected = _comparable(stats.get_stats(db))
+
+    # A database upgraded to 0011 with notes and no statistics yet
+    db.execute(delete(models.Counter).where(models.Counter.name.like("stats:%")))
+    db.execute(update(models.User).values(note_count=0, content_bytes=0))
+    spec = importlib.util.spec_from_file_location("usage_stats_0011", MIGRATION)
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+    migration._seed_stats(db.connection())
+    db.commit()
+
+    assert _comparable(stats.get_stats(db)) == expected
+    migration._seed_stats(db.connection())  # seeded already: nothing added twice
+    assert _comparable(stats.get_stats(db)) == expected
+
+
+def test_storage_rewrite_keeps_the_numbers(db, monkeypatch):
+    user = new_user(db)
+    body = "Pelicans in the café, naïvely. " * 10  # more bytes than characters
+    note = crud.create_note(db, schemas.NoteCreate(title="Birds", content=body), user.id)
+    # A row from before content_size existed: its size counted characters
+    db.execute(update(models.Note).where(models.Note.id == note.id).values(content_size=None))
+    db.commit()
+    stats.recount(db)
+
+    monkeypatch.setattr(storage, "CONTENT_COMPRESSION", "zlib")
+    monkeypatch.setattr(storage, "CONTENT_COMPRESS_MIN_BYTES", 100)
+    assert storage.rewrite(db) >= 1
+    rewritten = _comparable(stats.get_stats(db))
+    stats.recount(db)
+    assert rewritten == _comparable(stats.get_stats(db))
+    assert db.get(models.User, user.id).content_bytes == len(body.encode("utf-8"))
+    assert crud.search_notes(db, "pelicans", user_id=user.id)[0] == 1
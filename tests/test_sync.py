@@ -0,0 +1,75 @@
+"""The delta sync feed (GET /api/v1/sync): changes, tombstones and expired cursors."""
+from datetime import datetime, timedelta
+
+from app import sync
+from tests.conftest import new_user
+
+
+def _sync(client, cursor=None, limit=100):
+    response = client.get("/api/v1/sync", params={"cursor": cursor, "limit": limit} if cursor else {"limit": limit})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _sync_all(client, cursor=None, limit=100):
+    """Every change after cursor, following has_more; (changes, last cursor)"""
+    changes = []
+    while True:
+        page = _sync(client, cursor, limit)
+        changes += page["changes"]
+        cursor = page["cursor"]
+        if not page["has_more"]:
+            return changes, cursor
+
+
+def _create(client, title):
+    return client.post("/api/v1/notes", json={"title": title, "content": title}).json()["id"]
+
+
+def test_sync_across_deletes(db, login):
+    client = login(new_user(db))
+    ids = [_create(client, f"note {i}") for i in range(5)]
+    first, cursor = _sync_all(client, limit=2)
+    assert sorted(c["id"] for c in first) == ids and not any(c.get("deleted") for c in first)
+
+    client.put(f"/api/v1/notes/{ids[0]}", json={"title": "edited", "content": "edited"})
+    assert client.delete(f"/api/v1/notes/{ids[1]}").status_code == 204
+    new_id = _create(client, "new")
+    changes, cursor = _sync_all(client, cursor, limit=1)
+    assert [(c["id"], c.get("deleted", False)) for c in changes] == [(ids[0], False), (ids[1], True), (new_id, False)]
+    assert changes[0]["title"] == "edited"
+    seqs = [c["seq"] for c in changes]
+    assert seqs == sorted(seqs)
+
+    # Nothing new: an empty page, and the cursor stays usable
+    assert _sync(client, cursor)["changes"] == []
+
+
+def test_first_sync_skips_earlier_deletes(db, login):
+    client = login(new_user(db))
+    kept, gone = _create(client, "kept"), _create(client, "gone")
+    client.delete(f"/api/v1/notes/{gone}")
+    changes, _ = _sync_all(client)
+    assert [c["id"] for c in changes] == [kept]
+
+
+def test_purged_horizon_expires_old_cursors(db, login):
+    client = login(new_user(db))
+    ids = [_create(client, f"note {i}") for i in range(3)]
+    _, before_delete = _sync_all(client)
+    client.delete(f"/api/v1/notes/{ids[0]}")
+    changes, after_delete = _sync_all(client, before_delete)
+    assert [c["id"] for c in changes] == [ids[0]] and changes[0]["deleted"]
+
+    assert sync.purge_tombstones(db, older_than=datetime.utcnow() + timedelta(seconds=1)) >= 1
+    # The old cursor still needed the purged tombstone: start over
+    assert client.get("/api/v1/sync", params={"cursor": before_delete}).status_code == 410
+    # A client that already saw the delete carries on
+    assert _sync(client, after_delete)["changes"] == []
+    changes, _ = _sync_all(client)
+    assert sorted(c["id"] for c in changes) == ids[1:]
+
+
+def test_bad_cursor(db, login):
+    client = login(new_user(db))
+    assert client.get("/api/v1/sync", params={"cursor": "not a cursor"}).status_code == 400
@@ -0,0 +1,91 @@
+"""Tag filters: all/any totals and pages, and the cached note id sets staying correct (app.tags)."""
+import itertools
+
+import pytest
+
+from app import crud, schemas, tags
+from tests.conftest import new_user
+
+TAGS = ["red", "green", "blue"]
+
+
+@pytest.fixture
+def tagged_user(db):
+    """A user whose note i carries the tags whose bit is set in i % 8; returns (user, {id: set of tags})"""
+    user = new_user(db)
+    notes_in = [schemas.NoteCreate(title=f"note {i}", content=f"body {i}",
+                                   tags=[t for bit, t in enumerate(TAGS) if i % 8 & (1 << bit)])
+                for i in range(60)]
+    notes = crud.create_notes(db, notes_in, user.id)
+    return user, {note.id: set(note.tags) for note in notes}
+
+
+def _expected(notes: dict, names, match_all: bool) -> list:
+    wanted = set(names)
+    keep = (lambda t: wanted <= t) if match_all else (lambda t: wanted & t)
+    return sorted((note_id for note_id, t in notes.items() if keep(t)), reverse=True)
+
+
+def _pages(db, user, names, match_all, limit):
+    ids, totals = [], set()
+    for offset in itertools.count(0, limit):
+        total, page = crud.get_notes_by_user(db, user.id, offset=offset, limit=limit, tagged=names,
+                                             match_all=match_all)
+        totals.add(total)
+        if not page.items:
+            return totals, ids
+        ids += [n.id for n in page.items]
+
+
+@pytest.mark.parametrize("match_all", [True, False])
+@pytest.mark.parametrize("names", [["red"], ["red", "green"], ["red", "green", "blue"], ["blue", "missing"]])
+def test_totals_and_pages(db, tagged_user, names, match_all):
+    user, notes = tagged_user
+    expected = _expected(notes, names, match_all)
+    for cold in (True, False):
+        if cold:
+            tags.clear()
+        totals, ids = _pages(db, user, names, match_all, limit=7)
+        assert totals == {len(expected)}
+        assert ids == expected  # newest first, every note once, no gaps between pages
+
+
+def test_api_filter(db, login, tagged_user):
+    user, notes = tagged_user
+    client = login(user)
+    response = client.get("/api/v1/notes", params={"tags": "red,blue", "match": "any", "offset": 5, "limit": 5})
+    body = response.json()
+    expected = _expected(notes, ["red", "blue"], False)
+    assert body["total"] == len(expected)
+    assert [n["id"] for n in body["items"]] == expected[5:10]
+
+
+def test_filters_see_writes_from_other_workers(db, tagged_user, monkeypatch):
+    user, notes = tagged_user
+
+    def filtered():
+        return _pages(db, user, ["red", "green"], True, limit=100)[1]
+
+    assert filtered() == _expected(notes, ["red", "green"], True)  # cached from here on
+    # Writes made by another worker: this worker's cache is not patched
+    monkeypatch.setattr(tags, "notes_tagged", lambda *args, **kwargs: None)
+    created = crud.create_note(db, schemas.NoteCreate(title="new", content="new", tags=["red", "green"]), user.id)
+    notes[created.id] = {"red", "green"}
+    retagged = next(note_id for note_id, t in notes.items() if {"red", "green"} <= t and note_id != created.id)
+    crud.update_note(db, retagged, schemas.NoteUpdate(title="x", content="x", tags=["blue"]), user.id)
+    notes[retagged] = {"blue"}
+    deleted = next(note_id for note_id, t in notes.items() if {"red", "green"} <= t and note_id != created.id)
+    crud.delete_note(db, deleted, user.id)
+    del notes[deleted]
+
+    assert filtered() == _expected(notes, ["red", "green"], True)
+
+
+def test_local_writes_patch_the_cache(db, tagged_user):
+    user, notes = tagged_user
+    crud.get_notes_by_user(db, user.id, tagged=["blue"])
+    hits = tags.stats["hits"]
+    created = crud.create_note(db, schemas.NoteCreate(title="new", content="new", tags=["blue"]), user.id)
+    total, page = crud.get_notes_by_user(db, user.id, tagged=["blue"])
+    assert page.items[0].id == created.id and total == len(_expected(notes, ["blue"], True)) + 1
+    assert tags.stats["hits"] == hits + 1  # patched in place, not read again
@@ -0,0 +1,69 @@
+"""Saves and deletes against a stale version are refused with 409 (crud.VersionConflict)."""
+from tests.conftest import new_user
+
+
+def _note(client, title="draft", content="first text"):
+    response = client.post("/api/v1/notes", json={"title": title, "content": content})
+    assert response.status_code == 201
+    return response.json()
+
+
+def test_edit_form_conflict(db, login):
+    client = login(new_user(db))
+    note = _note(client)
+    # Someone else saves in between
+    assert client.put(f"/api/v1/notes/{note['id']}", json={"title": "theirs", "content": "their text",
+                                                          "version": note["version"]}).status_code == 200
+
+    response = client.post(f"/note/{note['id']}/edit", data={"title": "mine", "content": "my text",
+                                                             "version": note["version"]})
+    assert response.status_code == 409
+    assert "their text" in response.text and "my text" in response.text  # saved version next to the draft
+    assert client.get(f"/api/v1/notes/{note['id']}").json()["title"] == "theirs"
+
+
+def test_api_update_conflict(db, login):
+    client = login(new_user(db))
+    note = _note(client)
+    url = f"/api/v1/notes/{note['id']}"
+    saved = client.put(url, json={"title": "v2", "content": "second", "version": note["version"]})
+    assert saved.status_code == 200 and saved.json()["version"] == note["version"] + 1
+
+    stale = client.put(url, json={"title": "v2b", "content": "lost", "version": note["version"]})
+    assert stale.status_code == 409
+    assert client.get(url).json()["content"] == "second"
+
+    # Without a version the save is unconditional
+    assert client.put(url, json={"title": "v3", "content": "third"}).json()["version"] == note["version"] + 2
+
+
+def test_api_delete_conflict(db, login):
+    client = login(new_user(db))
+    note = _note(client)
+    url = f"/api/v1/notes/{note['id']}"
+    client.put(url, json={"title": "v2", "content": "second"})
+    assert client.delete(url, params={"version": note["version"]}).status_code == 409
+    assert client.get(url).status_code == 200
+    assert client.delete(url, params={"version": note["version"] + 1}).status_code == 204
+    assert client.get(url).status_code == 404
+
+
+def test_bulk_update_conflict_changes_nothing(db, login):
+    client = login(new_user(db))
+    first, second = _note(client, "one", "one"), _note(client, "two", "two")
+    client.put(f"/api/v1/notes/{second['id']}", json={"title": "two b", "content": "two b"})
+    response = client.put("/api/v1/notes/bulk", json={"notes": [
+        {"id": first["id"], "title": "one c", "content": "one c", "version": first["version"]},
+        {"id": second["id"], "title": "two c", "content": "two c", "version": second["version"]},
+    ]})
+    assert response.status_code == 409
+    assert client.get(f"/api/v1/notes/{first['id']}").json()["title"] == "one"
+    assert client.get(f"/api/v1/notes/{second['id']}").json()["title"] == "two b"
+
+
+def test_other_users_note_is_not_found(db, login):
+    note = _note(login(new_user(db)))
+    intruder = login(new_user(db))
+    assert intruder.put(f"/api/v1/notes/{note['id']}", json={"title": "x", "content": "x",
+                                                            "version": note["version"]}).status_code == 404
+    assert intruder.post(f"/note/{note['id']}/edit", data={"title": "x", "content": "x"}).status_code == 404